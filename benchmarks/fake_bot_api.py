@@ -0,0 +1,337 @@
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import ClientError, ClientSession, web
+
+
+# Методы отправки сообщений: для них имитируются задержка и ответы 429
+SEND_METHODS = frozenset({
+    'sendMessage', 'sendAudio', 'sendVoice', 'sendDocument', 'sendPhoto', 'sendVideo', 'sendAnimation',
+    'copyMessage', 'forwardMessage',
+})
+# Поле ответа с отправленным медиафайлом для каждого метода
+MEDIA_FIELDS = {
+    'sendAudio': 'audio', 'sendVoice': 'voice', 'sendDocument': 'document',
+    'sendVideo': 'video', 'sendAnimation': 'animation',
+}
+
+
+class OutgoingMessage:
+    """
+    Сообщение, отправленное ботом в чат
+    """
+    __slots__ = ('method', 'chat_id', 'text', 'received_at')
+
+    def __init__(self, method: str, chat_id: int, text: str, received_at: float):
+        self.method = method
+        self.chat_id = chat_id
+        self.text = text
+        self.received_at = received_at  # time.monotonic() получения запроса
+
+
+class Mailbox:
+    """
+    Сообщения бота в одном чате, которые еще не разобрал тест
+    """
+
+    def __init__(self):
+        self._messages: List[OutgoingMessage] = []
+        self._condition = asyncio.Condition()
+
+    async def put(self, message: OutgoingMessage):
+        async with self._condition:
+            self._messages.append(message)
+            self._condition.notify_all()
+
+    async def wait_for(self, predicate: Callable[[OutgoingMessage], bool], timeout: float) -> OutgoingMessage:
+        """
+        Ожидание первого сообщения, подходящего под условие.
+        Найденное сообщение удаляется из ящика, остальные остаются.
+        :param predicate: Условие на сообщение
+        :param timeout: Максимальное время ожидания в секундах
+        :return: Сообщение
+        """
+        def find():
+            for index, message in enumerate(self._messages):
+                if predicate(message):
+                    return self._messages.pop(index)
+            return None
+
+        async with self._condition:
+            return await asyncio.wait_for(self._condition.wait_for(find), timeout)
+
+    def count(self, method: str) -> int:
+        """Количество неразобранных сообщений, отправленных методом"""
+        return sum(1 for message in self._messages if message.method == method)
+
+
+class FakeBotAPI:
+    """
+    Локальный сервер Bot API для нагрузочных тестов.
+
+    Отвечает на методы, которые использует бот (getMe, getUpdates,
+    setWebhook/deleteWebhook, send*, getFile и скачивание файлов), без
+    обращения к Telegram. Обновления передаются боту через getUpdates, а
+    после setWebhook — запросами на адрес webhook. Для методов отправки
+    имитируются задержка ответа и ответы 429 с заданной вероятностью.
+    """
+
+    def __init__(self, token: str, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, retry_after: int = 1, seed: Optional[int] = None):
+        """
+        :param token: Токен бота, который принимает сервер
+        :param latency: Задержка ответа на методы отправки в секундах
+        :param jitter: Случайная добавка к задержке от 0 до jitter секунд
+        :param error_rate: Доля запросов отправки, получающих ответ 429
+        :param retry_after: Значение retry_after в ответе 429
+        :param seed: Начальное значение генератора случайных чисел
+        """
+        self.token = token
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.base_url = ''
+        self.ready = asyncio.Event()  # Бот начал получать обновления
+        self.calls: Counter = Counter()
+        self.injected_errors = 0
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+
+        self._mailboxes: Dict[int, Mailbox] = defaultdict(Mailbox)
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_added = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._file_contents: Dict[str, bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._client: Optional[ClientSession] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Запуск сервера
+        :param host: Адрес для прослушивания
+        :param port: Порт (0 — свободный порт)
+        :return: Адрес сервера для TELEGRAM_API_SERVER
+        """
+        web_app = web.Application(client_max_size=64 * 1024 * 1024)
+        web_app.router.add_post('/bot{token}/{method}', self._handle_method)
+        web_app.router.add_get('/bot{token}/{method}', self._handle_method)
+        web_app.router.add_get('/file/bot{token}/{path:.+}', self._handle_file)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{port}'
+        self._client = ClientSession()
+        return self.base_url
+
+    async def stop(self):
+        """Остановка сервера"""
+        if self._client:
+            await self._client.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def mailbox(self, chat_id: int) -> Mailbox:
+        """Сообщения бота в чат"""
+        return self._mailboxes[chat_id]
+
+    def add_file(self, file_unique_id: str, content: bytes, file_name: str,
+                 mime_type: str = 'text/plain') -> Dict[str, Any]:
+        """
+        Регистрация файла, который бот сможет скачать через getFile
+        :return: Объект Document для сообщения пользователя
+        """
+        file_id = f'file-{file_unique_id}'
+        self._files[file_id] = {
+            'file_id': file_id,
+            'file_unique_id': file_unique_id,
+            'file_size': len(content),
+            'file_path': f'documents/{file_unique_id}',
+        }
+        self._file_contents[f'documents/{file_unique_id}'] = content
+        return {
+            'file_id': file_id,
+            'file_unique_id': file_unique_id,
+            'file_name': file_name,
+            'mime_type': mime_type,
+            'file_size': len(content),
+        }
+
+    def make_message(self, user: Dict[str, Any], **fields) -> Dict[str, Any]:
+        """
+        Сообщение пользователя в личном чате с ботом
+        :param user: Объект User отправителя
+        :param fields: Содержимое (text, document и т.д.)
+        """
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+            **fields,
+        }
+
+    async def push_update(self, message: Dict[str, Any]):
+        """
+        Передача боту обновления с сообщением пользователя
+        """
+        update = {'update_id': next(self._update_ids), 'message': message}
+        if self.webhook_url is None:
+            self._updates.append(update)
+            self._updates_added.set()
+            return
+
+        headers = {'Content-Type': 'application/json'}
+        if self.webhook_secret:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.webhook_secret
+        body = json.dumps(update)
+        # Как и Telegram, повторяем доставку, пока бот не примет обновление
+        for attempt in itertools.count():
+            try:
+                async with self._client.post(self.webhook_url, data=body, headers=headers) as response:
+                    if response.status == 200:
+                        return
+                    status = response.status
+            except ClientError as e:
+                status = e
+            if attempt >= 50:
+                raise RuntimeError(f"Webhook не принял обновление {update['update_id']}: {status}")
+            await asyncio.sleep(min(0.05 * 2 ** attempt, 1))
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        received_at = time.monotonic()
+        if request.match_info['token'] != self.token:
+            return self._error(401, 'Unauthorized')
+        method = request.match_info['method']
+        self.calls[method] += 1
+
+        params = dict(await request.post()) if request.can_read_body else {}
+        params.update(request.query)
+
+        if method in SEND_METHODS:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.injected_errors += 1
+                return web.json_response({
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }, status=429)
+            return self._ok(await self._send(method, params, received_at))
+
+        handler = getattr(self, f'_method_{method}', None)
+        if handler is None:
+            return self._error(404, f'Not Found: method {method} is not supported by the fake server')
+        return await handler(params)
+
+    async def _handle_file(self, request: web.Request) -> web.Response:
+        if request.match_info['token'] != self.token:
+            return self._error(401, 'Unauthorized')
+        content = self._file_contents.get(request.match_info['path'])
+        if content is None:
+            return self._error(404, 'Not Found')
+        return web.Response(body=content)
+
+    async def _send(self, method: str, params: Dict[str, Any], received_at: float) -> Dict[str, Any]:
+        chat_id = int(params['chat_id'])
+        text = params.get('text') or params.get('caption') or ''
+        await self._mailboxes[chat_id].put(OutgoingMessage(method, chat_id, text, received_at))
+
+        result = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'user'},
+        }
+        if method == 'sendMessage':
+            result['text'] = text
+        elif method == 'sendPhoto':
+            result['photo'] = [self._media(params, 'photo')]
+        elif method in MEDIA_FIELDS:
+            field = MEDIA_FIELDS[method]
+            result[field] = self._media(params, field)
+        return result
+
+    def _media(self, params: Dict[str, Any], field: str) -> Dict[str, Any]:
+        value = params.get(field)
+        if isinstance(value, str):
+            # Отправка по file_id
+            file_id = value
+        else:
+            # Загрузка файла: как и Telegram, выдаем новый file_id
+            file_id = f'{field}-{next(self._message_ids)}'
+        media = {'file_id': file_id, 'file_unique_id': f'u{file_id}'}
+        if field in ('audio', 'voice', 'video', 'animation'):
+            media['duration'] = 1
+        if field in ('photo', 'video', 'animation'):
+            media.update(width=1, height=1)
+        return media
+
+    async def _method_getMe(self, params: Dict[str, Any]) -> web.Response:
+        return self._ok({
+            'id': int(self.token.split(':', 1)[0]),
+            'is_bot': True,
+            'first_name': 'Load Test Bot',
+            'username': 'load_test_bot',
+        })
+
+    async def _method_deleteWebhook(self, params: Dict[str, Any]) -> web.Response:
+        self.webhook_url = None
+        if params.get('drop_pending_updates') in ('true', 'True', True):
+            self._updates.clear()
+        return self._ok(True)
+
+    async def _method_setWebhook(self, params: Dict[str, Any]) -> web.Response:
+        self.webhook_url = params['url']
+        self.webhook_secret = params.get('secret_token')
+        if params.get('drop_pending_updates') in ('true', 'True', True):
+            self._updates.clear()
+        self.ready.set()
+        return self._ok(True)
+
+    async def _method_getUpdates(self, params: Dict[str, Any]) -> web.Response:
+        self.ready.set()
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+
+        if offset:
+            # Обновления до offset подтверждены ботом
+            confirmed = 0
+            while confirmed < len(self._updates) and self._updates[confirmed]['update_id'] < offset:
+                confirmed += 1
+            del self._updates[:confirmed]
+        if not self._updates and timeout:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._ok(self._updates[:limit])
+
+    async def _method_getFile(self, params: Dict[str, Any]) -> web.Response:
+        file = self._files.get(params.get('file_id'))
+        if file is None:
+            return self._error(400, 'Bad Request: invalid file_id')
+        return self._ok(file)
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def _error(code: int, description: str) -> web.Response:
+        return web.json_response({'ok': False, 'error_code': code, 'description': description}, status=code)
@@ -0,0 +1,460 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmarks.fake_bot_api import FakeBotAPI, OutgoingMessage
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_TOKEN = '123456789:LOAD-TEST-TOKEN'
+FIRST_USER_ID = 10_000_000
+REFERRAL_LINK = re.compile(r'start=(\S+)')
+
+# Шаги воронки онбординга в порядке прохождения
+STEPS = ('start', 'onboarding', 'materials', 'referral_link', 'referral_stats')
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """
+    Процентиль по ближайшему рангу
+    :param values: Значения
+    :param q: Процентиль от 0 до 100
+    :return: Значение или None для пустой выборки
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-q * len(ordered) // 100)))
+    return ordered[rank - 1]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, Any]:
+    """Количество, p50, p90, p99 и максимум выборки длительностей в секундах"""
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+def _process_tree(pid: int) -> List[int]:
+    """ID процесса и всех его потомков (по /proc, только Linux)"""
+    children: Dict[int, List[int]] = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as stat:
+                # Имя процесса в скобках может содержать пробелы
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, ()))
+    return tree
+
+
+def _read_usage(pid: int) -> Optional[Dict[str, float]]:
+    """
+    Потребление памяти и процессорного времени процессом бота вместе с
+    процессами-обработчиками
+    :return: rss_mb, peak_rss_mb, cpu_seconds или None, если /proc недоступен
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    usage = {'rss_mb': 0.0, 'peak_rss_mb': 0.0, 'cpu_seconds': 0.0}
+    for process in _process_tree(pid):
+        try:
+            with open(f'/proc/{process}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        usage['rss_mb'] += int(line.split()[1]) / 1024
+                    elif line.startswith('VmHWM:'):
+                        usage['peak_rss_mb'] += int(line.split()[1]) / 1024
+            with open(f'/proc/{process}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+                usage['cpu_seconds'] += (int(fields[11]) + int(fields[12])) / ticks
+        except (OSError, IndexError, ValueError):
+            continue
+    return usage
+
+
+class LoadTest:
+    """
+    Нагрузочный тест бота.
+
+    Бот запускается отдельным процессом (python -m src.bot.main) с
+    TELEGRAM_API_SERVER, указывающим на FakeBotAPI, и собственной базой
+    данных во временном каталоге. Синтетические пользователи проходят
+    воронку онбординга: /start (часть — по реферальной ссылке ранее
+    прошедших пользователей), вводное аудио и предложение загрузить
+    материалы, загрузка документа, получение реферальной ссылки и
+    запрос статистики рефералов. Задержка шага — время от передачи
+    обновления боту до получения сервером ответа бота.
+    """
+
+    def __init__(self, users: int = 200, arrival_rate: float = 50, mode: str = 'polling',
+                 workers: int = 1, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 referral_share: float = 0.5, step_timeout: float = 30, env: Dict[str, str] = None,
+                 seed: int = 1, work_dir: Optional[str] = None):
+        """
+        :param users: Количество синтетических пользователей
+        :param arrival_rate: Новых пользователей в секунду
+        :param mode: polling или webhook
+        :param workers: Процессов-обработчиков в режиме webhook
+        :param latency: Задержка ответа Bot API на отправку в секундах
+        :param jitter: Случайная добавка к задержке в секундах
+        :param error_rate: Доля отправок, получающих ответ 429
+        :param referral_share: Доля пользователей, приходящих по реферальной ссылке
+        :param step_timeout: Максимальное ожидание ответа бота на шаг в секундах
+        :param env: Дополнительные переменные окружения процесса бота
+        :param seed: Начальное значение генератора случайных чисел
+        :param work_dir: Каталог данных бота (по умолчанию временный, удаляется после теста)
+        """
+        self.users = users
+        self.arrival_rate = arrival_rate
+        self.mode = mode
+        self.workers = workers
+        self.referral_share = referral_share
+        self.step_timeout = step_timeout
+        self.env = env or {}
+        self.random = random.Random(seed)
+        self.work_dir = work_dir
+        self.api = FakeBotAPI(BOT_TOKEN, latency, jitter, error_rate, seed=seed)
+
+        self._latencies: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self._referral_codes: List[str] = []
+        self._codes_available = asyncio.Event()
+        self._completed = 0
+        self._referred = 0
+        self._updates = 0
+        self._audio_sent = 0
+        self._errors: List[str] = []
+        self._memory_samples: List[float] = []
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Проведение теста
+        :return: Отчет (см. format_report)
+        """
+        work_dir = self.work_dir or tempfile.mkdtemp(prefix='bot-load-')
+        os.makedirs(work_dir, exist_ok=True)
+        await self.api.start()
+        try:
+            process = await self._start_bot(work_dir)
+            try:
+                await self._wait_ready(process)
+                baseline = _read_usage(process.pid)
+                sampler = asyncio.create_task(self._sample_memory(process.pid))
+
+                started = time.monotonic()
+                await asyncio.gather(*(self._run_user(index) for index in range(self.users)))
+                duration = time.monotonic() - started
+
+                final = _read_usage(process.pid)
+                sampler.cancel()
+            finally:
+                await self._stop_bot(process)
+        finally:
+            await self.api.stop()
+            if self.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return self._report(duration, baseline, final)
+
+    def _bot_env(self, work_dir: str) -> Dict[str, str]:
+        media_path = os.path.join(work_dir, 'media')
+        os.makedirs(media_path, exist_ok=True)
+        # Вводное аудио, чтобы отправка шла через загрузку и file_id, как в работе
+        with open(os.path.join(media_path, 'introduction.mp3'), 'wb') as audio:
+            audio.write(os.urandom(64 * 1024))
+
+        webhook_port = _free_port()
+        env = dict(os.environ)
+        env.update({
+            'PYTHONPATH': PROJECT_ROOT,
+            'BOT_TOKEN': BOT_TOKEN,
+            'TELEGRAM_API_SERVER': self.api.base_url,
+            'BOT_MODE': self.mode,
+            'WEBHOOK_BASE_URL': f'http://127.0.0.1:{webhook_port}',
+            'WEBHOOK_HOST': '127.0.0.1',
+            'WEBHOOK_PORT': str(webhook_port),
+            'WEBHOOK_WORKERS': str(self.workers),
+            'DATABASE_PATH': os.path.join(work_dir, 'database.db'),
+            'LOG_FILE': os.path.join(work_dir, 'app.log'),
+            'LOG_LEVEL': 'WARNING',
+            'UPLOAD_FOLDER': os.path.join(work_dir, 'uploads'),
+            'PROGRAMS_FOLDER': os.path.join(work_dir, 'programs'),
+            'MEDIA_PATH': media_path,
+            'METRICS_PORT': '0',
+            # Задержки онбординга не относятся к производительности бота
+            'ONBOARDING_AUDIO_DELAY': '0',
+            'ONBOARDING_MATERIALS_DELAY': '0',
+            'ADMIN_IDS': '',
+        })
+        env.update(self.env)
+        return env
+
+    async def _start_bot(self, work_dir: str) -> asyncio.subprocess.Process:
+        output = open(os.path.join(work_dir, 'bot.out'), 'wb')
+        try:
+            return await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'src.bot.main',
+                cwd=PROJECT_ROOT, env=self._bot_env(work_dir),
+                stdout=output, stderr=asyncio.subprocess.STDOUT,
+                # Отдельная группа процессов, чтобы при зависании завершить и дочерние процессы
+                start_new_session=True
+            )
+        finally:
+            output.close()
+
+    async def _wait_ready(self, process: asyncio.subprocess.Process, timeout: float = 60):
+        ready = asyncio.create_task(self.api.ready.wait())
+        exited = asyncio.create_task(process.wait())
+        done, _ = await asyncio.wait({ready, exited}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        ready.cancel()
+        exited.cancel()
+        if ready not in done:
+            raise RuntimeError("Бот не начал получать обновления, см. bot.out в каталоге данных")
+        if self.mode == 'webhook':
+            # setWebhook вызывается до запуска веб-сервера, доставка повторяется до его готовности
+            await asyncio.sleep(0.5)
+
+    async def _stop_bot(self, process: asyncio.subprocess.Process, timeout: float = 30):
+        if process.returncode is not None:
+            return
+        # Процессы-обработчики останавливает сам бот, сигнал получает только главный процесс
+        process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            os.killpg(process.pid, signal.SIGKILL)
+            await process.wait()
+
+    async def _sample_memory(self, pid: int, interval: float = 0.5):
+        while True:
+            usage = await asyncio.to_thread(_read_usage, pid)
+            if usage:
+                self._memory_samples.append(usage['rss_mb'])
+            await asyncio.sleep(interval)
+
+    async def _run_user(self, index: int):
+        await asyncio.sleep(index / self.arrival_rate)
+        user_id = FIRST_USER_ID + index
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'User{index}', 'username': f'load_user_{index}'}
+        mailbox = self.api.mailbox(user_id)
+        step = STEPS[0]
+        try:
+            text = '/start'
+            if self.random.random() < self.referral_share:
+                # Приглашенный пользователь приходит, когда кто-то уже получил ссылку
+                await asyncio.wait_for(self._codes_available.wait(), self.step_timeout)
+                text = f'/start {self.random.choice(self._referral_codes)}'
+                self._referred += 1
+            sent = await self._send(user, text=text)
+            await self._expect(mailbox, step, sent, lambda message: message.text.startswith('Привет'))
+
+            step = 'onboarding'
+            await self._expect(mailbox, step, sent, lambda message: message.text.startswith('Вы можете загрузить'))
+            if mailbox.count('sendAudio'):
+                self._audio_sent += 1
+
+            step = 'materials'
+            document = self.api.add_file(
+                f'load-{user_id}', f'Материалы пользователя {index}\n'.encode() * 64, f'notes_{index}.txt'
+            )
+            sent = await self._send(user, document=document)
+            await self._expect(mailbox, step, sent, lambda message: message.text.startswith('Материалы получены'))
+
+            step = 'referral_link'
+            message = await self._expect(
+                mailbox, step, sent, lambda message: 'реферальная ссылка' in message.text
+            )
+            match = REFERRAL_LINK.search(message.text)
+            if match:
+                self._referral_codes.append(match.group(1))
+                self._codes_available.set()
+
+            step = 'referral_stats'
+            sent = await self._send(user, text='Сколько у меня рефералов?')
+            await self._expect(mailbox, step, sent, lambda message: message.text.startswith('Вы пригласили'))
+            self._completed += 1
+        except asyncio.TimeoutError:
+            self._errors.append(f"Пользователь {user_id}: нет ответа на шаге {step} за {self.step_timeout} с")
+        except Exception as e:
+            self._errors.append(f"Пользователь {user_id}: ошибка на шаге {step}: {e!r}")
+
+    async def _send(self, user: Dict[str, Any], **fields) -> float:
+        sent = time.monotonic()
+        await self.api.push_update(self.api.make_message(user, **fields))
+        self._updates += 1
+        return sent
+
+    async def _expect(self, mailbox, step: str, sent: float, predicate) -> OutgoingMessage:
+        message = await mailbox.wait_for(predicate, self.step_timeout)
+        self._latencies[step].append(message.received_at - sent)
+        return message
+
+    def _report(self, duration: float, baseline: Optional[Dict[str, float]],
+                final: Optional[Dict[str, float]]) -> Dict[str, Any]:
+        api_calls = sum(self.api.calls.values())
+        report = {
+            'config': {
+                'users': self.users,
+                'arrival_rate': self.arrival_rate,
+                'mode': self.mode,
+                'workers': self.workers,
+                'latency': self.api.latency,
+                'jitter': self.api.jitter,
+                'error_rate': self.api.error_rate,
+                'referral_share': self.referral_share,
+                'env': self.env,
+            },
+            'duration': duration,
+            'users': {
+                'completed': self._completed,
+                'failed': self.users - self._completed,
+                'referred': self._referred,
+                'received_audio': self._audio_sent,
+            },
+            'throughput': {
+                'updates_per_second': self._updates / duration if duration else 0,
+                'funnels_per_second': self._completed / duration if duration else 0,
+                'api_calls_per_second': api_calls / duration if duration else 0,
+            },
+            'latency': {step: summarize(values) for step, values in self._latencies.items()},
+            'bot_api': {'calls': dict(self.api.calls), 'injected_429': self.api.injected_errors},
+            'memory': None,
+            'cpu_seconds': None,
+            'errors': self._errors[:20],
+        }
+        if baseline and final:
+            report['memory'] = {
+                'start_rss_mb': baseline['rss_mb'],
+                'max_rss_mb': max(self._memory_samples + [final['rss_mb']]),
+                'end_rss_mb': final['rss_mb'],
+                'peak_rss_mb': final['peak_rss_mb'],
+            }
+            report['cpu_seconds'] = final['cpu_seconds'] - baseline['cpu_seconds']
+        return report
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Текстовый отчет нагрузочного теста
+    :param report: Результат LoadTest.run
+    :return: Текст для вывода в консоль
+    """
+    config, users, throughput = report['config'], report['users'], report['throughput']
+    lines = [
+        f"Режим {config['mode']}, процессов {config['workers']}, пользователей {config['users']} "
+        f"({config['arrival_rate']:g}/с), задержка API {config['latency'] * 1000:g} мс, 429: {config['error_rate']:.1%}",
+        f"Длительность {report['duration']:.2f} с, прошли воронку {users['completed']}, "
+        f"не прошли {users['failed']}, по реферальной ссылке {users['referred']}",
+        f"Обновлений/с {throughput['updates_per_second']:.1f}, воронок/с {throughput['funnels_per_second']:.1f}, "
+        f"запросов к API/с {throughput['api_calls_per_second']:.1f}, ответов 429 {report['bot_api']['injected_429']}",
+        '',
+        f"{'Шаг':<16}{'n':>7}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}",
+    ]
+    for step, stats in report['latency'].items():
+        values = ''.join(
+            f"{stats[key] * 1000:>10.1f}" if stats[key] is not None else f"{'—':>10}"
+            for key in ('p50', 'p90', 'p99', 'max')
+        )
+        lines.append(f"{step:<16}{stats['count']:>7}{values}")
+    memory = report['memory']
+    if memory:
+        lines.append('')
+        lines.append(
+            f"Память бота: {memory['start_rss_mb']:.1f} МБ в начале, {memory['max_rss_mb']:.1f} МБ максимум, "
+            f"{memory['end_rss_mb']:.1f} МБ в конце; процессорное время {report['cpu_seconds']:.2f} с"
+        )
+    if report['errors']:
+        lines.append('')
+        lines.extend(report['errors'])
+    return '\n'.join(lines)
+
+
+def check_thresholds(report: Dict[str, Any], max_p99: Optional[float], max_failed: int) -> List[str]:
+    """
+    Проверка результатов на регрессию
+    :param report: Результат LoadTest.run
+    :param max_p99: Предел p99 любого шага в секундах (None — не проверять)
+    :param max_failed: Допустимое количество пользователей, не прошедших воронку
+    :return: Описания нарушений
+    """
+    problems = []
+    if report['users']['failed'] > max_failed:
+        problems.append(f"Не прошли воронку {report['users']['failed']} пользователей (допустимо {max_failed})")
+    if max_p99 is not None:
+        for step, stats in report['latency'].items():
+            if stats['p99'] is not None and stats['p99'] > max_p99:
+                problems.append(f"p99 шага {step} {stats['p99'] * 1000:.0f} мс превышает {max_p99 * 1000:.0f} мс")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота с локальным сервером Bot API')
+    parser.add_argument('--users', type=int, default=200, help='Количество синтетических пользователей')
+    parser.add_argument('--arrival-rate', type=float, default=50, help='Новых пользователей в секунду')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--workers', type=int, default=1, help='Процессов-обработчиков в режиме webhook')
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа API на отправку, с')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля отправок с ответом 429')
+    parser.add_argument('--referral-share', type=float, default=0.5, help='Доля пользователей по реферальной ссылке')
+    parser.add_argument('--step-timeout', type=float, default=30, help='Ожидание ответа бота на шаг, с')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Настройка процесса бота, например SEND_GLOBAL_RATE=1000')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--work-dir', help='Каталог данных бота (сохраняется после теста)')
+    parser.add_argument('--output', help='Файл для отчета в формате JSON')
+    parser.add_argument('--max-p99', type=float, help='Завершиться с ошибкой, если p99 шага больше, с')
+    parser.add_argument('--max-failed', type=int, default=0, help='Допустимо пользователей, не прошедших воронку')
+    args = parser.parse_args()
+
+    env = dict(item.split('=', 1) for item in args.env)
+    test = LoadTest(
+        users=args.users, arrival_rate=args.arrival_rate, mode=args.mode, workers=args.workers,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        referral_share=args.referral_share, step_timeout=args.step_timeout, env=env,
+        seed=args.seed, work_dir=args.work_dir
+    )
+    report = asyncio.run(test.run())
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+
+    problems = check_thresholds(report, args.max_p99, args.max_failed)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,588 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram.types import Message
+
+from config.settings import SECRET_KEY, REFERRAL_CODE_LENGTH
+from database.migrations import apply_migrations
+from database.models import File, User
+from handlers.router import MessageRouter
+from services.referral_service import ReferralService
+from services.user_service import UserService
+from utils.database import AsyncDatabase
+from utils.referral_codes import ReferralCodec
+from utils.validators import (
+    validate_data, validate_email, validate_length, validate_not_empty, validate_phone,
+    validate_telegram_id, validate_url, validate_username
+)
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HISTORY = os.path.join(PROJECT_ROOT, 'benchmarks', 'history.jsonl')
+FIRST_TELEGRAM_ID = 100_000_000
+SEED_BATCH_SIZE = 50_000
+REFERRED_SHARE = 0.3
+
+# Функция выполняет измеряемую операцию заданное количество раз
+Runner = Callable[[int], None]
+
+
+class Benchmark:
+    """
+    Описание микробенчмарка: setup готовит данные один раз и возвращает
+    функцию, выполняющую операцию loops раз подряд
+    """
+    __slots__ = ('name', 'setup', 'needs_database')
+
+    def __init__(self, name: str, setup: Callable[['BenchmarkContext'], Runner], needs_database: bool = False):
+        self.name = name
+        self.setup = setup
+        self.needs_database = needs_database
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, needs_database: bool = False):
+    """Регистрация микробенчмарка"""
+    def wrap(setup: Callable[['BenchmarkContext'], Runner]):
+        BENCHMARKS.append(Benchmark(name, setup, needs_database))
+        return setup
+    return wrap
+
+
+class BenchmarkContext:
+    """
+    Общие ресурсы бенчмарков: цикл событий и база данных с тестовыми данными
+    """
+
+    def __init__(self, database_path: Optional[str], users: int):
+        self.database_path = database_path
+        self.users = users
+        self.loop = asyncio.new_event_loop()
+        self.random = random.Random(1)
+        self._db: Optional[AsyncDatabase] = None
+
+    @property
+    def db(self) -> AsyncDatabase:
+        if self._db is None:
+            self._db = AsyncDatabase(self.database_path)
+        return self._db
+
+    def run_async(self, func: Callable[[], Any]) -> Runner:
+        """
+        Обертка для корутин: loops вызовов выполняются за один запуск цикла
+        событий, чтобы не измерять его создание
+        """
+        async def repeat(loops: int):
+            for _ in range(loops):
+                await func()
+
+        return lambda loops: self.loop.run_until_complete(repeat(loops))
+
+    def random_telegram_ids(self, count: int = 10_000) -> List[int]:
+        """Telegram ID существующих пользователей в случайном порядке"""
+        return [FIRST_TELEGRAM_ID + self.random.randrange(self.users) for _ in range(count)]
+
+    def close(self):
+        if self._db is not None:
+            self.loop.run_until_complete(self._db.close())
+        self.loop.close()
+
+
+# Модели
+
+def _sample_user(index: int = 1) -> User:
+    return User(
+        id=index, telegram_id=FIRST_TELEGRAM_ID + index, username=f'user_{index}',
+        first_name='Иван', last_name='Петров', created_at=1_700_000_000 + index,
+        referral_code='a1B2c3', referred_by=None, is_active=True, is_blocked=False,
+        updated_at=1_700_000_100 + index
+    )
+
+
+@benchmark('models.user.to_dict')
+def bench_user_to_dict(context: BenchmarkContext) -> Runner:
+    user = _sample_user()
+
+    def run(loops: int):
+        for _ in range(loops):
+            user.to_dict()
+    return run
+
+
+@benchmark('models.user.from_dict')
+def bench_user_from_dict(context: BenchmarkContext) -> Runner:
+    data = _sample_user().to_dict()
+    from_dict = User.from_dict
+
+    def run(loops: int):
+        for _ in range(loops):
+            from_dict(data)
+    return run
+
+
+@benchmark('models.user.round_trip')
+def bench_user_round_trip(context: BenchmarkContext) -> Runner:
+    user = _sample_user()
+    from_dict = User.from_dict
+
+    def run(loops: int):
+        for _ in range(loops):
+            from_dict(user.to_dict())
+    return run
+
+
+@benchmark('models.file.round_trip')
+def bench_file_round_trip(context: BenchmarkContext) -> Runner:
+    file = File(
+        id=1, user_id=1, file_path='uploads/ab/cd/abcdef', file_name='notes.pdf', file_size=123456,
+        file_type='pdf', content_hash='ab' * 32, telegram_file_unique_id='AgADBAADr6cxG',
+        uploaded_at=1_700_000_000, is_active=True
+    )
+    from_dict = File.from_dict
+
+    def run(loops: int):
+        for _ in range(loops):
+            from_dict(file.to_dict())
+    return run
+
+
+@benchmark('models.user.from_rows_100')
+def bench_user_from_rows(context: BenchmarkContext) -> Runner:
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'CREATE TABLE users ({", ".join(User.FIELDS)})')
+    conn.executemany(
+        f'INSERT INTO users VALUES ({", ".join("?" * len(User.FIELDS))})',
+        [_sample_user(index).as_tuple() for index in range(100)]
+    )
+    rows = conn.execute(f'SELECT {", ".join(User.FIELDS)} FROM users').fetchall()
+    conn.close()
+    from_rows = User.from_rows
+
+    def run(loops: int):
+        for _ in range(loops):
+            from_rows(rows)
+    return run
+
+
+# Валидация
+
+REGISTRATION_RULES = {
+    'telegram_id': [validate_telegram_id],
+    'username': [validate_username],
+    'first_name': [validate_not_empty, lambda value: validate_length(value, 1, 64)],
+    'last_name': [lambda value: value is None or validate_length(value, 0, 64)],
+    'email': [validate_email],
+    'phone': [validate_phone],
+    'website': [validate_url],
+}
+
+
+def _registration_payloads(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    payloads = []
+    for index in range(count):
+        payload = {
+            'telegram_id': FIRST_TELEGRAM_ID + index,
+            'username': f'user_{index:06d}',
+            'first_name': rng.choice(['Иван', 'Anna', 'Мария', 'Oleg']),
+            'last_name': rng.choice([None, 'Петров', 'Smith']),
+            'email': f'user{index}@example.com',
+            'phone': f'+7 (900) {index % 1000:03d}-{index % 100:02d}-{index % 97:02d}',
+            'website': f'https://example.com/users/{index}?ref=bot',
+        }
+        # Каждая пятая анкета заполнена с ошибками
+        if index % 5 == 0:
+            payload.update(username='1bad name', email='not-an-email', phone='12345', telegram_id='-1')
+        payloads.append(payload)
+    return payloads
+
+
+@benchmark('validators.validate_data.registration')
+def bench_validate_data(context: BenchmarkContext) -> Runner:
+    next_payload = itertools.cycle(_registration_payloads(1000, context.random)).__next__
+
+    def run(loops: int):
+        for _ in range(loops):
+            validate_data(next_payload(), REGISTRATION_RULES)
+    return run
+
+
+# Маршрутизация
+
+async def _noop(message: Message):
+    pass
+
+
+def _make_router() -> MessageRouter:
+    # Те же маршруты, что регистрирует BotApplication
+    router = MessageRouter()
+    for name in ('start', 'queue', 'broadcast', 'top'):
+        router.command(name, _noop)
+    router.content('voice', _noop)
+    router.content('document', _noop)
+    router.content('photo', _noop)
+    router.keyword('программа', _noop)
+    router.keyword('реферал', _noop)
+    router.default(_noop)
+    return router
+
+
+def _make_message(**fields) -> Message:
+    return Message.model_validate({
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Иван'},
+        **fields,
+    })
+
+
+ROUTING_MESSAGES = {
+    'command': {'text': '/start a1B2c3'},
+    'keyword': {'text': 'Подскажите, как работает реферальная программа?'},
+    'default': {'text': 'Здравствуйте! ' * 40},
+    'document': {'document': {'file_id': 'f', 'file_unique_id': 'u', 'file_name': 'notes.pdf'}},
+}
+
+
+def _routing_benchmark(kind: str):
+    @benchmark(f'routing.resolve.{kind}')
+    def bench(context: BenchmarkContext) -> Runner:
+        router = _make_router()
+        message = _make_message(**ROUTING_MESSAGES[kind])
+        resolve = router.resolve_route
+        resolve(message)
+
+        def run(loops: int):
+            for _ in range(loops):
+                resolve(message)
+        return run
+    return bench
+
+
+for _kind in ROUTING_MESSAGES:
+    _routing_benchmark(_kind)
+
+
+# Запросы к базе данных
+
+@benchmark('db.user_service.get_user_by_telegram_id.cached', needs_database=True)
+def bench_user_lookup_cached(context: BenchmarkContext) -> Runner:
+    service = UserService(context.db)
+    telegram_ids = context.random_telegram_ids(1000)
+    for telegram_id in telegram_ids:
+        context.loop.run_until_complete(service.get_user_by_telegram_id(telegram_id))
+    next_id = itertools.cycle(telegram_ids).__next__
+    return context.run_async(lambda: service.get_user_by_telegram_id(next_id()))
+
+
+@benchmark('db.user_service.get_user_by_telegram_id.uncached', needs_database=True)
+def bench_user_lookup_uncached(context: BenchmarkContext) -> Runner:
+    service = UserService(context.db)
+    next_id = itertools.cycle(context.random_telegram_ids()).__next__
+
+    def lookup():
+        service._cache.clear()
+        return service.get_user_by_telegram_id(next_id())
+    return context.run_async(lookup)
+
+
+@benchmark('db.user_service.get_user_by_id', needs_database=True)
+def bench_user_by_id(context: BenchmarkContext) -> Runner:
+    service = UserService(context.db)
+    next_id = itertools.cycle([context.random.randrange(1, context.users + 1) for _ in range(10_000)]).__next__
+    return context.run_async(lambda: service.get_user_by_id(next_id()))
+
+
+@benchmark('db.referral_service.get_user_by_referral_code', needs_database=True)
+def bench_referral_code_lookup(context: BenchmarkContext) -> Runner:
+    service = ReferralService(context.db)
+    next_code = itertools.cycle([
+        service.codec.encode(context.random.randrange(1, context.users + 1)) for _ in range(10_000)
+    ]).__next__
+    return context.run_async(lambda: service.get_user_by_referral_code(next_code()))
+
+
+@benchmark('db.referral_service.get_referral_statistics', needs_database=True)
+def bench_referral_statistics(context: BenchmarkContext) -> Runner:
+    service = ReferralService(context.db)
+    next_id = itertools.cycle([context.random.randrange(1, context.users + 1) for _ in range(10_000)]).__next__
+    return context.run_async(lambda: service.get_referral_statistics(next_id()))
+
+
+def seed_database(path: str, users: int):
+    """
+    Создание базы данных с users пользователями, выданными реферальными
+    кодами и приглашениями (около трети пользователей приглашены).
+    База создается во временном файле и переименовывается после
+    заполнения, поэтому существующий файл всегда заполнен полностью.
+    :param path: Путь к файлу базы данных
+    :param users: Количество пользователей
+    """
+    temp_path = f'{path}.seeding'
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(temp_path + suffix):
+            os.remove(temp_path + suffix)
+    apply_migrations(temp_path)
+
+    codec = ReferralCodec(SECRET_KEY, REFERRAL_CODE_LENGTH)
+    rng = random.Random(1)
+    conn = sqlite3.connect(temp_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('BEGIN')
+    for start in range(1, users + 1, SEED_BATCH_SIZE):
+        rows = []
+        referrals = []
+        for user_id in range(start, min(start + SEED_BATCH_SIZE, users + 1)):
+            referred_by = rng.randrange(1, user_id) if user_id > 1 and rng.random() < REFERRED_SHARE else None
+            rows.append((
+                user_id, FIRST_TELEGRAM_ID + user_id - 1, f'user_{user_id}', 'Иван', None,
+                codec.encode(user_id), referred_by
+            ))
+            if referred_by is not None:
+                referrals.append((referred_by, user_id))
+        conn.executemany(
+            'INSERT INTO users (id, telegram_id, username, first_name, last_name, referral_code, referred_by) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        conn.executemany('INSERT INTO referrals (referrer_id, referred_id) VALUES (?, ?)', referrals)
+
+    # Счетчики первого уровня; для измерения чтения статистики глубина дерева не важна
+    conn.execute(
+        'INSERT INTO referral_stats (user_id, direct_count, total_count, last_referral_at) '
+        'SELECT referrer_id, COUNT(*), COUNT(*), ? FROM referrals GROUP BY referrer_id',
+        (time.time(),)
+    )
+    conn.execute(
+        'INSERT INTO referral_level_counts (user_id, depth, count) '
+        'SELECT referrer_id, 1, COUNT(*) FROM referrals GROUP BY referrer_id'
+    )
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+    os.replace(temp_path, path)
+
+
+def measure(run: Runner, min_time: float, repeat: int) -> Dict[str, Any]:
+    """
+    Измерение времени операции, как в timeit: количество повторов в одном
+    замере подбирается так, чтобы замер длился не меньше min_time, затем
+    выполняется repeat замеров
+    :param run: Функция, выполняющая операцию loops раз
+    :param min_time: Минимальная длительность одного замера в секундах
+    :param repeat: Количество замеров
+    :return: Количество повторов и время одной операции в секундах (min, median, stdev)
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        run(loops)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        run(loops)
+        timings.append((time.perf_counter() - started) / loops)
+    return {
+        'loops': loops,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def run_benchmarks(names: List[str] = None, database_path: Optional[str] = None, users: int = 1_000_000,
+                   min_time: float = 0.2, repeat: int = 5, progress: Callable[[str], None] = None) -> Dict[str, Any]:
+    """
+    Выполнение бенчмарков
+    :param names: Подстроки имен бенчмарков (по умолчанию все)
+    :param database_path: Файл базы данных с тестовыми данными (создается, если его нет)
+    :param users: Количество пользователей в базе
+    :param min_time: Минимальная длительность одного замера в секундах
+    :param repeat: Количество замеров
+    :param progress: Функция для вывода хода выполнения
+    :return: Результаты по именам бенчмарков
+    """
+    selected = [
+        item for item in BENCHMARKS
+        if not names or any(name in item.name for name in names)
+    ]
+    if any(item.needs_database for item in selected):
+        database_path = database_path or os.path.join(tempfile.gettempdir(), f'bot-benchmark-{users}.db')
+        if not os.path.exists(database_path):
+            if progress:
+                progress(f"Заполнение {database_path} ({users} пользователей)...")
+            seed_database(database_path, users)
+
+    context = BenchmarkContext(database_path, users)
+    results = {}
+    try:
+        for item in selected:
+            results[item.name] = measure(item.setup(context), min_time, repeat)
+            if progress:
+                progress(f"{item.name:<55}{_format_time(results[item.name]['min']):>12}")
+    finally:
+        context.close()
+    return results
+
+
+def _git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    """
+    Чтение истории запусков
+    :param path: Файл JSON Lines (по записи на запуск)
+    :return: Записи в порядке запуска
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def append_history(path: str, entry: Dict[str, Any]):
+    """Добавление записи о запуске в историю"""
+    with open(path, 'a', encoding='utf-8') as history:
+        history.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def find_baseline(history: List[Dict[str, Any]], ref: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Выбор записи для сравнения
+    :param history: История запусков
+    :param ref: Метка или начало хэша коммита (по умолчанию последняя запись)
+    :return: Запись или None
+    """
+    for entry in reversed(history):
+        if ref is None or entry.get('label') == ref or (entry.get('commit') or '').startswith(ref):
+            return entry
+    return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Сравнение с базовым запуском по лучшему замеру (он меньше всего
+    зависит от фоновой нагрузки)
+    :param results: Результаты текущего запуска
+    :param baseline: Запись истории для сравнения
+    :param threshold: Допустимое относительное замедление (0.1 — на 10%)
+    :return: Строки таблицы сравнения; замедления сверх порога помечены «!»
+    """
+    lines = [f"{'Бенчмарк':<55}{'было':>12}{'стало':>12}{'изменение':>12}"]
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            lines.append(f"{name:<55}{'—':>12}{_format_time(result['min']):>12}")
+            continue
+        change = result['min'] / previous['min'] - 1
+        mark = ' !' if change > threshold else ''
+        lines.append(
+            f"{name:<55}{_format_time(previous['min']):>12}{_format_time(result['min']):>12}"
+            f"{change:>+11.1%}{mark}"
+        )
+    return lines
+
+
+def regressions(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Имена бенчмарков, лучший замер которых вырос больше чем на threshold"""
+    return [
+        name for name, result in results.items()
+        if name in baseline['results'] and result['min'] > baseline['results'][name]['min'] * (1 + threshold)
+    ]
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (('с', 1), ('мс', 1e-3), ('мкс', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} нс'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарки моделей, валидации, маршрутизации и запросов')
+    parser.add_argument('filter', nargs='*', help='Подстроки имен бенчмарков (по умолчанию все)')
+    parser.add_argument('--list', action='store_true', help='Вывести имена бенчмарков')
+    parser.add_argument('--users', type=int, default=1_000_000, help='Пользователей в тестовой базе')
+    parser.add_argument('--database', help='Файл тестовой базы (по умолчанию во временном каталоге)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Минимальная длительность замера, с')
+    parser.add_argument('--repeat', type=int, default=5, help='Количество замеров')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='Файл истории запусков (JSON Lines)')
+    parser.add_argument('--label', help='Метка запуска, например baseline')
+    parser.add_argument('--baseline', help='Метка или коммит для сравнения (по умолчанию предыдущий запуск)')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Допустимое замедление, доля')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Завершиться с кодом 1 при замедлении сверх порога')
+    parser.add_argument('--no-save', action='store_true', help='Не записывать результаты в историю')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(item.name for item in BENCHMARKS))
+        return
+
+    results = run_benchmarks(
+        args.filter, args.database, args.users, args.min_time, args.repeat,
+        progress=lambda line: print(line, file=sys.stderr)
+    )
+    history = load_history(args.history)
+    baseline = find_baseline(history, args.baseline)
+
+    entry = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **_git_revision(),
+        'label': args.label,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'users': args.users, 'min_time': args.min_time, 'repeat': args.repeat},
+        'results': results,
+    }
+    if not args.no_save:
+        append_history(args.history, entry)
+
+    if baseline is None:
+        print("Нет запуска для сравнения")
+        return
+    print(f"Сравнение с {baseline.get('label') or baseline.get('commit')} от {baseline['timestamp']}")
+    print('\n'.join(compare(results, baseline, args.threshold)))
+
+    slower = regressions(results, baseline, args.threshold)
+    if slower and args.fail_on_regression:
+        print(f"Замедление больше {args.threshold:.0%}: {', '.join(slower)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
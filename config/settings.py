@@ -10,10 +10,19 @@ DEBUG: bool = os.getenv('DEBUG', 'False').lower() == 'true'
 # Настройки базы данных
 DATABASE_PATH: str = os.getenv('DATABASE_PATH', 'data/database.db')
 DATABASE_URL: str = os.getenv('DATABASE_URL', f'sqlite:///{DATABASE_PATH}')
+DATABASE_POOL_SIZE: int = int(os.getenv('DATABASE_POOL_SIZE', '4'))  # Количество соединений для чтения
+DATABASE_BUSY_TIMEOUT: int = int(os.getenv('DATABASE_BUSY_TIMEOUT', '5000'))  # Ожидание блокировки в миллисекундах
+DATABASE_CACHE_SIZE: int = int(os.getenv('DATABASE_CACHE_SIZE', '20000'))  # Размер кэша страниц SQLite в килобайтах
+DATABASE_STATEMENT_CACHE_SIZE: int = int(os.getenv('DATABASE_STATEMENT_CACHE_SIZE', '256'))  # Количество подготовленных запросов на соединение
 
 # Настройки логирования
 LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FILE: str = os.getenv('LOG_FILE', 'logs/app.log')
+LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'text')  # text или json (по строке JSON на запись)
+LOG_MAX_BYTES: int = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # Размер файла журнала до ротации
+LOG_BACKUP_COUNT: int = int(os.getenv('LOG_BACKUP_COUNT', '5'))  # Количество старых файлов журнала
+LOG_QUEUE_SIZE: int = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Записей в очереди; при переполнении записи отбрасываются
+LOG_DEBUG_SAMPLE_RATE: int = int(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1'))  # Записывается каждая N-я отладочная запись каждого вида
 
 # Настройки Redis (если используется)
 REDIS_HOST: str = os.getenv('REDIS_HOST', 'localhost')
@@ -23,15 +32,32 @@ REDIS_PASSWORD: Optional[str] = os.getenv('REDIS_PASSWORD', None)
 
 # Настройки кэширования
 CACHE_TTL: int = int(os.getenv('CACHE_TTL', '3600'))  # Время жизни кэша в секундах
+USER_CACHE_SIZE: int = int(os.getenv('USER_CACHE_SIZE', '100000'))  # Максимальное количество пользователей в кэше
+USER_CACHE_NEGATIVE_TTL: int = int(os.getenv('USER_CACHE_NEGATIVE_TTL', '60'))  # Время жизни записи об отсутствующем пользователе
 
 # Настройки API
 API_BASE_URL: str = os.getenv('API_BASE_URL', 'https://api.telegram.org/bot')
 REQUEST_TIMEOUT: int = int(os.getenv('REQUEST_TIMEOUT', '30'))
+TELEGRAM_API_SERVER: str = os.getenv('TELEGRAM_API_SERVER', '')  # Адрес собственного сервера Bot API, например http://localhost:8081 (по умолчанию api.telegram.org)
+
+# Настройки получения обновлений
+BOT_MODE: str = os.getenv('BOT_MODE', 'polling')  # polling или webhook
+WEBHOOK_BASE_URL: str = os.getenv('WEBHOOK_BASE_URL', '')  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH: str = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST: str = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT: int = int(os.getenv('WEBHOOK_PORT', '8000'))
+WEBHOOK_SECRET: Optional[str] = os.getenv('WEBHOOK_SECRET', None)
+WEBHOOK_WORKERS: int = int(os.getenv('WEBHOOK_WORKERS', '1'))  # Количество процессов, обрабатывающих обновления
+UPDATE_QUEUE_SIZE: int = int(os.getenv('UPDATE_QUEUE_SIZE', '10000'))  # Максимальное количество необработанных обновлений
+UPDATE_CONCURRENCY: int = int(os.getenv('UPDATE_CONCURRENCY', '64'))  # Количество параллельных обработчиков обновлений в процессе
 
 # Настройки файлов
 UPLOAD_FOLDER: str = os.getenv('UPLOAD_FOLDER', 'uploads/')
 MAX_CONTENT_LENGTH: int = int(os.getenv('MAX_CONTENT_LENGTH', '16777216'))  # 16MB
 ALLOWED_EXTENSIONS: set = set(os.getenv('ALLOWED_EXTENSIONS', 'txt,pdf,doc,docx,jpg,jpeg,png').split(','))
+DOWNLOAD_CHUNK_SIZE: int = int(os.getenv('DOWNLOAD_CHUNK_SIZE', '65536'))  # Размер блока при скачивании файлов
+DOWNLOAD_CONCURRENCY: int = int(os.getenv('DOWNLOAD_CONCURRENCY', '8'))  # Количество одновременных скачиваний
+PROGRAMS_FOLDER: str = os.getenv('PROGRAMS_FOLDER', 'programs/')  # Каталог с составленными программами
 
 # Настройки безопасности
 SECRET_KEY: str = os.getenv('SECRET_KEY', 'your-secret-key-here')
@@ -63,7 +89,76 @@ NOTIFICATION_TEMPLATES_DIR: str = os.getenv('NOTIFICATION_TEMPLATES_DIR', 'templ
 
 # Путь к директории с медиафайлами
 MEDIA_PATH: str = os.getenv('MEDIA_PATH', 'media/')
+INTRODUCTION_AUDIO_FILE: str = os.getenv('INTRODUCTION_AUDIO_FILE', 'introduction.mp3')  # Вводное аудио (относительно MEDIA_PATH)
+MEDIA_UPLOAD_CHAT_ID: Optional[int] = int(os.getenv('MEDIA_UPLOAD_CHAT_ID')) if os.getenv('MEDIA_UPLOAD_CHAT_ID') else None  # Служебный чат для предварительной загрузки медиафайлов
 
 # Настройки реферальной системы
 REFERRAL_CODE_LENGTH: int = int(os.getenv('REFERRAL_CODE_LENGTH', '6'))
-REFERRAL_REWARD_AMOUNT: int = int(os.getenv('REFERRAL_REWARD_AMOUNT', '100'))
\ No newline at end of file
+REFERRAL_REWARD_AMOUNT: int = int(os.getenv('REFERRAL_REWARD_AMOUNT', '100'))
+REFERRAL_MAX_DEPTH: int = int(os.getenv('REFERRAL_MAX_DEPTH', '10'))  # Глубина учета многоуровневых приглашений
+LEADERBOARD_METRIC: str = os.getenv('LEADERBOARD_METRIC', 'direct_count')  # direct_count или total_count
+LEADERBOARD_SIZE: int = int(os.getenv('LEADERBOARD_SIZE', '100'))  # Количество мест в таблице лидеров
+LEADERBOARD_PAGE_SIZE: int = int(os.getenv('LEADERBOARD_PAGE_SIZE', '10'))
+LEADERBOARD_CACHE_TTL: int = int(os.getenv('LEADERBOARD_CACHE_TTL', '30'))  # Время жизни отрисованной страницы в секундах
+LEADERBOARD_SYNC_INTERVAL: float = float(os.getenv('LEADERBOARD_SYNC_INTERVAL', '5'))  # Период подхвата изменений других процессов
+
+# Настройки онбординга
+ONBOARDING_AUDIO_DELAY: float = float(os.getenv('ONBOARDING_AUDIO_DELAY', '4'))  # Задержка перед отправкой вводного аудио в секундах
+ONBOARDING_MATERIALS_DELAY: float = float(os.getenv('ONBOARDING_MATERIALS_DELAY', '2'))  # Задержка перед предложением загрузить материалы в секундах
+
+# Настройки планировщика отложенных задач
+SCHEDULER_WORKERS: int = int(os.getenv('SCHEDULER_WORKERS', '4'))
+SCHEDULER_MAX_ATTEMPTS: int = int(os.getenv('SCHEDULER_MAX_ATTEMPTS', '3'))
+SCHEDULER_LEASE_TIMEOUT: int = int(os.getenv('SCHEDULER_LEASE_TIMEOUT', '60'))  # Через сколько секунд захваченная задача считается брошенной
+
+# Настройки пакетной регистрации пользователей
+REGISTRATION_BATCH_DELAY: float = float(os.getenv('REGISTRATION_BATCH_DELAY', '0.005'))  # Время накопления пакета в секундах
+REGISTRATION_BATCH_SIZE: int = int(os.getenv('REGISTRATION_BATCH_SIZE', '500'))  # Максимальный размер пакета
+
+# Настройки хранилища состояний пользователей
+STATE_STORAGE_BACKEND: str = os.getenv('STATE_STORAGE_BACKEND', 'sqlite')  # memory, sqlite или redis
+STATE_IDLE_TTL: int = int(os.getenv('STATE_IDLE_TTL', '604800'))  # Через сколько секунд бездействия состояние удаляется
+STATE_CACHE_SIZE: int = int(os.getenv('STATE_CACHE_SIZE', '100000'))  # Количество состояний, хранимых в памяти
+STATE_FLUSH_INTERVAL: float = float(os.getenv('STATE_FLUSH_INTERVAL', '1.0'))  # Период записи изменений в секундах
+STATE_FLUSH_BATCH_SIZE: int = int(os.getenv('STATE_FLUSH_BATCH_SIZE', '1000'))  # Максимальное количество изменений в одной записи
+
+# Настройки исходящих сообщений (ограничения Telegram)
+SEND_GLOBAL_RATE: float = float(os.getenv('SEND_GLOBAL_RATE', '30'))  # Сообщений в секунду для всего бота
+SEND_GLOBAL_BURST: int = int(os.getenv('SEND_GLOBAL_BURST', '30'))
+SEND_CHAT_RATE: float = float(os.getenv('SEND_CHAT_RATE', '1'))  # Сообщений в секунду для одного чата
+SEND_CHAT_BURST: int = int(os.getenv('SEND_CHAT_BURST', '3'))
+SEND_CONCURRENCY: int = int(os.getenv('SEND_CONCURRENCY', '32'))  # Количество одновременных запросов к Bot API
+SEND_MAX_RETRIES: int = int(os.getenv('SEND_MAX_RETRIES', '5'))  # Количество повторов после ответа 429
+
+# Настройки рассылок
+ADMIN_IDS: set = {int(admin_id) for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip()}  # Telegram ID администраторов
+BROADCAST_PAGE_SIZE: int = int(os.getenv('BROADCAST_PAGE_SIZE', '500'))  # Получателей на одну страницу выборки
+BROADCAST_CONCURRENCY: int = int(os.getenv('BROADCAST_CONCURRENCY', '100'))  # Сообщений рассылки в очереди отправки одновременно
+BROADCAST_LEASE_TIMEOUT: int = int(os.getenv('BROADCAST_LEASE_TIMEOUT', '60'))  # Через сколько секунд без продления рассылка считается брошенной
+
+# Настройки извлечения текста из загруженных материалов
+EXTRACTION_QUEUE_SIZE: int = int(os.getenv('EXTRACTION_QUEUE_SIZE', '1000'))  # Максимальное количество файлов в очереди обработки
+EXTRACTION_TIMEOUT: float = float(os.getenv('EXTRACTION_TIMEOUT', '60'))  # Максимальное время обработки одного файла в секундах
+EXTRACTION_MAX_ATTEMPTS: int = int(os.getenv('EXTRACTION_MAX_ATTEMPTS', '3'))
+EXTRACTION_MAX_TEXT_LENGTH: int = int(os.getenv('EXTRACTION_MAX_TEXT_LENGTH', '1000000'))  # Максимальная длина сохраняемого текста
+EXTRACTION_SCAN_INTERVAL: float = float(os.getenv('EXTRACTION_SCAN_INTERVAL', '30'))  # Период поиска необработанных файлов в секундах
+
+# Настройки очереди составления программ
+PROGRAM_WORKERS: int = int(os.getenv('PROGRAM_WORKERS', '4'))  # Количество одновременно составляемых программ в процессе
+PROGRAM_MAX_ATTEMPTS: int = int(os.getenv('PROGRAM_MAX_ATTEMPTS', '3'))
+PROGRAM_LEASE_TIMEOUT: int = int(os.getenv('PROGRAM_LEASE_TIMEOUT', '120'))  # Через сколько секунд без продления задача считается брошенной
+PROGRAM_POLL_INTERVAL: float = float(os.getenv('PROGRAM_POLL_INTERVAL', '5'))  # Период проверки очереди в секундах
+PROGRAM_MATERIALS_WAIT: int = int(os.getenv('PROGRAM_MATERIALS_WAIT', '600'))  # Сколько секунд ждать обработки материалов
+PROGRAM_RETRY_DELAY: float = float(os.getenv('PROGRAM_RETRY_DELAY', '10'))  # Задержка перед повторной проверкой материалов
+
+# Настройки выгрузки и загрузки данных
+TRANSFER_BATCH_SIZE: int = int(os.getenv('TRANSFER_BATCH_SIZE', '5000'))  # Строк в одной странице выгрузки и транзакции загрузки
+
+# Настройки защиты от спама (ограничение частоты сообщений от пользователя)
+THROTTLE_BACKEND: str = os.getenv('THROTTLE_BACKEND', 'memory')  # memory или redis (общий лимит для всех процессов)
+THROTTLE_RATE: float = float(os.getenv('THROTTLE_RATE', '1'))  # Сообщений в секунду в среднем
+THROTTLE_BURST: int = int(os.getenv('THROTTLE_BURST', '5'))  # Сообщений подряд без ожидания
+
+# Настройки метрик Prometheus
+METRICS_HOST: str = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', '9100'))  # 0 отключает /metrics; процессы-обработчики webhook слушают следующие порты
@@ -0,0 +1,267 @@
+import sqlite3
+
+from database.migrations import add_column_if_missing
+
+
+DESCRIPTION = 'Исходная схема: пользователи, рефералы, задачи, состояния, рассылки, файлы и программы'
+
+
+def upgrade(conn: sqlite3.Connection):
+
+    # Таблица пользователей
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Реферальный код и пригласивший пользователь (в базах, созданных до миграций, колонок нет)
+    add_column_if_missing(conn, 'users', 'referral_code', 'TEXT')
+    add_column_if_missing(conn, 'users', 'referred_by', 'INTEGER REFERENCES users (id)')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_referral_code
+        ON users (referral_code)
+    ''')
+
+    # Таблица рефералов
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referrals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            referrer_id INTEGER,
+            referred_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (referrer_id) REFERENCES users (id),
+            FOREIGN KEY (referred_id) REFERENCES users (id)
+        )
+    ''')
+    # Пользователя можно пригласить только один раз
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_referrals_referred_id
+        ON referrals (referred_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_referrals_referrer_id
+        ON referrals (referrer_id)
+    ''')
+
+    # Дерево приглашений (таблица замыканий) и счетчики по нему
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_paths (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, depth, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_referral_paths_descendant
+        ON referral_paths (descendant_id, depth)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_stats (
+            user_id INTEGER PRIMARY KEY,
+            direct_count INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0,
+            last_referral_at REAL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_referral_stats_direct
+        ON referral_stats (direct_count DESC, user_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_referral_stats_total
+        ON referral_stats (total_count DESC, user_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_referral_stats_last_referral_at
+        ON referral_stats (last_referral_at)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_level_counts (
+            user_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, depth)
+        ) WITHOUT ROWID
+    ''')
+
+    # Таблица отложенных задач планировщика
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            run_at REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_status_run_at
+        ON scheduled_jobs (status, run_at)
+    ''')
+
+    # Таблица состояний пользователей
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_states (
+            user_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_states_updated_at
+        ON user_states (updated_at)
+    ''')
+
+    # Таблицы рассылок и статусов доставки
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            sent_count INTEGER NOT NULL DEFAULT 0,
+            failed_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            sent_at REAL NOT NULL,
+            PRIMARY KEY (broadcast_id, user_id),
+            FOREIGN KEY (broadcast_id) REFERENCES broadcasts (id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Таблица загруженных пользователями файлов (метаданные каждой загрузки)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            file_path TEXT NOT NULL,
+            file_name TEXT,
+            file_size INTEGER,
+            file_type TEXT,
+            content_hash TEXT,
+            telegram_file_unique_id TEXT,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (content_hash) REFERENCES file_blobs (content_hash)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_files_telegram_file_unique_id
+        ON files (telegram_file_unique_id)
+    ''')
+
+    # Содержимое файлов, общее для всех загрузок с одинаковым хэшем
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_blobs (
+            content_hash TEXT PRIMARY KEY,
+            blob_path TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+    # Текст и метаданные, извлеченные из содержимого файлов
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_texts (
+            content_hash TEXT PRIMARY KEY,
+            file_type TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            text TEXT,
+            metadata TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_texts_status
+        ON file_texts (status, content_hash)
+    ''')
+
+    # Составленные программы и очередь их составления
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS programs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT,
+            description TEXT,
+            content_path TEXT,
+            duration INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_programs_user_id ON programs (user_id)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS program_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            lease_token TEXT,
+            lease_expires_at REAL,
+            program_id INTEGER,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (program_id) REFERENCES programs (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_program_jobs_pending
+        ON program_jobs (status, available_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_program_jobs_lease
+        ON program_jobs (status, lease_expires_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_program_jobs_finished
+        ON program_jobs (status, finished_at)
+    ''')
+    # У пользователя не больше одной незавершенной задачи
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_program_jobs_active_user
+        ON program_jobs (user_id) WHERE status IN ('pending', 'running')
+    ''')
+
+    # Таблица Telegram file_id для медиафайлов по хэшу содержимого
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_files (
+            content_hash TEXT NOT NULL,
+            media_type TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            file_unique_id TEXT,
+            file_name TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (content_hash, media_type)
+        ) WITHOUT ROWID
+    ''')
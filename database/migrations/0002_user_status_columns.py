@@ -0,0 +1,13 @@
+import sqlite3
+
+from database.migrations import add_column_if_missing
+
+
+DESCRIPTION = 'Колонки is_active, is_blocked и updated_at модели User'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # ALTER TABLE допускает только постоянные значения по умолчанию, поэтому updated_at без CURRENT_TIMESTAMP
+    add_column_if_missing(conn, 'users', 'is_active', 'BOOLEAN NOT NULL DEFAULT 1')
+    add_column_if_missing(conn, 'users', 'is_blocked', 'BOOLEAN NOT NULL DEFAULT 0')
+    add_column_if_missing(conn, 'users', 'updated_at', 'TIMESTAMP')
@@ -0,0 +1,58 @@
+import sqlite3
+
+
+DESCRIPTION = 'Покрывающие индексы для частых выборок сервисов'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # Рефералы пользователя: поиск и выдача referred_id без чтения таблицы
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_referrals_referrer_referred
+        ON referrals (referrer_id, referred_id)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_referrals_referrer_id')
+
+    # Файлы пользователя в порядке загрузки (FileService, составление программ)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_files_user_active
+        ON files (user_id, is_active, id)
+    ''')
+    # Поиск уже сохраненного содержимого по file_unique_id Telegram
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_files_unique_id_hash
+        ON files (telegram_file_unique_id, content_hash)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_files_telegram_file_unique_id')
+
+    # Последняя активная программа пользователя
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_programs_user_active
+        ON programs (user_id, is_active, id)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_programs_user_id')
+
+    # Последняя задача пользователя и позиция в очереди
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_program_jobs_user
+        ON program_jobs (user_id, id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_program_jobs_status_id
+        ON program_jobs (status, id)
+    ''')
+
+    # Незавершенные рассылки при запуске
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_broadcasts_status
+        ON broadcasts (status, id)
+    ''')
+
+    # Обновление статистики планировщика после изменения набора индексов.
+    # Миграция держит блокировку записи, поэтому читается только выборка
+    # строк каждого индекса, а не таблицы целиком.
+    conn.execute('PRAGMA analysis_limit = 1000')
+    try:
+        for table in ('referrals', 'files', 'programs', 'program_jobs', 'broadcasts'):
+            conn.execute(f'ANALYZE {table}')
+    finally:
+        conn.execute('PRAGMA analysis_limit = 0')
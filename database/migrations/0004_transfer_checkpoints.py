@@ -0,0 +1,19 @@
+import sqlite3
+
+
+DESCRIPTION = 'Контрольные точки загрузки данных из файлов'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # Количество загруженных записей фиксируется в одной транзакции с самими записями
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transfer_checkpoints (
+            source TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            source_size INTEGER NOT NULL,
+            source_mtime REAL NOT NULL,
+            records INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (source, table_name)
+        ) WITHOUT ROWID
+    ''')
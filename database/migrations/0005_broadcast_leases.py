@@ -0,0 +1,12 @@
+import sqlite3
+
+from database.migrations import add_column_if_missing
+
+
+DESCRIPTION = 'Аренда рассылок процессами'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # Рассылку выполняет процесс, захвативший ее; аренда продлевается, пока рассылка идет
+    add_column_if_missing(conn, 'broadcasts', 'owner', 'TEXT')
+    add_column_if_missing(conn, 'broadcasts', 'lease_until', 'REAL')
@@ -0,0 +1,11 @@
+import sqlite3
+
+from database.migrations import add_column_if_missing
+
+
+DESCRIPTION = 'Захват файлов на извлечение текста'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # Время захвата файла процессом: файл в статусе running без обновления возвращается в очередь
+    add_column_if_missing(conn, 'file_texts', 'claimed_at', 'REAL')
@@ -0,0 +1,146 @@
+import importlib
+import logging
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from types import ModuleType
+from typing import List, Optional
+
+from config.settings import DATABASE_PATH, DATABASE_BUSY_TIMEOUT
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+
+@dataclass
+class Migration:
+    """
+    Версия схемы базы данных
+    """
+    version: int
+    name: str
+    description: str
+    module: ModuleType
+
+
+def add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """
+    Добавление колонки в существующую таблицу, если ее еще нет
+    :param conn: Соединение в транзакции миграции
+    :param table: Имя таблицы
+    :param column: Имя колонки
+    :param definition: Тип и ограничения колонки
+    """
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def load_migrations() -> List[Migration]:
+    """
+    Загрузка модулей миграций вида NNNN_name.py по возрастанию версии
+    :return: Список миграций
+    """
+    migrations = []
+    for file_name in sorted(os.listdir(os.path.dirname(__file__))):
+        match = MIGRATION_FILE_PATTERN.match(file_name)
+        if match is None:
+            continue
+        module = importlib.import_module(f'{__name__}.{file_name[:-3]}')
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            description=getattr(module, 'DESCRIPTION', ''),
+            module=module
+        ))
+
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Версии миграций должны идти подряд начиная с 1: {versions}")
+    return migrations
+
+
+def connect(db_path: str = DATABASE_PATH) -> sqlite3.Connection:
+    """
+    Соединение для миграций: WAL и ожидание блокировки, чтобы миграции
+    применялись к работающей базе, не прерывая читателей
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {DATABASE_BUSY_TIMEOUT}')
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _ensure_history_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration REAL NOT NULL
+        )
+    ''')
+
+
+def apply_migrations(db_path: str = DATABASE_PATH, target: Optional[int] = None) -> List[int]:
+    """
+    Применение недостающих миграций.
+
+    Каждая миграция выполняется в отдельной транзакции BEGIN IMMEDIATE
+    вместе с записью новой версии в PRAGMA user_version, поэтому схема
+    никогда не остается применённой наполовину. Версия перепроверяется
+    внутри транзакции, так что несколько одновременно запущенных процессов
+    применят каждую миграцию ровно один раз. В режиме WAL читатели
+    продолжают работу, пока миграция держит блокировку записи.
+    :param db_path: Путь к файлу базы данных
+    :param target: Версия, до которой применять миграции (по умолчанию последняя)
+    :return: Примененные версии
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    migrations = load_migrations()
+    target = len(migrations) if target is None else target
+    applied = []
+    conn = connect(db_path)
+    try:
+        for migration in migrations[:target]:
+            if get_version(conn) >= migration.version:
+                continue
+
+            started = time.monotonic()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if get_version(conn) >= migration.version:
+                    # Миграцию уже применил другой процесс
+                    conn.execute('ROLLBACK')
+                    continue
+                _ensure_history_table(conn)
+                migration.module.upgrade(conn)
+                duration = time.monotonic() - started
+                conn.execute(
+                    'INSERT OR REPLACE INTO schema_migrations (version, name, duration) VALUES (?, ?, ?)',
+                    (migration.version, migration.name, duration)
+                )
+                conn.execute(f'PRAGMA user_version = {migration.version}')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+            applied.append(migration.version)
+            logger.info("Применена миграция %04d_%s за %.2f с", migration.version, migration.name, duration)
+    finally:
+        conn.close()
+    return applied
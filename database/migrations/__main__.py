@@ -0,0 +1,34 @@
+import argparse
+import logging
+
+from config.settings import DATABASE_PATH
+from database.migrations import apply_migrations, connect, get_version, load_migrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Миграции схемы базы данных')
+    parser.add_argument('command', choices=['status', 'upgrade'], nargs='?', default='status')
+    parser.add_argument('--database', default=DATABASE_PATH, help='Путь к файлу базы данных')
+    parser.add_argument('--target', type=int, help='Версия, до которой применять миграции')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'upgrade':
+        applied = apply_migrations(args.database, args.target)
+        if not applied:
+            print('Схема актуальна')
+        return
+
+    conn = connect(args.database)
+    try:
+        version = get_version(conn)
+    finally:
+        conn.close()
+    for migration in load_migrations():
+        mark = 'x' if migration.version <= version else ' '
+        print(f'[{mark}] {migration.version:04d}_{migration.name}: {migration.description}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,253 @@
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 
-@dataclass
-class User:
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(value: Any) -> Optional[int]:
+    """
+    Приведение метки времени к целым секундам Unix.
+    Строки и наивные datetime считаются временем UTC, как CURRENT_TIMESTAMP в SQLite.
+    :param value: None, число, datetime или строка ISO
+    :return: Секунды Unix или None
+    """
+    if value is None or value.__class__ is int:
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return int(value.timestamp())
+        return calendar.timegm(value.timetuple())
+    return int(value)
+
+
+def to_bool(value: Any) -> Optional[bool]:
+    """
+    Приведение флага к bool: SQLite возвращает BOOLEAN числом 0 или 1
+    :param value: None, bool, число или строка из цифр
+    :return: bool или None
+    """
+    if value is None or value.__class__ is bool:
+        return value
+    if isinstance(value, str):
+        return bool(int(value))
+    return bool(value)
+
+
+class _Timestamp:
+    """
+    Поле метки времени: в слоте хранится целое число секунд,
+    datetime создается только при обращении к полю
+    """
+    __slots__ = ('slot', 'frozen')
+
+    def __init__(self, slot, frozen: bool):
+        self.slot = slot
+        self.frozen = frozen
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.slot.__get__(instance, owner)
+        return None if value is None else _EPOCH + timedelta(seconds=value)
+
+    def __set__(self, instance, value):
+        if self.frozen:
+            raise AttributeError(f"Объект {type(instance).__name__} нельзя изменить")
+        self.slot.__set__(instance, to_epoch(value))
+
+
+class BaseModel:
+    """
+    Базовая модель для всех моделей.
+
+    Поля описываются аннотациями класса, декоратор model создает по ним
+    слоты, конструктор и функции разбора строк базы данных.
+    """
+    __slots__ = ()
+
+    FIELDS: Tuple[str, ...] = ()  # Поля в порядке колонок таблицы
+    TIMESTAMPS: Tuple[str, ...] = ()  # Поля меток времени
+    BOOLEANS: Tuple[str, ...] = ()  # Поля-флаги, значения приводятся к bool
+    SQL_COLUMNS: str = ''  # Список колонок для SELECT, метки времени выбираются числом секунд
+    _defaults: Dict[str, Any] = {}
+    _mappers: Dict[Tuple[str, ...], Callable[[Sequence[Any]], 'BaseModel']] = {}
+
+    def as_tuple(self) -> tuple:
+        """Значения полей в порядке FIELDS (метки времени — секунды Unix)"""
+        raise NotImplementedError
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Преобразование модели в словарь"""
+        raise NotImplementedError
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BaseModel':
+        """Создание модели из словаря"""
+        return cls(**{name: data[name] for name in cls.FIELDS if name in data})
+
+    @classmethod
+    def row_mapper(cls, columns: Sequence[str]) -> Callable[[Sequence[Any]], 'BaseModel']:
+        """
+        Функция, создающая модель из кортежа значений колонок.
+        Функция генерируется один раз для каждого набора колонок и
+        заполняет слоты напрямую, без промежуточного словаря.
+        :param columns: Имена колонок в порядке значений строки
+        :return: Функция строка -> модель
+        """
+        columns = tuple(columns)
+        mapper = cls._mappers.get(columns)
+        if mapper is None:
+            mapper = cls._mappers[columns] = _compile_mapper(cls, columns)
+        return mapper
+
+    @classmethod
+    def from_row(cls, row) -> 'BaseModel':
+        """
+        Создание модели из строки sqlite3.Row
+        :param row: Строка результата запроса
+        :return: Модель
+        """
+        return cls.row_mapper(row.keys())(row)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Any]) -> List['BaseModel']:
+        """
+        Создание моделей из строк sqlite3.Row одного запроса
+        :param rows: Строки результата запроса
+        :return: Список моделей
+        """
+        if not rows:
+            return []
+        return list(map(cls.row_mapper(rows[0].keys()), rows))
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)
+        return f'{type(self).__name__}({values})'
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+
+def _slot_name(cls, name: str) -> str:
+    return f'_{name}' if name in cls.TIMESTAMPS else name
+
+
+def _compile(source: str, namespace: Dict[str, Any], name: str) -> Callable:
+    exec(source, namespace)
+    return namespace[name]
+
+
+def _compile_mapper(cls, columns: Tuple[str, ...]) -> Callable[[Sequence[Any]], BaseModel]:
+    index = {column: position for position, column in enumerate(columns)}
+    namespace = {'_new': object.__new__, '_cls': cls, '_ts': to_epoch, '_bool': to_bool, '_defaults': cls._defaults}
+    lines = ['def map_row(row):', '    obj = _new(_cls)']
+    for name in cls.FIELDS:
+        slot = _slot_name(cls, name)
+        namespace[f'_set_{slot}'] = cls.__dict__[slot].__set__
+        if name not in index:
+            value = f'_defaults[{name!r}]'
+        elif name in cls.TIMESTAMPS:
+            value = f'_ts(row[{index[name]}])'
+        elif name in cls.BOOLEANS:
+            value = f'_bool(row[{index[name]}])'
+        else:
+            value = f'row[{index[name]}]'
+        lines.append(f'    _set_{slot}(obj, {value})')
+    lines.append('    return obj')
+    return _compile('\n'.join(lines), namespace, 'map_row')
+
+
+def model(cls=None, *, frozen: bool = False):
+    """
+    Декоратор модели: создает класс со слотами по аннотациям полей.
+
+    Поля с аннотацией datetime хранятся как целые секунды Unix и
+    преобразуются в datetime при обращении, поля с аннотацией bool
+    приводятся к bool. Для frozen=True поля
+    нельзя изменить после создания, а модель можно хэшировать.
+    """
+    def wrap(cls):
+        fields = tuple(cls.__annotations__)
+        timestamps = tuple(
+            name for name, annotation in cls.__annotations__.items() if 'datetime' in str(annotation)
+        )
+        booleans = tuple(name for name, annotation in cls.__annotations__.items() if annotation in (bool, 'bool'))
+        defaults = {name: cls.__dict__.get(name) for name in fields}
+
+        namespace = {
+            key: value for key, value in cls.__dict__.items()
+            if key not in fields and key not in ('__dict__', '__weakref__')
+        }
+        namespace['__slots__'] = tuple(f'_{name}' if name in timestamps else name for name in fields)
+        namespace['FIELDS'] = fields
+        namespace['TIMESTAMPS'] = timestamps
+        namespace['BOOLEANS'] = booleans
+        namespace['SQL_COLUMNS'] = ', '.join(
+            f"CAST(strftime('%s', {name}) AS INTEGER) AS {name}" if name in timestamps else name
+            for name in fields
+        )
+        namespace['_defaults'] = defaults
+        namespace['_mappers'] = {}
+        new_cls = type(cls.__name__, cls.__bases__, namespace)
+
+        for name in timestamps:
+            setattr(new_cls, name, _Timestamp(new_cls.__dict__[f'_{name}'], frozen))
+        _add_methods(new_cls, frozen)
+        return new_cls
+
+    return wrap if cls is None else wrap(cls)
+
+
+def _add_methods(cls, frozen: bool):
+    namespace = {'_ts': to_epoch, '_bool': to_bool, '_defaults': cls._defaults, '_epoch': _EPOCH, '_delta': timedelta}
+    for name in cls.FIELDS:
+        slot = _slot_name(cls, name)
+        namespace[f'_set_{slot}'] = cls.__dict__[slot].__set__
+
+    parameters = ', '.join(f'{name}=_defaults[{name!r}]' for name in cls.FIELDS)
+    body = [
+        f'    _set_{_slot_name(cls, name)}(self, _ts({name}))' if name in cls.TIMESTAMPS
+        else f'    _set_{name}(self, _bool({name}))' if name in cls.BOOLEANS
+        else f'    _set_{name}(self, {name})'
+        for name in cls.FIELDS
+    ]
+    cls.__init__ = _compile(f'def __init__(self, {parameters}):\n' + '\n'.join(body), namespace, '__init__')
+
+    slots = ', '.join(f'self.{_slot_name(cls, name)}' for name in cls.FIELDS)
+    cls.as_tuple = _compile(f'def as_tuple(self):\n    return ({slots},)', namespace, 'as_tuple')
+
+    items = []
+    for name in cls.FIELDS:
+        if name in cls.TIMESTAMPS:
+            value = (f'(_epoch + _delta(seconds=self._{name})).isoformat() '
+                     f'if self._{name} is not None else None')
+        else:
+            value = f'self.{name}'
+        items.append(f'        {name!r}: {value},')
+    cls.to_dict = _compile('def to_dict(self):\n    return {\n' + '\n'.join(items) + '\n    }', namespace, 'to_dict')
+
+    if frozen:
+        def __setattr__(self, name, value):
+            raise AttributeError(f"Объект {type(self).__name__} нельзя изменить")
+
+        cls.__setattr__ = __setattr__
+        cls.__delattr__ = __setattr__
+        cls.__hash__ = lambda self: hash(self.as_tuple())
+    else:
+        cls.__hash__ = None
+
+    for method in (cls.__init__, cls.as_tuple, cls.to_dict):
+        method.__qualname__ = f'{cls.__name__}.{method.__name__}'
+
+
+@model(frozen=True)
+class User(BaseModel):
     """
     Модель пользователя
     """
@@ -19,43 +262,10 @@ class User:
     updated_at: Optional[datetime] = None
     is_active: bool = True
     is_blocked: bool = False
-    
-    def to_dict(self) -> Dict[str, Any]:
-        ""Преобразование модели в словарь"""
-        return {
-            'id': self.id,
-            'telegram_id': self.telegram_id,
-            'username': self.username,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'referral_code': self.referral_code,
-            'referred_by': self.referred_by,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'is_active': self.is_active,
-            'is_blocked': self.is_blocked
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'User':
-        ""Создание модели из словаря"""
-        return cls(
-            id=data.get('id'),
-            telegram_id=data.get('telegram_id'),
-            username=data.get('username'),
-            first_name=data.get('first_name'),
-            last_name=data.get('last_name'),
-            referral_code=data.get('referral_code'),
-            referred_by=data.get('referred_by'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
-            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None,
-            is_active=data.get('is_active', True),
-            is_blocked=data.get('is_blocked', False)
-        )
 
 
-@dataclass
-class Referral:
+@model(frozen=True)
+class Referral(BaseModel):
     """
     Модель реферала
     """
@@ -63,29 +273,10 @@ class Referral:
     referrer_id: Optional[int] = None
     referred_id: Optional[int] = None
     created_at: Optional[datetime] = None
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование модели в словарь"""
-        return {
-            'id': self.id,
-            'referrer_id': self.referrer_id,
-            'referred_id': self.referred_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Referral':
-        """Создание модели из словаря"""
-        return cls(
-            id=data.get('id'),
-            referrer_id=data.get('referrer_id'),
-            referred_id=data.get('referred_id'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None
-        )
 
 
-@dataclass
-class File:
+@model(frozen=True)
+class File(BaseModel):
     """
     Модель файла
     """
@@ -95,43 +286,19 @@ class File:
     file_name: Optional[str] = None
     file_size: Optional[int] = None
     file_type: Optional[str] = None
+    content_hash: Optional[str] = None
+    telegram_file_unique_id: Optional[str] = None
     uploaded_at: Optional[datetime] = None
     is_active: bool = True
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование модели в словарь"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'file_path': self.file_path,
-            'file_name': self.file_name,
-            'file_size': self.file_size,
-            'file_type': self.file_type,
-            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
-            'is_active': self.is_active
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'File':
-        ""Создание модели из словаря"""
-        return cls(
-            id=data.get('id'),
-            user_id=data.get('user_id'),
-            file_path=data.get('file_path'),
-            file_name=data.get('file_name'),
-            file_size=data.get('file_size'),
-            file_type=data.get('file_type'),
-            uploaded_at=datetime.fromisoformat(data['uploaded_at']) if data.get('uploaded_at') else None,
-            is_active=data.get('is_active', True)
-        )
 
 
-@dataclass
-class Program:
+@model
+class Program(BaseModel):
     """
     Модель программы
     """
     id: Optional[int] = None
+    user_id: Optional[int] = None
     title: Optional[str] = None
     description: Optional[str] = None
     content_path: Optional[str] = None
@@ -139,47 +306,3 @@ class Program:
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     is_active: bool = True
-    
-    def to_dict(self) -> Dict[str, Any]:
-        ""Преобразование модели в словарь"""
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'content_path': self.content_path,
-            'duration': self.duration,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'is_active': self.is_active
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Program':
-        ""Создание модели из словаря"""
-        return cls(
-            id=data.get('id'),
-            title=data.get('title'),
-            description=data.get('description'),
-            content_path=data.get('content_path'),
-            duration=data.get('duration'),
-            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None,
-            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None,
-            is_active=data.get('is_active', True)
-        )
-
-
-@dataclass
-class BaseModel:
-    ""
-    Базовая модель для всех моделей
-    """
-    id: Optional[int] = None
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Преобразование модели в словарь"""
-        raise NotImplementedError
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'BaseModel':
-        """Создание модели из словаря"""
-        raise NotImplementedError
\ No newline at end of file
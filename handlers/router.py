@@ -0,0 +1,139 @@
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import types
+
+from utils.keyword_matcher import KeywordMatcher
+from utils.metrics import REGISTRY
+
+
+MessageHandler = Callable[[types.Message], Awaitable[None]]
+Route = Tuple[str, MessageHandler]
+
+ROUTE_MESSAGES = REGISTRY.counter('bot_route_messages', 'Сообщения, обработанные маршрутом', ['route'])
+ROUTE_ERRORS = REGISTRY.counter('bot_route_errors', 'Ошибки обработчиков маршрутов', ['route'])
+HANDLER_SECONDS = REGISTRY.histogram('bot_handler_seconds', 'Время работы обработчика маршрута', ['route'])
+UPDATE_LATENCY_SECONDS = REGISTRY.histogram(
+    'bot_update_latency_seconds', 'Время от отправки сообщения пользователем до завершения обработчика', ['route'],
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+def parse_command(text: str) -> Tuple[str, str]:
+    """
+    Разбор команды вида /name@bot аргументы
+    :param text: Текст сообщения, начинающийся с /
+    :return: Имя команды в нижнем регистре и строка аргументов
+    """
+    head, _, args = text[1:].partition(' ')
+    return head.split('@', 1)[0].lower(), args.strip()
+
+
+class MessageRouter:
+    """
+    Маршрутизатор сообщений, подключаемый к диспетчеру одним обработчиком.
+
+    Сообщение классифицируется один раз: команда ищется в словаре по имени,
+    вложение — по заполненному полю сообщения, а все ключевые слова
+    ищутся одним проходом автомата Ахо — Корасик по тексту, приведенному
+    к нижнему регистру. Если в тексте встречается несколько ключевых слов,
+    в том числе перекрывающихся или вложенных одно в другое, выбирается
+    зарегистрированное раньше. Стоимость выбора маршрута не зависит
+    от количества команд и ключевых слов.
+    """
+
+    def __init__(self):
+        # Маршрут — пара (название для метрик, обработчик)
+        self._commands: Dict[str, Route] = {}
+        self._content: List[Tuple[str, Route]] = []
+        self._keywords: List[Tuple[str, Route]] = []
+        self._default: Optional[Route] = None
+        self._matcher: Optional[KeywordMatcher] = None
+
+    def command(self, name: str, handler: MessageHandler):
+        """
+        Регистрация обработчика команды
+        :param name: Имя команды без /
+        :param handler: Корутина, принимающая сообщение
+        """
+        self._commands[name.lower()] = (f'command:{name.lower()}', handler)
+
+    def content(self, field: str, handler: MessageHandler):
+        """
+        Регистрация обработчика вложений
+        :param field: Поле сообщения с вложением (voice, document, photo и т.д.)
+        :param handler: Корутина, принимающая сообщение
+        """
+        self._content.append((field, (f'content:{field}', handler)))
+
+    def keyword(self, word: str, handler: MessageHandler):
+        """
+        Регистрация обработчика сообщений, содержащих ключевое слово
+        :param word: Ключевое слово (ищется как подстрока без учета регистра)
+        :param handler: Корутина, принимающая сообщение
+        """
+        self._keywords.append((word.lower(), (f'keyword:{word.lower()}', handler)))
+        self._matcher = None
+
+    def default(self, handler: MessageHandler):
+        """
+        Регистрация обработчика остальных сообщений
+        :param handler: Корутина, принимающая сообщение
+        """
+        self._default = ('default', handler)
+
+    def resolve(self, message: types.Message) -> Optional[MessageHandler]:
+        """
+        Выбор обработчика для сообщения
+        :param message: Входящее сообщение
+        :return: Обработчик или None
+        """
+        route = self.resolve_route(message)
+        return route[1] if route is not None else None
+
+    def resolve_route(self, message: types.Message) -> Optional[Route]:
+        """
+        Выбор маршрута для сообщения
+        :param message: Входящее сообщение
+        :return: Название маршрута и обработчик или None
+        """
+        text = message.text
+        if text is None:
+            for field, route in self._content:
+                if getattr(message, field) is not None:
+                    return route
+            return self._default
+
+        if text.startswith('/'):
+            route = self._commands.get(parse_command(text)[0])
+            if route is not None:
+                return route
+
+        if self._keywords:
+            if self._matcher is None:
+                self._matcher = KeywordMatcher([word for word, _ in self._keywords])
+            # Номер слова совпадает с порядком регистрации
+            index = self._matcher.first_match(text.lower())
+            if index is not None:
+                return self._keywords[index][1]
+        return self._default
+
+    async def dispatch(self, message: types.Message):
+        """
+        Обработчик для диспетчера aiogram
+        :param message: Входящее сообщение
+        """
+        route = self.resolve_route(message)
+        if route is None:
+            return
+        name, handler = route
+        started = time.perf_counter()
+        try:
+            await handler(message)
+        except Exception:
+            ROUTE_ERRORS.labels(name).inc()
+            raise
+        finally:
+            ROUTE_MESSAGES.labels(name).inc()
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - started)
+            UPDATE_LATENCY_SECONDS.labels(name).observe(time.time() - message.date.timestamp())
@@ -0,0 +1,46 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+logger = logging.getLogger(__name__)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Защита от спама: ограничение частоты сообщений от одного пользователя.
+
+    Подключается внешним middleware, поэтому сообщения сверх лимита
+    отбрасываются до выбора обработчика и обращений к сервисам и базе данных.
+    Отброшенные сообщения не получают ответа, чтобы флуд не порождал
+    исходящий трафик.
+    """
+
+    def __init__(self, limiter, exempt: Iterable[int] = ()):
+        """
+        :param limiter: Ограничитель частоты (см. create_limiter)
+        :param exempt: Telegram ID пользователей без ограничения (администраторы)
+        """
+        self.limiter = limiter
+        self.exempt = frozenset(exempt)
+        self.passed = 0
+        self.throttled = 0
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get('event_from_user')
+        if user is not None and user.id not in self.exempt and not await self.limiter.allow(user.id):
+            self.throttled += 1
+            logger.debug("Сообщение пользователя %s отброшено ограничением частоты", user.id)
+            return None
+        self.passed += 1
+        return await handler(event, data)
+
+    def stats(self) -> dict:
+        """
+        Статистика ограничения частоты
+        :return: Количество пропущенных и отброшенных сообщений и отслеживаемых пользователей
+        """
+        return {'passed': self.passed, 'throttled': self.throttled, 'tracked': self.limiter.size()}
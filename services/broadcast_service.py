@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramForbiddenError
+
+from config.settings import BROADCAST_PAGE_SIZE, BROADCAST_CONCURRENCY, BROADCAST_LEASE_TIMEOUT
+from database.models import User
+from services.send_queue import SendQueue, SendPriority
+from services.user_service import UserService
+from utils.batching import WriteBatcher
+from utils.database import AsyncDatabase, get_async_database
+
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastService:
+    """
+    Сервис массовых рассылок.
+
+    Получатели читаются постранично по возрастанию ID, сообщения уходят через
+    очередь отправки с приоритетом BULK. Статус доставки каждому получателю
+    записывается пакетами в одной транзакции со счетчиками рассылки, а после
+    каждой страницы сохраняется ID последнего обработанного пользователя.
+    После сбоя рассылка продолжается с этой точки, а уже получившие сообщение
+    пользователи страницы пропускаются и не учитываются повторно.
+
+    Рассылку выполняет один процесс: он атомарно захватывает ее на время
+    аренды и продлевает аренду, пока рассылка идет. Рассылку упавшего
+    процесса после истечения аренды продолжает другой.
+    """
+
+    def __init__(self, send_queue: SendQueue, user_service: UserService, db: AsyncDatabase = None,
+                 page_size: int = BROADCAST_PAGE_SIZE, concurrency: int = BROADCAST_CONCURRENCY,
+                 lease_timeout: int = BROADCAST_LEASE_TIMEOUT):
+        """
+        Инициализация сервиса рассылок
+        :param send_queue: Очередь исходящих сообщений
+        :param user_service: Сервис пользователей (источник получателей)
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param page_size: Количество получателей на странице выборки
+        :param concurrency: Максимальное количество сообщений рассылки в очереди отправки
+        :param lease_timeout: Длительность аренды рассылки в секундах
+        """
+        self.send_queue = send_queue
+        self.user_service = user_service
+        self.db = db or get_async_database()
+        self.page_size = page_size
+        self.lease_timeout = lease_timeout
+        self.owner = uuid.uuid4().hex
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._deliveries = WriteBatcher(self._write_deliveries, max_delay=0.05, max_size=page_size)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._lost: Set[int] = set()
+        self._resume_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def create_broadcast(self, text: str) -> int:
+        """
+        Создание рассылки
+        :param text: Текст сообщения
+        :return: ID рассылки
+        """
+        cursor = await self.db.execute('INSERT INTO broadcasts (text) VALUES (?)', (text,))
+        return cursor.lastrowid
+
+    def start_broadcast(self, broadcast_id: int):
+        """
+        Запуск рассылки в фоне
+        :param broadcast_id: ID рассылки
+        """
+        if broadcast_id not in self._tasks:
+            task = asyncio.create_task(self._run(broadcast_id))
+            self._tasks[broadcast_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def start(self):
+        """
+        Продолжение незавершенных рассылок и периодический поиск рассылок,
+        брошенных другими процессами
+        """
+        await self.resume_unfinished()
+        self._resume_task = asyncio.create_task(self._resume_loop())
+
+    async def resume_unfinished(self):
+        """
+        Продолжение рассылок, прерванных остановкой или сбоем
+        """
+        rows = await self.db.fetchall(
+            "SELECT id FROM broadcasts WHERE status = 'pending' "
+            "OR (status = 'running' AND COALESCE(lease_until, 0) < ?) ORDER BY id",
+            (time.time(),)
+        )
+        for row in rows:
+            if row['id'] not in self._tasks:
+                logger.info("Продолжение рассылки %s", row['id'])
+                self.start_broadcast(row['id'])
+
+    async def get_broadcast_status(self, broadcast_id: int) -> Optional[dict]:
+        """
+        Получение прогресса рассылки
+        :param broadcast_id: ID рассылки
+        :return: Статус, счетчики и последний обработанный пользователь
+        """
+        row = await self.db.fetchone(
+            'SELECT id, status, last_user_id, sent_count, failed_count, created_at, finished_at '
+            'FROM broadcasts WHERE id = ?',
+            (broadcast_id,)
+        )
+        return dict(row) if row else None
+
+    async def stop(self):
+        """
+        Остановка рассылок. Уже переданные в очередь отправки сообщения
+        доставляются и учитываются, новые не отправляются. Прогресс сохранен,
+        рассылки продолжатся при следующем запуске.
+        """
+        self._stopping = True
+        if self._resume_task is not None:
+            self._resume_task.cancel()
+            await asyncio.gather(self._resume_task, return_exceptions=True)
+            self._resume_task = None
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        await self._deliveries.drain()
+        # Прогресс сохранен, поэтому аренда освобождается сразу
+        await self.db.execute(
+            "UPDATE broadcasts SET lease_until = 0 WHERE owner = ? AND status = 'running'",
+            (self.owner,)
+        )
+
+    async def _resume_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_timeout)
+            try:
+                await self.resume_unfinished()
+            except Exception as e:
+                logger.error("Не удалось проверить незавершенные рассылки: %s", e)
+
+    async def _claim(self, broadcast_id: int) -> Optional[dict]:
+        """
+        Захват рассылки, если она еще не начата или ее аренда истекла
+        :return: Текст и контрольная точка рассылки или None, если рассылка
+                 завершена или выполняется другим процессом
+        """
+        def claim(conn: sqlite3.Connection, now: float) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                "UPDATE broadcasts SET status = 'running', owner = ?, lease_until = ? "
+                "WHERE id = ? AND (status = 'pending' OR (status = 'running' AND COALESCE(lease_until, 0) < ?)) "
+                "RETURNING text, last_user_id",
+                (self.owner, now + self.lease_timeout, broadcast_id, now)
+            ).fetchone()
+
+        row = await self.db.transaction(claim, time.time())
+        return dict(row) if row else None
+
+    async def _heartbeat(self, broadcast_id: int):
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            try:
+                cursor = await self.db.execute(
+                    "UPDATE broadcasts SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                    (time.time() + self.lease_timeout, broadcast_id, self.owner)
+                )
+            except Exception as e:
+                logger.error("Не удалось продлить аренду рассылки %s: %s", broadcast_id, e)
+                continue
+            if cursor.rowcount == 0:
+                logger.warning("Рассылка %s перешла к другому процессу", broadcast_id)
+                self._lost.add(broadcast_id)
+                return
+
+    async def _run(self, broadcast_id: int):
+        broadcast = await self._claim(broadcast_id)
+        if broadcast is None:
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(broadcast_id))
+        try:
+            await self._send_all(broadcast_id, broadcast)
+        finally:
+            heartbeat.cancel()
+            self._lost.discard(broadcast_id)
+
+    async def _send_all(self, broadcast_id: int, broadcast: dict):
+
+        # Получатели страницы, на которой рассылка была прервана, уже получили сообщение
+        rows = await self.db.fetchall(
+            'SELECT user_id FROM broadcast_deliveries WHERE broadcast_id = ? AND user_id > ?',
+            (broadcast_id, broadcast['last_user_id'])
+        )
+        delivered = {row['user_id'] for row in rows}
+
+        start = time.monotonic()
+        page: List[User] = []
+        async for user in self.user_service.iter_users(self.page_size, broadcast['last_user_id']):
+            page.append(user)
+            if len(page) >= self.page_size:
+                await self._send_page(broadcast_id, broadcast['text'], page, delivered)
+                page = []
+                if self._stopping or broadcast_id in self._lost:
+                    return
+        if page:
+            await self._send_page(broadcast_id, broadcast['text'], page, delivered)
+            if self._stopping or broadcast_id in self._lost:
+                return
+
+        await self.db.execute(
+            "UPDATE broadcasts SET status = 'finished', finished_at = CURRENT_TIMESTAMP WHERE id = ? AND owner = ?",
+            (broadcast_id, self.owner)
+        )
+        logger.info("Рассылка %s завершена за %.1f с", broadcast_id, time.monotonic() - start)
+
+    async def _send_page(self, broadcast_id: int, text: str, users: List[User], delivered: Set[int]):
+        results = await asyncio.gather(*(
+            self._deliver(broadcast_id, text, user)
+            for user in users if user.id not in delivered
+        ))
+        await self._deliveries.drain()
+
+        # Счетчики уже обновлены вместе со статусами доставки. Если страница
+        # обработана не полностью (остановка), контрольная точка не сдвигается
+        if all(status is not None for status in results):
+            await self.db.execute(
+                'UPDATE broadcasts SET last_user_id = MAX(last_user_id, ?) WHERE id = ? AND owner = ?',
+                (users[-1].id, broadcast_id, self.owner)
+            )
+
+    async def _deliver(self, broadcast_id: int, text: str, user: User) -> Optional[str]:
+        async with self._semaphore:
+            if self._stopping:
+                return None
+            error = None
+            try:
+                await self.send_queue.send_message(user.telegram_id, text, SendPriority.BULK)
+                status = 'sent'
+            except TelegramForbiddenError as e:
+                status, error = 'blocked', str(e)
+            except Exception as e:
+                status, error = 'failed', str(e)
+
+        await self._deliveries.submit((broadcast_id, user.id, status, error, time.time()))
+        return status
+
+    async def _write_deliveries(self, batch: List[Tuple]) -> List[None]:
+        await self.db.transaction(self._insert_deliveries, batch)
+        return [None] * len(batch)
+
+    @staticmethod
+    def _insert_deliveries(conn: sqlite3.Connection, batch: List[Tuple]):
+        """
+        Выполняется в транзакции: запись статусов доставки и счетчиков рассылок.
+        Повторная запись о том же получателе не меняет ни статус, ни счетчики.
+        """
+        counts: Dict[int, List[int]] = {}
+        for broadcast_id, user_id, status, error, sent_at in batch:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO broadcast_deliveries (broadcast_id, user_id, status, error, sent_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (broadcast_id, user_id, status, error, sent_at)
+            )
+            if cursor.rowcount:
+                counts.setdefault(broadcast_id, [0, 0])[status != 'sent'] += 1
+        conn.executemany(
+            'UPDATE broadcasts SET sent_count = sent_count + ?, failed_count = failed_count + ? WHERE id = ?',
+            [(sent, failed, broadcast_id) for broadcast_id, (sent, failed) in counts.items()]
+        )
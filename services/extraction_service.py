@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Set, Tuple
+
+from config.settings import (
+    WORKER_COUNT, EXTRACTION_QUEUE_SIZE, EXTRACTION_TIMEOUT, EXTRACTION_MAX_ATTEMPTS,
+    EXTRACTION_MAX_TEXT_LENGTH, EXTRACTION_SCAN_INTERVAL
+)
+from database.models import File
+from utils.database import AsyncDatabase, get_async_database
+from utils.logging_config import get_process_log_queue, setup_child_logging
+from utils.text_extraction import UnsupportedDocumentError, extract_document
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionService:
+    """
+    Фоновое извлечение текста и метаданных из загруженных материалов.
+
+    Разбор документов выполняется в пуле процессов, цикл событий только
+    распределяет задачи и записывает результаты. Очередь ограничена: если
+    она заполнена, файл остается в статусе pending и будет поставлен в очередь
+    при следующем просмотре таблицы file_texts. Результат сохраняется сразу
+    после обработки каждого файла. Содержимое обрабатывается один раз
+    для каждого хэша, сколько бы раз его ни загружали.
+
+    Перед обработкой файл захватывается переводом в статус running, поэтому
+    несколько процессов не обрабатывают один файл одновременно. Файлы,
+    захваченные упавшим процессом, возвращаются в очередь при просмотре
+    таблицы. Если пул перезапускается из-за зависшего файла, остальные
+    выполнявшиеся в нем файлы обрабатываются заново без траты попытки.
+    """
+
+    def __init__(self, db: AsyncDatabase = None, worker_count: int = WORKER_COUNT,
+                 queue_size: int = EXTRACTION_QUEUE_SIZE, timeout: float = EXTRACTION_TIMEOUT,
+                 max_attempts: int = EXTRACTION_MAX_ATTEMPTS):
+        """
+        Инициализация сервиса извлечения текста
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param worker_count: Количество процессов обработки
+        :param queue_size: Максимальное количество файлов в очереди
+        :param timeout: Максимальное время обработки одного файла в секундах
+        :param max_attempts: Количество попыток до пометки файла как failed
+        """
+        self.db = db or get_async_database()
+        self.worker_count = max(1, worker_count)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._queued: Set[str] = set()
+        self._claimed: Set[str] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Пулы, остановленные из-за зависшего файла, а не из-за сбоя
+        self._killed_pools: 'weakref.WeakSet[ProcessPoolExecutor]' = weakref.WeakSet()
+        self._tasks: List[asyncio.Task] = []
+
+    async def submit(self, file: File) -> bool:
+        """
+        Постановка файла на обработку
+        :param file: Сохраненный файл
+        :return: True, если файл поставлен в очередь сразу
+        """
+        cursor = await self.db.execute(
+            'INSERT INTO file_texts (content_hash, file_type, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(content_hash) DO NOTHING',
+            (file.content_hash, file.file_type, time.time())
+        )
+        if cursor.rowcount == 0:
+            # Это содержимое уже обработано или ожидает обработки
+            return False
+        return self._enqueue((file.content_hash, file.file_path, file.file_type))
+
+    async def get_result(self, content_hash: str) -> Optional[dict]:
+        """
+        Получение результата обработки
+        :param content_hash: Хэш содержимого файла
+        :return: Статус, текст и метаданные или None
+        """
+        row = await self.db.fetchone(
+            'SELECT status, text, metadata, error FROM file_texts WHERE content_hash = ?',
+            (content_hash,)
+        )
+        if row is None:
+            return None
+        result = dict(row)
+        result['metadata'] = json.loads(result['metadata']) if result['metadata'] else {}
+        return result
+
+    def pending(self) -> int:
+        """Количество файлов в очереди и в обработке"""
+        return len(self._queued)
+
+    async def start(self, scan: bool = True):
+        """
+        Запуск пула процессов, обработчиков очереди и просмотра необработанных файлов
+        :param scan: Периодически искать необработанные файлы в базе данных.
+                     При нескольких процессах это делает только один.
+        """
+        self._pool = self._create_pool()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        if scan:
+            self._tasks.append(asyncio.create_task(self._scan_loop()))
+
+    async def stop(self):
+        """Остановка обработки; необработанные файлы останутся в статусе pending"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._claimed:
+            # Прерванные файлы сразу возвращаются в очередь
+            await self.db.executemany(
+                "UPDATE file_texts SET status = 'pending', claimed_at = NULL "
+                "WHERE content_hash = ? AND status = 'running'",
+                [(content_hash,) for content_hash in self._claimed]
+            )
+            self._claimed.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # spawn: дочерние процессы не наследуют потоки и соединения базы данных
+        return ProcessPoolExecutor(
+            max_workers=self.worker_count,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=setup_child_logging,
+            initargs=(get_process_log_queue(),)
+        )
+
+    def _restart_pool(self, pool: ProcessPoolExecutor, killed: bool = False):
+        """
+        Замена пула, в котором завис или упал процесс. Задачи, выполнявшиеся
+        в старом пуле, завершатся ошибкой и будут повторены
+        :param killed: Пул останавливается из-за зависшей задачи; остальным
+                       задачам этого пула попытка не засчитывается
+        """
+        if pool is not self._pool:
+            return
+        if killed:
+            self._killed_pools.add(pool)
+        self._pool = self._create_pool()
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _enqueue(self, job: Tuple[str, str, str]) -> bool:
+        if job[0] in self._queued:
+            return True
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        self._queued.add(job[0])
+        return True
+
+    async def _scan_loop(self):
+        while True:
+            # Файлы, захваченные упавшим или зависшим процессом, возвращаются в очередь
+            try:
+                await self.db.execute(
+                    "UPDATE file_texts SET status = 'pending', claimed_at = NULL "
+                    "WHERE status = 'running' AND claimed_at < ?",
+                    (time.time() - self.timeout * 2,)
+                )
+            except Exception as e:
+                logger.error("Не удалось вернуть брошенные файлы в очередь: %s", e)
+            last_hash = ''
+            while True:
+                rows = await self.db.fetchall(
+                    "SELECT t.content_hash, b.blob_path, t.file_type FROM file_texts t "
+                    "JOIN file_blobs b ON b.content_hash = t.content_hash "
+                    "WHERE t.status = 'pending' AND t.content_hash > ? "
+                    "ORDER BY t.content_hash LIMIT ?",
+                    (last_hash, self._queue.maxsize or 1000)
+                )
+                if not rows:
+                    break
+                for row in rows:
+                    if row['content_hash'] not in self._queued:
+                        # Ожидание места в очереди ограничивает скорость просмотра
+                        await self._queue.put(tuple(row))
+                        self._queued.add(row['content_hash'])
+                last_hash = rows[-1]['content_hash']
+            await asyncio.sleep(EXTRACTION_SCAN_INTERVAL)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка обработки файла %s: %s", job[0], e)
+            finally:
+                self._queued.discard(job[0])
+                self._queue.task_done()
+
+    async def _claim(self, content_hash: str) -> bool:
+        """
+        Захват файла на обработку
+        :return: False, если файл уже обработан или обрабатывается другим процессом
+        """
+        cursor = await self.db.execute(
+            "UPDATE file_texts SET status = 'running', claimed_at = ? "
+            "WHERE content_hash = ? AND status = 'pending'",
+            (time.time(), content_hash)
+        )
+        return cursor.rowcount > 0
+
+    async def _process(self, content_hash: str, path: str, file_type: str):
+        if not await self._claim(content_hash):
+            return
+        self._claimed.add(content_hash)
+        try:
+            await self._extract(content_hash, path, file_type)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._claimed.discard(content_hash)
+            raise
+        # Прерванный остановкой файл остается в _claimed и освобождается в stop()
+        self._claimed.discard(content_hash)
+
+    async def _extract(self, content_hash: str, path: str, file_type: str):
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        while True:
+            pool = self._pool
+            try:
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(pool, extract_document, path, file_type, EXTRACTION_MAX_TEXT_LENGTH),
+                    self.timeout
+                )
+            except UnsupportedDocumentError as e:
+                await self._save_status(content_hash, 'unsupported', str(e))
+            except asyncio.TimeoutError:
+                logger.warning("Обработка файла %s превысила %s с", content_hash, self.timeout)
+                self._restart_pool(pool, killed=True)
+                await self._save_failure(content_hash, 'timeout')
+            except BrokenProcessPool as e:
+                if pool in self._killed_pools:
+                    # Пул остановлен из-за другого файла: обработка повторяется без траты попытки
+                    await self.db.execute(
+                        'UPDATE file_texts SET claimed_at = ? WHERE content_hash = ?',
+                        (time.time(), content_hash)
+                    )
+                    continue
+                self._restart_pool(pool)
+                await self._save_failure(content_hash, str(e) or 'process pool broken')
+            except Exception as e:
+                await self._save_failure(content_hash, f'{type(e).__name__}: {e}')
+            else:
+                await self.db.execute(
+                    "UPDATE file_texts SET status = 'done', text = ?, metadata = ?, error = NULL, "
+                    "attempts = attempts + 1, claimed_at = NULL, updated_at = ? WHERE content_hash = ?",
+                    (result['text'], json.dumps(result['metadata'], ensure_ascii=False, default=str),
+                     time.time(), content_hash)
+                )
+                logger.info("Текст файла %s извлечен за %.2f с", content_hash, time.monotonic() - started)
+            return
+
+    async def _save_status(self, content_hash: str, status: str, error: str):
+        await self.db.execute(
+            'UPDATE file_texts SET status = ?, error = ?, attempts = attempts + 1, claimed_at = NULL, '
+            'updated_at = ? WHERE content_hash = ?',
+            (status, error, time.time(), content_hash)
+        )
+
+    async def _save_failure(self, content_hash: str, error: str):
+        # После исчерпания попыток файл больше не обрабатывается
+        await self.db.execute(
+            "UPDATE file_texts SET status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = ?, attempts = attempts + 1, claimed_at = NULL, updated_at = ? WHERE content_hash = ?",
+            (self.max_attempts, error, time.time(), content_hash)
+        )
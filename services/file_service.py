@@ -1,48 +1,146 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import uuid
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple, Union
+
+import aiofiles
+import aiofiles.os
+from aiogram import Bot
+
+from config.settings import (
+    UPLOAD_FOLDER, MAX_CONTENT_LENGTH, ALLOWED_EXTENSIONS, REQUEST_TIMEOUT,
+    DOWNLOAD_CHUNK_SIZE, DOWNLOAD_CONCURRENCY
+)
+from database.models import File
+from utils.database import AsyncDatabase, get_async_database
+
+
+class FileValidationError(ValueError):
+    """
+    Файл не прошел проверку (недопустимое расширение или превышен размер)
+    """
+
+
+def get_file_extension(filename: str) -> str:
+    """
+    Получение расширения файла в нижнем регистре
+    :param filename: Имя файла
+    :return: Расширение без точки или пустая строка
+    """
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+
+
+def _safe_filename(filename: str) -> str:
+    return re.sub(r'[^\w.\-]+', '_', os.path.basename(filename))[:100] or 'file'
+
+
 class FileService:
     """
-    Сервис для работы с файлами
+    Сервис для работы с файлами.
+
+    Содержимое хранится один раз по sha256 в каталоге blobs/ab/cd/<хэш>,
+    у каждого блоба есть счетчик ссылок. Строка в таблице files описывает
+    отдельную загрузку и ссылается на общий блоб; файл на диске удаляется,
+    когда на него не остается ссылок. Изменения счетчиков и операции с файлами
+    блобов выполняются в потоке записи базы данных, поэтому не гонятся друг с другом.
     """
-    
-    def __init__(self):
+
+    def __init__(self, db: AsyncDatabase = None, upload_folder: str = UPLOAD_FOLDER,
+                 download_concurrency: int = DOWNLOAD_CONCURRENCY):
         """
         Инициализация сервиса файлов
-        ""
-        pass
-    
-    async def upload_file(self, file_data, filename: str, user_id: int = None):
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param upload_folder: Каталог для хранения файлов
+        :param download_concurrency: Максимальное количество одновременных скачиваний
+        """
+        self.db = db or get_async_database()
+        self.upload_folder = upload_folder
+        self._downloads = asyncio.Semaphore(download_concurrency)
+
+    async def download_attachment(self, bot: Bot, telegram_file_id: str, filename: str,
+                                  user_id: int = None, file_size: int = None,
+                                  file_unique_id: str = None) -> File:
+        """
+        Потоковое скачивание вложения из Telegram.
+        Файл записывается на диск блоками, размер и хэш проверяются по мере
+        получения данных, поэтому файл целиком в памяти не находится.
+        Если содержимое с таким file_unique_id уже сохранено, файл не скачивается.
+        :param bot: Экземпляр бота
+        :param telegram_file_id: file_id вложения
+        :param filename: Имя файла
+        :param user_id: ID пользователя
+        :param file_size: Размер файла, если известен из сообщения
+        :param file_unique_id: Постоянный идентификатор содержимого в Telegram
+        :return: Информация о сохраненном файле
+        """
+        self._check_extension(filename)
+        if file_size is not None and file_size > MAX_CONTENT_LENGTH:
+            raise FileValidationError(f"Файл {filename} превышает допустимый размер {MAX_CONTENT_LENGTH} байт")
+
+        if file_unique_id is not None:
+            file = await self._link_known_content(file_unique_id, filename, user_id)
+            if file is not None:
+                return file
+
+        async with self._downloads:
+            telegram_file = await bot.get_file(telegram_file_id)
+            url = bot.session.api.file_url(bot.token, telegram_file.file_path)
+            stream = bot.session.stream_content(
+                url=url,
+                timeout=REQUEST_TIMEOUT,
+                chunk_size=DOWNLOAD_CHUNK_SIZE,
+                raise_for_status=True
+            )
+            return await self._store_stream(stream, filename, user_id, file_unique_id)
+
+    async def upload_file(self, file_data: Union[bytes, AsyncIterable[bytes]], filename: str, user_id: int = None):
         """
         Загрузка файла
-        :param file_data: Данные файла
+        :param file_data: Данные файла (байты или асинхронный поток блоков)
         :param filename: Имя файла
         :param user_id: ID пользователя (опционально)
         :return: Информация о загруженном файле
-        ""
-        pass
-    
-    async def download_file(self, file_id: str):
+        """
+        self._check_extension(filename)
+        if isinstance(file_data, (bytes, bytearray)):
+            file_data = self._iter_bytes(bytes(file_data))
+        return await self._store_stream(file_data, filename, user_id)
+
+    async def download_file(self, file_id: int) -> Optional[AsyncIterator[bytes]]:
         """
         Скачивание файла
         :param file_id: ID файла
-        :return: Данные файла
-        ""
-        pass
-    
-    async def get_file_info(self, file_id: str):
+        :return: Асинхронный поток блоков данных файла или None
+        """
+        file = await self.get_file_info(file_id)
+        if file is None:
+            return None
+        return self._iter_file(file.file_path)
+
+    async def get_file_info(self, file_id: int) -> Optional[File]:
         """
         Получение информации о файле
         :param file_id: ID файла
         :return: Информация о файле
-        ""
-        pass
-    
-    async def delete_file(self, file_id: str):
+        """
+        row = await self.db.fetchone(f'SELECT {File.SQL_COLUMNS} FROM files WHERE id = ? AND is_active = 1', (file_id,))
+        return File.from_row(row) if row else None
+
+    async def delete_file(self, file_id: int):
         """
         Удаление файла
         :param file_id: ID файла
         :return: Результат удаления
-        ""
-        pass
-    
+        """
+        released, orphan = await self.db.transaction(self._release_file, file_id)
+        if orphan is not None:
+            # Файл на диске удаляется только после фиксации транзакции
+            await self.db.transaction(self._remove_orphan_blob, *orphan)
+        return released
+
     async def update_file(self, file_id: str, new_file_data = None, new_filename: str = None):
         """
         Обновление файла
@@ -50,13 +148,167 @@ class FileService:
         :param new_file_data: Новые данные файла (опционально)
         :param new_filename: Новое имя файла (опционально)
         :return: Обновленная информация о файле
-        ""
+        """
         pass
-    
-    async def list_user_files(self, user_id: int):
+
+    async def list_user_files(self, user_id: int) -> List[File]:
         """
         Получение списка файлов пользователя
         :param user_id: ID пользователя
         :return: Список файлов пользователя
-        ""
-        pass
\ No newline at end of file
+        """
+        rows = await self.db.fetchall(
+            f'SELECT {File.SQL_COLUMNS} FROM files WHERE user_id = ? AND is_active = 1 ORDER BY id',
+            (user_id,)
+        )
+        return File.from_rows(rows)
+
+    def _check_extension(self, filename: str):
+        extension = get_file_extension(filename)
+        if extension not in ALLOWED_EXTENSIONS:
+            raise FileValidationError(f"Недопустимый тип файла: {filename}")
+
+    async def _store_stream(self, chunks: AsyncIterable[bytes], filename: str, user_id: Optional[int],
+                            file_unique_id: str = None) -> File:
+        """
+        Запись потока во временный файл с проверкой размера и вычислением хэша
+        и перенос содержимого в хранилище блобов
+        """
+        temp_folder = os.path.join(self.upload_folder, 'tmp')
+        await aiofiles.os.makedirs(temp_folder, exist_ok=True)
+        temp_path = os.path.join(temp_folder, f'{uuid.uuid4().hex}.part')
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > MAX_CONTENT_LENGTH:
+                        raise FileValidationError(f"Файл {filename} превышает допустимый размер {MAX_CONTENT_LENGTH} байт")
+                    digest.update(chunk)
+                    await f.write(chunk)
+
+            file_id = await self.db.transaction(
+                self._commit_blob, temp_path, digest.hexdigest(), size,
+                (user_id, filename, get_file_extension(filename), file_unique_id)
+            )
+        except BaseException:
+            if hasattr(chunks, 'aclose'):
+                await chunks.aclose()
+            try:
+                await aiofiles.os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return await self.get_file_info(file_id)
+
+    async def _link_known_content(self, file_unique_id: str, filename: str, user_id: Optional[int]) -> Optional[File]:
+        """
+        Новая запись о загрузке для уже сохраненного содержимого без скачивания
+        """
+        row = await self.db.fetchone(
+            'SELECT f.content_hash FROM files f JOIN file_blobs b ON b.content_hash = f.content_hash '
+            'WHERE f.telegram_file_unique_id = ? LIMIT 1',
+            (file_unique_id,)
+        )
+        if row is None:
+            return None
+        file_id = await self.db.transaction(
+            self._add_reference, row['content_hash'],
+            (user_id, filename, get_file_extension(filename), file_unique_id)
+        )
+        return await self.get_file_info(file_id) if file_id is not None else None
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.upload_folder, 'blobs', content_hash[:2], content_hash[2:4], content_hash)
+
+    def _commit_blob(self, conn: sqlite3.Connection, temp_path: str, content_hash: str, size: int,
+                     upload: Tuple) -> int:
+        """
+        Выполняется в транзакции: содержимое переносится в блоб, если его еще нет,
+        иначе временный файл удаляется
+        """
+        blob_path = self._blob_path(content_hash)
+        conn.execute(
+            'INSERT INTO file_blobs (content_hash, blob_path, file_size) VALUES (?, ?, ?) '
+            'ON CONFLICT(content_hash) DO NOTHING',
+            (content_hash, blob_path, size)
+        )
+        if os.path.exists(blob_path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(temp_path, blob_path)
+        return self._add_reference(conn, content_hash, upload)
+
+    @staticmethod
+    def _add_reference(conn: sqlite3.Connection, content_hash: str, upload: Tuple) -> Optional[int]:
+        """
+        Выполняется в транзакции: увеличение счетчика ссылок и запись о загрузке
+        :return: ID записи или None, если блоб уже удален
+        """
+        blob = conn.execute(
+            'UPDATE file_blobs SET ref_count = ref_count + 1 WHERE content_hash = ? '
+            'RETURNING blob_path, file_size',
+            (content_hash,)
+        ).fetchone()
+        if blob is None:
+            return None
+        user_id, filename, file_type, file_unique_id = upload
+        cursor = conn.execute(
+            'INSERT INTO files (user_id, file_path, file_name, file_size, file_type, content_hash, '
+            'telegram_file_unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (user_id, blob['blob_path'], filename, blob['file_size'], file_type, content_hash, file_unique_id)
+        )
+        return cursor.lastrowid
+
+    @staticmethod
+    def _release_file(conn: sqlite3.Connection, file_id: int) -> Tuple[bool, Optional[Tuple[str, str]]]:
+        """
+        Выполняется в транзакции: пометка записи удаленной и уменьшение счетчика
+        ссылок; запись блоба без ссылок удаляется
+        :return: Результат удаления и (хэш, путь) блоба, файл которого нужно удалить с диска
+        """
+        row = conn.execute(
+            'UPDATE files SET is_active = 0 WHERE id = ? AND is_active = 1 RETURNING content_hash',
+            (file_id,)
+        ).fetchone()
+        if row is None:
+            return False, None
+        blob = conn.execute(
+            'UPDATE file_blobs SET ref_count = ref_count - 1 WHERE content_hash = ? '
+            'RETURNING ref_count, blob_path',
+            (row['content_hash'],)
+        ).fetchone()
+        if blob is not None and blob['ref_count'] <= 0:
+            conn.execute('DELETE FROM file_blobs WHERE content_hash = ?', (row['content_hash'],))
+            return True, (row['content_hash'], blob['blob_path'])
+        return True, None
+
+    @staticmethod
+    def _remove_orphan_blob(conn: sqlite3.Connection, content_hash: str, blob_path: str):
+        """
+        Выполняется в транзакции после удаления записи блоба: файл удаляется,
+        только если тот же файл не был загружен снова после фиксации
+        """
+        if conn.execute('SELECT 1 FROM file_blobs WHERE content_hash = ?', (content_hash,)).fetchone():
+            return
+        try:
+            os.remove(blob_path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+        for start in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+            yield data[start:start + DOWNLOAD_CHUNK_SIZE]
+
+    @staticmethod
+    async def _iter_file(path: str) -> AsyncIterator[bytes]:
+        async with aiofiles.open(path, 'rb') as f:
+            while True:
+                chunk = await f.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
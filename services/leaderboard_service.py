@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import (
+    LEADERBOARD_METRIC, LEADERBOARD_SIZE, LEADERBOARD_PAGE_SIZE, LEADERBOARD_CACHE_TTL,
+    LEADERBOARD_SYNC_INTERVAL
+)
+from services.referral_service import ReferralService
+from utils.cache import MISSING, TTLCache
+from utils.database import AsyncDatabase, get_async_database
+from utils.leaderboard import Leaderboard
+
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderboardService:
+    """
+    Таблица лидеров по приглашениям.
+
+    При запуске таблица строится по referral_stats, затем обновляется
+    событиями ReferralService в этом процессе и периодическим чтением
+    строк referral_stats, измененных другими процессами. Счета только
+    растут, поэтому повторное применение одного изменения безопасно.
+    Отрисованные страницы кэшируются на короткое время.
+    """
+
+    def __init__(self, referral_service: ReferralService, db: AsyncDatabase = None,
+                 metric: str = LEADERBOARD_METRIC, size: int = LEADERBOARD_SIZE,
+                 page_size: int = LEADERBOARD_PAGE_SIZE, cache_ttl: int = LEADERBOARD_CACHE_TTL):
+        """
+        Инициализация таблицы лидеров
+        :param referral_service: Сервис рефералов (источник событий)
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param metric: Счетчик для сортировки: direct_count или total_count
+        :param size: Количество мест в таблице
+        :param page_size: Количество мест на странице
+        :param cache_ttl: Время жизни отрисованной страницы в секундах
+        """
+        if metric not in ('direct_count', 'total_count'):
+            raise ValueError(f"Неизвестный счетчик: {metric}")
+        self.db = db or get_async_database()
+        self.metric = metric
+        self.page_size = page_size
+
+        self._board = Leaderboard(size)
+        self._pages = TTLCache(max_size=size // page_size + 1, ttl=cache_ttl)
+        self._synced_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        referral_service.add_listener(self._on_referral)
+
+    async def start(self):
+        """Построение таблицы и запуск синхронизации"""
+        await self.rebuild()
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        """Остановка синхронизации"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def rebuild(self):
+        """Полное построение таблицы по referral_stats"""
+        synced_at = time.time()
+        rows = await self.db.fetchall(
+            f'SELECT user_id, {self.metric} AS score FROM referral_stats WHERE {self.metric} > 0'
+        )
+        self._board.clear()
+        for row in rows:
+            self._board.set_score(row['user_id'], row['score'])
+        self._pages.clear()
+        self._synced_at = synced_at
+        logger.info("Таблица лидеров построена: %s пользователей", len(rows))
+
+    def get_rank(self, user_id: int) -> Tuple[Optional[int], int]:
+        """
+        Место и счет пользователя
+        :param user_id: ID пользователя
+        :return: Место (None, если приглашений нет) и счет
+        """
+        return self._board.rank(user_id), self._board.score(user_id)
+
+    def size(self) -> int:
+        """Количество пользователей в таблице"""
+        return len(self._board)
+
+    async def render_page(self, page: int = 1) -> str:
+        """
+        Текст страницы таблицы лидеров
+        :param page: Номер страницы, начиная с 1
+        :return: Отрисованная страница
+        """
+        text = self._pages.get(page)
+        if text is not MISSING:
+            return text
+
+        entries = self._board.top((page - 1) * self.page_size, self.page_size)
+        if not entries:
+            text = "Пока никого нет." if page == 1 else "Такой страницы нет."
+        else:
+            names = await self._get_names([user_id for user_id, _ in entries])
+            first_place = (page - 1) * self.page_size + 1
+            text = '\n'.join(
+                f"{place}. {names.get(user_id, f'Пользователь {user_id}')} — {score}"
+                for place, (user_id, score) in enumerate(entries, first_place)
+            )
+        self._pages.set(page, text)
+        return text
+
+    def _on_referral(self, changes: Dict[int, Tuple[int, int]]):
+        for user_id, (direct, total) in changes.items():
+            delta = direct if self.metric == 'direct_count' else total
+            if delta:
+                self._board.add_score(user_id, delta)
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(LEADERBOARD_SYNC_INTERVAL)
+            try:
+                await self._sync()
+            except Exception as e:
+                logger.error("Ошибка синхронизации таблицы лидеров: %s", e)
+
+    async def _sync(self):
+        synced_at = time.time()
+        # Перекрытие на один период учитывает транзакции, зафиксированные позже своей метки времени
+        rows = await self.db.fetchall(
+            f'SELECT user_id, {self.metric} AS score FROM referral_stats WHERE last_referral_at >= ?',
+            (self._synced_at - LEADERBOARD_SYNC_INTERVAL,)
+        )
+        for row in rows:
+            self._board.set_score(row['user_id'], row['score'])
+        self._synced_at = synced_at
+
+    async def _get_names(self, user_ids: List[int]) -> Dict[int, str]:
+        placeholders = ', '.join('?' * len(user_ids))
+        rows = await self.db.fetchall(
+            f'SELECT id, username, first_name FROM users WHERE id IN ({placeholders})',
+            user_ids
+        )
+        return {
+            row['id']: f"@{row['username']}" if row['username'] else (row['first_name'] or f"Пользователь {row['id']}")
+            for row in rows
+        }
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendAudio, SendDocument, SendPhoto, SendVideo, SendVoice
+from aiogram.types import FSInputFile
+
+from config.settings import MEDIA_PATH, MEDIA_UPLOAD_CHAT_ID
+from services.send_queue import SendQueue, SendPriority
+from utils.database import AsyncDatabase, get_async_database
+
+
+logger = logging.getLogger(__name__)
+
+# Метод отправки и поле сообщения с файлом для каждого типа медиа
+MEDIA_METHODS = {
+    'audio': (SendAudio, 'audio'),
+    'voice': (SendVoice, 'voice'),
+    'photo': (SendPhoto, 'photo'),
+    'video': (SendVideo, 'video'),
+    'document': (SendDocument, 'document'),
+}
+
+MEDIA_TYPES_BY_EXTENSION = {
+    'mp3': 'audio', 'm4a': 'audio', 'flac': 'audio', 'wav': 'audio',
+    'ogg': 'voice', 'oga': 'voice',
+    'jpg': 'photo', 'jpeg': 'photo', 'png': 'photo', 'webp': 'photo',
+    'mp4': 'video', 'mov': 'video',
+}
+
+# Поля сообщения, в которых может оказаться отправленный файл: Telegram
+# может вернуть файл другого типа (например, аудио без тегов как документ)
+MESSAGE_MEDIA_FIELDS = ('audio', 'voice', 'document', 'video', 'animation', 'photo')
+
+# Ответы Telegram, означающие, что сохраненный file_id больше нельзя использовать
+FILE_ID_ERRORS = (
+    'wrong file identifier',
+    'wrong remote file identifier',
+    'file reference expired',
+    'file_reference_expired',
+    "can't use file of type",
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def guess_media_type(file_name: str) -> str:
+    """
+    Определение типа медиа по расширению файла
+    :param file_name: Имя файла
+    :return: audio, voice, photo, video или document
+    """
+    extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+    return MEDIA_TYPES_BY_EXTENSION.get(extension, 'document')
+
+
+def is_file_id_error(error: TelegramBadRequest) -> bool:
+    """
+    Проверка, что запрос отклонен из-за недействительного file_id
+    :param error: Ошибка Bot API
+    """
+    message = error.message.lower()
+    return any(marker in message for marker in FILE_ID_ERRORS)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaService:
+    """
+    Реестр медиафайлов из MEDIA_PATH.
+
+    Каждый файл загружается в Telegram один раз; полученный file_id хранится
+    в таблице media_files по хэшу содержимого и используется для повторных
+    отправок. Если файл на диске изменился, меняется его хэш, и при следующей
+    отправке файл загружается заново.
+    """
+
+    def __init__(self, send_queue: SendQueue, db: AsyncDatabase = None, media_path: str = MEDIA_PATH):
+        """
+        Инициализация реестра медиафайлов
+        :param send_queue: Очередь исходящих сообщений
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param media_path: Каталог с медиафайлами
+        """
+        self.send_queue = send_queue
+        self.db = db or get_async_database()
+        self.media_path = media_path
+
+        # Путь -> (размер, mtime, хэш): хэш пересчитывается только при изменении файла
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        # (хэш, тип медиа) -> file_id
+        self._file_ids: Dict[Tuple[str, str], str] = {}
+        self._upload_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    def exists(self, file_name: str) -> bool:
+        """
+        Проверка наличия медиафайла
+        :param file_name: Имя файла относительно каталога медиа
+        """
+        return os.path.isfile(os.path.join(self.media_path, file_name))
+
+    async def send_media(self, chat_id: int, file_name: str, media_type: str = None,
+                         priority: SendPriority = SendPriority.INTERACTIVE, **kwargs) -> Any:
+        """
+        Отправка медиафайла по сохраненному file_id или с загрузкой, если его еще нет
+        :param chat_id: ID чата
+        :param file_name: Имя файла относительно каталога медиа
+        :param media_type: Тип медиа (по умолчанию определяется по расширению)
+        :param priority: Приоритет в очереди отправки
+        :param kwargs: Дополнительные параметры метода (например, caption)
+        :return: Отправленное сообщение
+        """
+        media_type = media_type or guess_media_type(file_name)
+        path = os.path.join(self.media_path, file_name)
+        key = (await self._content_hash(path), media_type)
+
+        file_id = await self._get_file_id(key)
+        if file_id is not None:
+            try:
+                return await self._send(chat_id, media_type, file_id, priority, **kwargs)
+            except TelegramBadRequest as e:
+                if not is_file_id_error(e):
+                    raise
+                # file_id больше не действителен, файл будет загружен заново
+                logger.warning("Не удалось отправить %s по file_id: %s", file_name, e)
+                self._file_ids.pop(key, None)
+
+        lock = self._upload_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                # Пока ждали блокировку, файл мог загрузить другой запрос
+                file_id = self._file_ids.get(key)
+                if file_id is not None:
+                    return await self._send(chat_id, media_type, file_id, priority, **kwargs)
+
+                message = await self._send(chat_id, media_type, FSInputFile(path), priority, **kwargs)
+                await self._remember(key, file_name, message)
+                return message
+        finally:
+            # Блокировка удаляется и после ошибки загрузки, иначе словарь растет
+            if self._upload_locks.get(key) is lock:
+                del self._upload_locks[key]
+
+    async def send_audio(self, chat_id: int, file_name: str,
+                         priority: SendPriority = SendPriority.INTERACTIVE, **kwargs) -> Any:
+        """
+        Отправка аудиофайла из каталога медиа
+        """
+        return await self.send_media(chat_id, file_name, 'audio', priority, **kwargs)
+
+    async def preload(self, chat_id: Optional[int] = MEDIA_UPLOAD_CHAT_ID):
+        """
+        Предварительная загрузка всех файлов каталога медиа в служебный чат,
+        чтобы пользователи сразу получали файлы по file_id
+        :param chat_id: ID служебного чата (без него загрузка выполняется при первой отправке)
+        """
+        if chat_id is None or not os.path.isdir(self.media_path):
+            return
+
+        for file_name in sorted(os.listdir(self.media_path)):
+            if not os.path.isfile(os.path.join(self.media_path, file_name)):
+                continue
+            key = (await self._content_hash(os.path.join(self.media_path, file_name)), guess_media_type(file_name))
+            if await self._get_file_id(key) is None:
+                logger.info("Предварительная загрузка медиафайла %s", file_name)
+                await self.send_media(chat_id, file_name, priority=SendPriority.BULK)
+
+    async def _content_hash(self, path: str) -> str:
+        stat = await asyncio.to_thread(os.stat, path)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        content_hash = await asyncio.to_thread(_hash_file, path)
+        self._hashes[path] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        return content_hash
+
+    async def _get_file_id(self, key: Tuple[str, str]) -> Optional[str]:
+        file_id = self._file_ids.get(key)
+        if file_id is None:
+            row = await self.db.fetchone(
+                'SELECT file_id FROM media_files WHERE content_hash = ? AND media_type = ?',
+                key
+            )
+            if row is not None:
+                file_id = self._file_ids[key] = row['file_id']
+        return file_id
+
+    async def _send(self, chat_id: int, media_type: str, media: Any, priority: SendPriority, **kwargs) -> Any:
+        method_class, field = MEDIA_METHODS[media_type]
+        method = method_class(chat_id=chat_id, **{field: media}, **kwargs)
+        return await self.send_queue.send(chat_id, method, priority)
+
+    async def _remember(self, key: Tuple[str, str], file_name: str, message: Any):
+        expected = MEDIA_METHODS[key[1]][1]
+        media = getattr(message, expected, None)
+        for field in MESSAGE_MEDIA_FIELDS:
+            if media:
+                break
+            media = getattr(message, field, None)
+        if not media:
+            logger.warning("В ответе на отправку %s нет файла, file_id не сохранен", file_name)
+            return
+        if isinstance(media, list):
+            # Для фото Telegram возвращает несколько размеров, последний — оригинал
+            media = media[-1]
+
+        self._file_ids[key] = media.file_id
+        await self.db.execute(
+            'INSERT INTO media_files (content_hash, media_type, file_id, file_unique_id, file_name, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(content_hash, media_type) DO UPDATE SET '
+            'file_id = excluded.file_id, file_unique_id = excluded.file_unique_id, '
+            'file_name = excluded.file_name, updated_at = excluded.updated_at',
+            (key[0], key[1], media.file_id, media.file_unique_id, file_name, time.time())
+        )
@@ -0,0 +1,413 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+
+from config.settings import (
+    PROGRAMS_FOLDER, PROGRAM_WORKERS, PROGRAM_MAX_ATTEMPTS, PROGRAM_LEASE_TIMEOUT,
+    PROGRAM_POLL_INTERVAL, PROGRAM_MATERIALS_WAIT, PROGRAM_RETRY_DELAY
+)
+from database.models import Program
+from services.send_queue import SendQueue, SendPriority
+from utils.database import AsyncDatabase, get_async_database
+
+
+logger = logging.getLogger(__name__)
+
+READING_SPEED = 180  # Слов в минуту, для оценки длительности программы
+SUMMARY_LENGTH = 600  # Символов из каждого материала в описании раздела
+
+
+@dataclass
+class ProgramJob:
+    """
+    Захваченная задача составления программы
+    """
+    id: int
+    user_id: int
+    chat_id: int
+    attempts: int
+    created_at: float
+    lease_token: str
+
+
+class ProgramNotReady(Exception):
+    """
+    Материалы пользователя еще обрабатываются
+    """
+
+
+def _render_program(materials: List[Tuple[str, str]]) -> Tuple[str, int]:
+    """
+    Составление текста программы по материалам
+    :param materials: Пары (имя файла, извлеченный текст)
+    :return: Текст программы в Markdown и количество слов в материалах
+    """
+    lines = ['# Индивидуальная программа', '']
+    words = 0
+    for number, (file_name, text) in enumerate(materials, 1):
+        words += len(text.split())
+        summary = ' '.join(text[:SUMMARY_LENGTH].split())
+        if len(text) > SUMMARY_LENGTH:
+            summary += '…'
+        lines.append(f'## {number}. {file_name}')
+        lines.append('')
+        lines.append(summary or 'Текст из материала извлечь не удалось.')
+        lines.append('')
+    return '\n'.join(lines), words
+
+
+class ProgramService:
+    """
+    Очередь составления индивидуальных программ.
+
+    Задачи хранятся в таблице program_jobs. Воркер захватывает задачу
+    на время аренды и продлевает ее, пока работает; задача процесса,
+    который упал или завис, после истечения аренды захватывается снова.
+    Результат и смена статуса записываются только владельцем текущей
+    аренды. Пользователь получает сообщения о начале работы и о готовой
+    программе через очередь отправки.
+    """
+
+    def __init__(self, send_queue: SendQueue, db: AsyncDatabase = None,
+                 worker_count: int = PROGRAM_WORKERS, max_attempts: int = PROGRAM_MAX_ATTEMPTS,
+                 lease_timeout: int = PROGRAM_LEASE_TIMEOUT, programs_folder: str = PROGRAMS_FOLDER):
+        """
+        Инициализация очереди программ
+        :param send_queue: Очередь исходящих сообщений
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param worker_count: Количество одновременно составляемых программ
+        :param max_attempts: Максимальное количество попыток составления
+        :param lease_timeout: Длительность аренды задачи в секундах
+        :param programs_folder: Каталог для текстов программ
+        """
+        self.send_queue = send_queue
+        self.db = db or get_async_database()
+        self.worker_count = worker_count
+        self.max_attempts = max_attempts
+        self.lease_timeout = lease_timeout
+        self.programs_folder = programs_folder
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._active: Dict[int, ProgramJob] = {}
+
+    async def enqueue(self, user_id: int, chat_id: int) -> Optional[int]:
+        """
+        Постановка задачи составления программы
+        :param user_id: ID пользователя
+        :param chat_id: ID чата для уведомлений
+        :return: ID задачи или None, если у пользователя уже есть незавершенная задача
+        """
+        now = time.time()
+        cursor = await self.db.execute(
+            'INSERT OR IGNORE INTO program_jobs (user_id, chat_id, available_at, created_at) '
+            'VALUES (?, ?, ?, ?)',
+            (user_id, chat_id, now, now)
+        )
+        if cursor.rowcount == 0:
+            return None
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return cursor.lastrowid
+
+    async def get_job_status(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получение статуса последней задачи пользователя
+        :param user_id: ID пользователя
+        :return: Статус задачи и позиция в очереди (для ожидающих задач)
+        """
+        row = await self.db.fetchone(
+            'SELECT id, status, program_id, created_at, finished_at FROM program_jobs '
+            'WHERE user_id = ? ORDER BY id DESC LIMIT 1',
+            (user_id,)
+        )
+        if row is None:
+            return None
+        status = dict(row)
+        if status['status'] == 'pending':
+            ahead = await self.db.fetchone(
+                "SELECT COUNT(*) AS count FROM program_jobs WHERE status = 'pending' AND id < ?",
+                (status['id'],)
+            )
+            status['position'] = ahead['count'] + 1
+        return status
+
+    async def get_latest_program(self, user_id: int) -> Optional[Program]:
+        """
+        Получение последней составленной программы пользователя
+        :param user_id: ID пользователя
+        :return: Программа или None
+        """
+        row = await self.db.fetchone(
+            f'SELECT {Program.SQL_COLUMNS} FROM programs WHERE user_id = ? AND is_active = 1 ORDER BY id DESC LIMIT 1',
+            (user_id,)
+        )
+        return Program.from_row(row) if row else None
+
+    async def stats(self, window: float = 3600) -> Dict[str, Any]:
+        """
+        Глубина очереди и задержки
+        :param window: Период в секундах, за который считаются задержки
+        :return: Количество ожидающих и выполняемых задач, возраст самой старой
+                 ожидающей задачи, среднее ожидание и время выполнения за период
+        """
+        now = time.time()
+        rows = await self.db.fetchall(
+            "SELECT status, COUNT(*) AS count, MIN(created_at) AS oldest FROM program_jobs "
+            "WHERE status IN ('pending', 'running') GROUP BY status"
+        )
+        depth = {row['status']: row for row in rows}
+        latency = await self.db.fetchone(
+            "SELECT COUNT(*) AS done, AVG(started_at - created_at) AS wait, "
+            "AVG(finished_at - created_at) AS total, MAX(finished_at - created_at) AS max_total "
+            "FROM program_jobs WHERE status = 'done' AND finished_at >= ?",
+            (now - window,)
+        )
+        pending = depth.get('pending')
+        return {
+            'pending': pending['count'] if pending else 0,
+            'running': depth['running']['count'] if 'running' in depth else 0,
+            'oldest_pending_age': now - pending['oldest'] if pending else 0.0,
+            'done': latency['done'],
+            'avg_wait': latency['wait'] or 0.0,
+            'avg_latency': latency['total'] or 0.0,
+            'max_latency': latency['max_total'] or 0.0,
+        }
+
+    async def start(self):
+        """Запуск воркеров очереди"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """
+        Остановка воркеров. Прерванные задачи сразу возвращаются в очередь
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._active.values()):
+            await self._release(job, time.time(), None, attempts_delta=-1)
+        self._active.clear()
+
+    async def _worker(self):
+        while True:
+            try:
+                # Простаивающие воркеры проверяют очередь чтением, не занимая блокировку записи
+                expired, job = [], None
+                if await self._has_work(time.time()):
+                    expired, job = await self.db.transaction(self._claim_job, time.time(), uuid.uuid4().hex)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Не удалось захватить задачу составления программы: %s", e)
+                await asyncio.sleep(PROGRAM_POLL_INTERVAL)
+                continue
+
+            for chat_id in expired:
+                await self._notify(chat_id, "Не удалось составить программу. Попробуйте загрузить материалы еще раз.")
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), PROGRAM_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._active[job.id] = job
+            run = asyncio.create_task(self._run_job(job))
+            heartbeat = asyncio.create_task(self._heartbeat(job))
+            try:
+                await asyncio.wait((run, heartbeat), return_when=asyncio.FIRST_COMPLETED)
+                if run.done():
+                    run.result()
+                else:
+                    # Аренду захватил другой воркер: продолжение привело бы к повторной программе
+                    logger.warning("Аренда задачи составления программы %s потеряна, обработка прервана", job.id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка обработки задачи составления программы %s: %s", job.id, e)
+            finally:
+                heartbeat.cancel()
+                run.cancel()
+                await asyncio.gather(run, heartbeat, return_exceptions=True)
+            # Прерванная остановкой задача остается в _active и освобождается в stop()
+            self._active.pop(job.id, None)
+
+    async def _has_work(self, now: float) -> bool:
+        """
+        Проверка наличия задач, которые можно захватить, без транзакции записи
+        :param now: Текущее время
+        """
+        row = await self.db.fetchone(
+            "SELECT EXISTS (SELECT 1 FROM program_jobs WHERE status = 'running' AND lease_expires_at < ?) "
+            "OR EXISTS (SELECT 1 FROM program_jobs WHERE status = 'pending' AND available_at <= ?) AS ready",
+            (now, now)
+        )
+        return bool(row['ready'])
+
+    def _claim_job(self, conn: sqlite3.Connection, now: float, lease_token: str) -> Tuple[List[int], Optional[ProgramJob]]:
+        """
+        Выполняется в транзакции: задачи с истекшей арендой и исчерпанными
+        попытками помечаются как failed, затем захватывается следующая задача
+        :return: Чаты для уведомления о неудаче и захваченная задача
+        """
+        expired = conn.execute(
+            "UPDATE program_jobs SET status = 'failed', error = 'lease expired', finished_at = ? "
+            "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ? "
+            "RETURNING chat_id",
+            (now, now, self.max_attempts)
+        ).fetchall()
+
+        row = conn.execute(
+            "SELECT id FROM program_jobs WHERE status = 'running' AND lease_expires_at < ? "
+            "ORDER BY lease_expires_at LIMIT 1",
+            (now,)
+        ).fetchone() or conn.execute(
+            "SELECT id FROM program_jobs WHERE status = 'pending' AND available_at <= ? "
+            "ORDER BY available_at LIMIT 1",
+            (now,)
+        ).fetchone()
+
+        job = None
+        if row is not None:
+            claimed = conn.execute(
+                "UPDATE program_jobs SET status = 'running', lease_token = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, started_at = COALESCE(started_at, ?) WHERE id = ? "
+                "RETURNING id, user_id, chat_id, attempts, created_at",
+                (lease_token, now + self.lease_timeout, now, row['id'])
+            ).fetchone()
+            job = ProgramJob(lease_token=lease_token, **dict(claimed))
+        return [r['chat_id'] for r in expired], job
+
+    async def _heartbeat(self, job: ProgramJob):
+        """
+        Продление аренды задачи, пока она выполняется.
+        Завершается, только если аренда перешла к другому воркеру.
+        """
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            try:
+                cursor = await self.db.execute(
+                    "UPDATE program_jobs SET lease_expires_at = ? WHERE id = ? AND lease_token = ?",
+                    (time.time() + self.lease_timeout, job.id, job.lease_token)
+                )
+            except Exception as e:
+                logger.error("Не удалось продлить аренду задачи составления программы %s: %s", job.id, e)
+                continue
+            if cursor.rowcount == 0:
+                return
+
+    async def _run_job(self, job: ProgramJob):
+        try:
+            program = await self._generate(job)
+        except ProgramNotReady:
+            # Ожидание обработки материалов не считается попыткой и не входит в время выполнения
+            await self._release(job, time.time() + PROGRAM_RETRY_DELAY, None, attempts_delta=-1, reset_started=True)
+        except Exception as e:
+            if job.attempts >= self.max_attempts:
+                logger.error("Не удалось составить программу по задаче %s: %s", job.id, e)
+                if await self._fail(job, str(e)):
+                    await self._notify(job.chat_id, "Не удалось составить программу. Попробуйте загрузить материалы еще раз.")
+            else:
+                logger.warning("Ошибка составления программы по задаче %s, повтор через %s с: %s", job.id, 2 ** job.attempts, e)
+                await self._release(job, time.time() + 2 ** job.attempts, str(e))
+        else:
+            program.id = await self.db.transaction(self._store_program, job, program)
+            if program.id is not None:
+                latency = time.time() - job.created_at
+                logger.info("Программа %s для пользователя %s составлена за %.1f с", program.id, job.user_id, latency)
+                await self._notify(
+                    job.chat_id,
+                    f"Ваша индивидуальная программа готова. {program.description}. "
+                    f"Ориентировочная длительность — {program.duration} мин."
+                )
+
+    async def _generate(self, job: ProgramJob) -> Program:
+        rows = await self.db.fetchall(
+            'SELECT f.file_name, t.status, t.text FROM files f '
+            'LEFT JOIN file_texts t ON t.content_hash = f.content_hash '
+            'WHERE f.user_id = ? AND f.is_active = 1 ORDER BY f.id',
+            (job.user_id,)
+        )
+        in_progress = any(row['status'] in (None, 'pending', 'running') for row in rows)
+        if in_progress and time.time() - job.created_at < PROGRAM_MATERIALS_WAIT:
+            raise ProgramNotReady()
+
+        if job.attempts == 1:
+            await self._notify(job.chat_id, "Начали составлять вашу индивидуальную программу.")
+
+        materials = [(row['file_name'], row['text'] or '') for row in rows if row['status'] == 'done']
+        content, words = await asyncio.to_thread(_render_program, materials)
+
+        user_folder = os.path.join(self.programs_folder, str(job.user_id))
+        await aiofiles.os.makedirs(user_folder, exist_ok=True)
+        content_path = os.path.join(user_folder, f'{job.id}.md')
+        async with aiofiles.open(content_path, 'w', encoding='utf-8') as f:
+            await f.write(content)
+
+        return Program(
+            user_id=job.user_id,
+            title='Индивидуальная программа',
+            description=f'Составлена по загруженным материалам: {len(materials)} шт',
+            content_path=content_path,
+            duration=max(1, round(words / READING_SPEED))
+        )
+
+    @staticmethod
+    def _store_program(conn: sqlite3.Connection, job: ProgramJob, program: Program) -> Optional[int]:
+        """
+        Выполняется в транзакции: завершение задачи владельцем аренды и запись программы
+        :return: ID программы или None, если аренда уже перешла к другому воркеру
+        """
+        cursor = conn.execute(
+            "UPDATE program_jobs SET status = 'done', error = NULL, finished_at = ?, "
+            "lease_token = NULL, lease_expires_at = NULL WHERE id = ? AND lease_token = ?",
+            (time.time(), job.id, job.lease_token)
+        )
+        if cursor.rowcount == 0:
+            return None
+        program_id = conn.execute(
+            'INSERT INTO programs (user_id, title, description, content_path, duration) VALUES (?, ?, ?, ?, ?)',
+            (program.user_id, program.title, program.description, program.content_path, program.duration)
+        ).lastrowid
+        conn.execute('UPDATE program_jobs SET program_id = ? WHERE id = ?', (program_id, job.id))
+        return program_id
+
+    async def _release(self, job: ProgramJob, available_at: float, error: Optional[str], attempts_delta: int = 0,
+                       reset_started: bool = False):
+        await self.db.execute(
+            "UPDATE program_jobs SET status = 'pending', lease_token = NULL, lease_expires_at = NULL, "
+            "available_at = ?, error = ?, attempts = attempts + ?, "
+            "started_at = CASE WHEN ? THEN NULL ELSE started_at END WHERE id = ? AND lease_token = ?",
+            (available_at, error, attempts_delta, reset_started, job.id, job.lease_token)
+        )
+
+    async def _fail(self, job: ProgramJob, error: str) -> bool:
+        """
+        Пометка задачи как failed владельцем аренды
+        :return: False, если аренда уже перешла к другому воркеру
+        """
+        cursor = await self.db.execute(
+            "UPDATE program_jobs SET status = 'failed', error = ?, finished_at = ?, "
+            "lease_token = NULL, lease_expires_at = NULL WHERE id = ? AND lease_token = ?",
+            (error, time.time(), job.id, job.lease_token)
+        )
+        return cursor.rowcount == 1
+
+    async def _notify(self, chat_id: int, text: str):
+        try:
+            await self.send_queue.send_message(chat_id, text, SendPriority.ONBOARDING)
+        except Exception as e:
+            logger.warning("Не удалось отправить уведомление о программе в чат %s: %s", chat_id, e)
@@ -1,60 +1,276 @@
+import sqlite3
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import SECRET_KEY, REFERRAL_CODE_LENGTH, REFERRAL_MAX_DEPTH
+from database.models import User
+from services.user_service import UserService
+from utils.database import AsyncDatabase, get_async_database
+from utils.referral_codes import ReferralCodec
+
+
+# Получает {ID пользователя: (прирост прямых приглашений, прирост всех приглашений)}
+ReferralListener = Callable[[Dict[int, Tuple[int, int]]], None]
+
+
 class ReferralService:
     """
-    Сервис для работы с рефералами
+    Сервис для работы с рефералами.
+    
+    Реферальный код — обратимое кодирование ID пользователя (см. ReferralCodec),
+    поэтому коды не совпадают и не требуют повторных попыток генерации,
+    а пользователь по коду находится по первичному ключу.
+    
+    Дерево приглашений хранится таблицей замыканий referral_paths
+    (предок, потомок, глубина) до глубины REFERRAL_MAX_DEPTH, счетчики
+    referral_stats и referral_level_counts обновляются в той же транзакции,
+    что и регистрация приглашения. Статистика читается по первичному ключу,
+    а списки потомков — по индексу, за время, пропорциональное результату.
     """
     
-    def __init__(self):
+    def __init__(self, db: AsyncDatabase = None, codec: ReferralCodec = None, user_service: UserService = None):
         """
         Инициализация сервиса рефералов
-        ""
-        pass
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param codec: Кодирование ID в реферальный код (по умолчанию по SECRET_KEY)
+        :param user_service: Сервис пользователей, кэш которого сбрасывается
+                             после изменения referral_code и referred_by
+        """
+        self.db = db or get_async_database()
+        self.codec = codec or ReferralCodec(SECRET_KEY, REFERRAL_CODE_LENGTH)
+        self.user_service = user_service
+        self._listeners: List[ReferralListener] = []
+    
+    def add_listener(self, listener: ReferralListener):
+        """
+        Подписка на изменения счетчиков после регистрации приглашения
+        :param listener: Функция, получающая приросты счетчиков по пользователям
+        """
+        self._listeners.append(listener)
     
-    async def create_referral_code(self, user_id: int):
+    async def create_referral_code(self, user_id: int) -> str:
         """
         Создание реферального кода для пользователя
         :param user_id: ID пользователя
         :return: Реферальный код
-        ""
-        pass
+        """
+        referral_code = self.codec.encode(user_id)
+        row = await self.db.transaction(
+            lambda conn: conn.execute(
+                'UPDATE users SET referral_code = ? WHERE id = ? AND referral_code IS NULL RETURNING telegram_id',
+                (referral_code, user_id)
+            ).fetchone()
+        )
+        if row is not None:
+            self._invalidate_user(row['telegram_id'])
+        return referral_code
     
-    async def get_referral_code_by_user_id(self, user_id: int):
+    async def get_referral_code_by_user_id(self, user_id: int) -> Optional[str]:
         """
         Получение реферального кода по ID пользователя
         :param user_id: ID пользователя
-        :return: Реферальный код
-        ""
-        pass
+        :return: Реферальный код или None, если код еще не выдан
+        """
+        row = await self.db.fetchone('SELECT referral_code FROM users WHERE id = ?', (user_id,))
+        return row['referral_code'] if row else None
     
-    async def get_user_by_referral_code(self, referral_code: str):
+    async def get_user_by_referral_code(self, referral_code: str) -> Optional[User]:
         """
         Получение пользователя по реферальному коду
         :param referral_code: Реферальный код
         :return: Информация о пользователе
-        ""
-        pass
+        """
+        user_id = self.codec.decode(referral_code)
+        if user_id is None:
+            return None
+        # Сравнение с сохраненным кодом отсекает коды, которые еще не выдавались
+        row = await self.db.fetchone(
+            f'SELECT {User.SQL_COLUMNS} FROM users WHERE id = ? AND referral_code = ?',
+            (user_id, referral_code)
+        )
+        return User.from_row(row) if row else None
     
-    async def register_referral_usage(self, referrer_id: int, referee_id: int, referral_code: str):
+    async def register_referral_usage(self, referrer_id: int, referee_id: int, referral_code: str) -> bool:
         """
         Регистрация использования реферального кода
         :param referrer_id: ID пользователя, который пригласил
         :param referee_id: ID пользователя, который использовал код
         :param referral_code: Реферальный код
-        :return: Результат регистрации
-        ""
-        pass
+        :return: Результат регистрации (False, если пользователь уже был приглашен)
+        """
+        if referrer_id == referee_id or self.codec.decode(referral_code) != referrer_id:
+            return False
+        result = await self.db.transaction(self._register_referral, referrer_id, referee_id)
+        if result is None:
+            return False
+        changes, telegram_id = result
+        self._invalidate_user(telegram_id)
+        for listener in self._listeners:
+            listener(changes)
+        return True
+    
+    def _register_referral(self, conn: sqlite3.Connection, referrer_id: int,
+                           referee_id: int) -> Optional[Tuple[Dict[int, Tuple[int, int]], Optional[int]]]:
+        """
+        Выполняется в транзакции: запись приглашения, путей дерева и счетчиков
+        :return: Приросты счетчиков и Telegram ID приглашенного или None,
+                 если приглашение не зарегистрировано
+        """
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO referrals (referrer_id, referred_id) VALUES (?, ?)',
+            (referrer_id, referee_id)
+        )
+        if cursor.rowcount == 0:
+            return None
+        changes = self._add_paths(conn, referrer_id, referee_id, time.time())
+        if changes is None:
+            # Приглашенный уже находится выше пригласившего в дереве
+            conn.execute('DELETE FROM referrals WHERE referred_id = ?', (referee_id,))
+            return None
+        row = conn.execute(
+            'UPDATE users SET referred_by = ? WHERE id = ? RETURNING telegram_id',
+            (referrer_id, referee_id)
+        ).fetchone()
+        return changes, row['telegram_id'] if row else None
+
+    def _invalidate_user(self, telegram_id: Optional[int]):
+        if self.user_service is not None and telegram_id is not None:
+            self.user_service.invalidate_cached(telegram_id)
+    
+    def _add_paths(self, conn: sqlite3.Connection, referrer_id: int, referee_id: int,
+                   now: float) -> Optional[Dict[int, Tuple[int, int]]]:
+        """
+        Соединение поддерева приглашенного с цепочкой предков пригласившего
+        :return: Приросты счетчиков или None, если приглашение образует цикл
+        """
+        ancestors = [(referrer_id, 0)] + [
+            (row['ancestor_id'], row['depth']) for row in conn.execute(
+                'SELECT ancestor_id, depth FROM referral_paths WHERE descendant_id = ? AND depth < ?',
+                (referrer_id, REFERRAL_MAX_DEPTH)
+            )
+        ]
+        # У нового пользователя поддерево состоит только из него самого
+        subtree = [(referee_id, 0)] + [
+            (row['descendant_id'], row['depth']) for row in conn.execute(
+                'SELECT descendant_id, depth FROM referral_paths WHERE ancestor_id = ? AND depth < ?',
+                (referee_id, REFERRAL_MAX_DEPTH)
+            )
+        ]
+        if any(user_id == referrer_id for user_id, _ in subtree):
+            return None
+        
+        paths = [
+            (ancestor_id, descendant_id, ancestor_depth + descendant_depth + 1)
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in subtree
+            if ancestor_depth + descendant_depth + 1 <= REFERRAL_MAX_DEPTH
+        ]
+        conn.executemany(
+            'INSERT OR IGNORE INTO referral_paths (ancestor_id, descendant_id, depth) VALUES (?, ?, ?)',
+            paths
+        )
+        
+        levels = Counter((ancestor_id, depth) for ancestor_id, _, depth in paths)
+        conn.executemany(
+            'INSERT INTO referral_level_counts (user_id, depth, count) VALUES (?, ?, ?) '
+            'ON CONFLICT(user_id, depth) DO UPDATE SET count = count + excluded.count',
+            [(user_id, depth, count) for (user_id, depth), count in levels.items()]
+        )
+        changes = {
+            user_id: (int(user_id == referrer_id), count)
+            for user_id, count in Counter(ancestor_id for ancestor_id, _, _ in paths).items()
+        }
+        conn.executemany(
+            'INSERT INTO referral_stats (user_id, direct_count, total_count, last_referral_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(user_id) DO UPDATE SET direct_count = direct_count + excluded.direct_count, '
+            'total_count = total_count + excluded.total_count, last_referral_at = excluded.last_referral_at',
+            [(user_id, direct, total, now) for user_id, (direct, total) in changes.items()]
+        )
+        return changes
+    
+    async def rebuild_referral_tree(self):
+        """
+        Полный пересчет дерева приглашений и счетчиков по таблице referrals
+        (например, после изменения REFERRAL_MAX_DEPTH)
+        """
+        await self.db.transaction(self._rebuild_referral_tree)
+    
+    def _rebuild_referral_tree(self, conn: sqlite3.Connection):
+        conn.execute('DELETE FROM referral_paths')
+        conn.execute('DELETE FROM referral_level_counts')
+        conn.execute('DELETE FROM referral_stats')
+        rows = conn.execute(
+            'SELECT referrer_id, referred_id, CAST(strftime(\'%s\', created_at) AS REAL) AS created_at '
+            'FROM referrals ORDER BY id'
+        ).fetchall()
+        for row in rows:
+            self._add_paths(conn, row['referrer_id'], row['referred_id'], row['created_at'])
     
-    async def get_referral_statistics(self, user_id: int):
+    async def get_referral_statistics(self, user_id: int) -> Dict[str, Any]:
         """
         Получение статистики по рефералам для пользователя
         :param user_id: ID пользователя
-        :return: Статистика по рефералам
-        ""
-        pass
+        :return: Прямые приглашения, все приглашения в дереве, время последнего
+                 приглашения и количество приглашенных на каждом уровне
+        """
+        stats = await self.db.fetchone(
+            'SELECT direct_count, total_count, last_referral_at FROM referral_stats WHERE user_id = ?',
+            (user_id,)
+        )
+        levels = await self.db.fetchall(
+            'SELECT depth, count FROM referral_level_counts WHERE user_id = ? ORDER BY depth',
+            (user_id,)
+        )
+        return {
+            'direct_count': stats['direct_count'] if stats else 0,
+            'total_count': stats['total_count'] if stats else 0,
+            'last_referral_at': stats['last_referral_at'] if stats else None,
+            'levels': {row['depth']: row['count'] for row in levels},
+        }
     
-    async def get_all_referrals_for_user(self, user_id: int):
+    async def get_all_referrals_for_user(self, user_id: int, max_depth: int = 1,
+                                         after: Tuple[int, int] = (0, 0), limit: int = 1000) -> List[Dict[str, int]]:
         """
         Получение всех рефералов для пользователя
         :param user_id: ID пользователя
-        :return: Список рефералов
-        ""
-        pass
\ No newline at end of file
+        :param max_depth: Максимальный уровень (1 — только прямые приглашения)
+        :param after: Последняя пара (уровень, ID) предыдущей страницы
+        :param limit: Размер страницы
+        :return: Список рефералов с уровнями, по возрастанию уровня и ID
+        """
+        rows = await self.db.fetchall(
+            'SELECT descendant_id AS user_id, depth FROM referral_paths '
+            'WHERE ancestor_id = ? AND depth <= ? AND (depth, descendant_id) > (?, ?) '
+            'ORDER BY depth, descendant_id LIMIT ?',
+            (user_id, max_depth, after[0], after[1], limit)
+        )
+        return [dict(row) for row in rows]
+    
+    async def get_referral_chain(self, user_id: int) -> List[Dict[str, int]]:
+        """
+        Получение цепочки пригласивших пользователя (для многоуровневых начислений)
+        :param user_id: ID пользователя
+        :return: Предки с уровнями, начиная с непосредственно пригласившего
+        """
+        rows = await self.db.fetchall(
+            'SELECT ancestor_id AS user_id, depth FROM referral_paths WHERE descendant_id = ? ORDER BY depth',
+            (user_id,)
+        )
+        return [dict(row) for row in rows]
+    
+    async def get_top_referrers(self, limit: int = 10, by: str = 'total_count') -> List[Dict[str, Any]]:
+        """
+        Получение пользователей с наибольшим количеством приглашений
+        :param limit: Количество пользователей
+        :param by: direct_count или total_count
+        :return: Список статистик по убыванию выбранного счетчика
+        """
+        if by not in ('direct_count', 'total_count'):
+            raise ValueError(f"Неизвестный счетчик: {by}")
+        rows = await self.db.fetchall(
+            f'SELECT user_id, direct_count, total_count, last_referral_at FROM referral_stats '
+            f'ORDER BY {by} DESC, user_id LIMIT ?',
+            (limit,)
+        )
+        return [dict(row) for row in rows]
\ No newline at end of file
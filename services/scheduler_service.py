@@ -0,0 +1,291 @@
+import asyncio
+import heapq
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config.settings import SCHEDULER_WORKERS, SCHEDULER_MAX_ATTEMPTS, SCHEDULER_LEASE_TIMEOUT
+from utils.database import AsyncDatabase, get_async_database
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScheduledJob:
+    """
+    Отложенная задача планировщика
+    """
+    id: int
+    kind: str
+    run_at: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+
+
+JobHandler = Callable[[ScheduledJob], Awaitable[None]]
+
+
+class SchedulerService:
+    """
+    Планировщик отложенных задач.
+
+    Задачи хранятся в таблице scheduled_jobs, а в памяти держится только
+    куча (run_at, id), по которой диспетчер определяет ближайший срок.
+    Созревшие задачи передаются небольшому пулу воркеров, которые
+    захватывают задачу в базе данных перед выполнением, поэтому одну
+    и ту же задачу не выполнят два процесса. Раз в половину lease_timeout
+    задачи, захваченные упавшим процессом, и просроченные задачи, которых
+    нет в куче этого процесса, возвращаются в очередь.
+    """
+
+    def __init__(self, db: AsyncDatabase = None, worker_count: int = SCHEDULER_WORKERS,
+                 max_attempts: int = SCHEDULER_MAX_ATTEMPTS,
+                 lease_timeout: int = SCHEDULER_LEASE_TIMEOUT):
+        """
+        Инициализация планировщика
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param worker_count: Количество воркеров, выполняющих задачи
+        :param max_attempts: Максимальное количество попыток выполнения задачи
+        :param lease_timeout: Время в секундах, после которого захваченная задача считается брошенной
+        """
+        self.db = db or get_async_database()
+        self.worker_count = worker_count
+        self.max_attempts = max_attempts
+        self.lease_timeout = lease_timeout
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._queued: Set[int] = set()  # ID задач в куче и очереди воркеров
+        self._ready: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def register_handler(self, kind: str, handler: JobHandler):
+        """
+        Регистрация обработчика для типа задач
+        :param kind: Тип задачи
+        :param handler: Корутина, принимающая ScheduledJob
+        """
+        self._handlers[kind] = handler
+
+    async def schedule(self, kind: str, delay: float, payload: Dict[str, Any] = None) -> int:
+        """
+        Постановка задачи в очередь
+        :param kind: Тип задачи
+        :param delay: Задержка выполнения в секундах
+        :param payload: Данные задачи (должны сериализоваться в JSON)
+        :return: ID задачи
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+
+        payload = payload or {}
+        run_at = time.time() + delay
+        job_id = await self.db.transaction(self._insert_job, kind, run_at, payload)
+
+        self._push(ScheduledJob(id=job_id, kind=kind, run_at=run_at, payload=payload))
+        return job_id
+
+    async def start(self, recover: bool = True):
+        """
+        Запуск планировщика: загрузка незавершенных задач и запуск воркеров
+        :param recover: Загружать задачи из базы данных и периодически возвращать
+                        зависшие. При нескольких процессах это делает только один,
+                        остальные выполняют лишь поставленные ими задачи.
+        """
+        self._ready = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+
+        if recover:
+            jobs = await self._load_pending_jobs()
+            for job in jobs:
+                self._push(job)
+            logger.info("Планировщик загрузил %s незавершенных задач", len(jobs))
+            self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+        self._tasks.append(asyncio.create_task(self._dispatch_loop()))
+        for _ in range(self.worker_count):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        """
+        Остановка планировщика. Невыполненные задачи остаются в базе данных
+        и будут загружены при следующем запуске.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _push(self, job: ScheduledJob):
+        """
+        Добавление задачи в кучу и пробуждение диспетчера
+        """
+        if job.id in self._queued:
+            return
+        self._queued.add(job.id)
+        heapq.heappush(self._heap, (job.run_at, job.id, job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _dispatch_loop(self):
+        """
+        Ожидание ближайшего срока и передача созревших задач воркерам
+        """
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                self._ready.put_nowait(job)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        """
+        Выполнение созревших задач
+        """
+        while True:
+            job = await self._ready.get()
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                # Ошибка базы данных не должна останавливать воркер: задача
+                # останется в базе и вернется в очередь при очередной проверке
+                logger.error("Ошибка выполнения задачи %s (%s): %s", job.id, job.kind, e)
+            finally:
+                self._ready.task_done()
+
+    async def _sweep_loop(self):
+        """
+        Периодический возврат в очередь брошенных и просроченных задач
+        """
+        interval = max(1.0, self.lease_timeout / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                jobs = await self._load_pending_jobs(overdue_only=True)
+            except Exception as e:
+                logger.error("Ошибка проверки брошенных задач планировщика: %s", e)
+                continue
+            for job in jobs:
+                self._push(job)
+
+    async def _run_job(self, job: ScheduledJob):
+        """
+        Захват и выполнение одной задачи
+        """
+        self._queued.discard(job.id)
+        claimed = await self._claim_job(job.id)
+        if not claimed:
+            # Задачу уже выполнил или выполняет другой процесс
+            return
+
+        handler = self._handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise ValueError(f"Нет обработчика для задачи типа {job.kind}")
+            await handler(job)
+        except Exception as e:
+            job.attempts += 1
+            if job.attempts >= self.max_attempts:
+                logger.error("Задача %s (%s) завершилась ошибкой и больше не будет повторяться: %s", job.id, job.kind, e)
+                await self._fail_job(job.id, job.attempts)
+            else:
+                job.run_at = time.time() + 2 ** job.attempts
+                logger.warning("Задача %s (%s) завершилась ошибкой, повтор через %s с: %s", job.id, job.kind, 2 ** job.attempts, e)
+                await self._retry_job(job.id, job.run_at, job.attempts)
+                self._push(job)
+        else:
+            await self._complete_job_with_retry(job)
+
+    async def _complete_job_with_retry(self, job: ScheduledJob):
+        """
+        Отметка выполненной задачи. Обработчик уже выполнил действие (например,
+        отправил сообщение), поэтому при ошибке повторяется только запись
+        в базу: иначе задача осталась бы захваченной и после истечения аренды
+        выполнилась бы повторно.
+        """
+        delay = 1.0
+        while True:
+            try:
+                await self._complete_job(job.id)
+                return
+            except Exception as e:
+                logger.error("Не удалось отметить задачу %s (%s) выполненной, повтор через %s с: %s",
+                             job.id, job.kind, delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max(1.0, self.lease_timeout / 4))
+
+    def _insert_job(self, conn, kind: str, run_at: float, payload: Dict[str, Any]) -> int:
+        cursor = conn.execute(
+            'INSERT INTO scheduled_jobs (kind, payload, run_at) VALUES (?, ?, ?)',
+            (kind, json.dumps(payload), run_at)
+        )
+        return cursor.lastrowid
+
+    async def _load_pending_jobs(self, overdue_only: bool = False) -> List[ScheduledJob]:
+        """
+        Возврат брошенных задач в очередь и загрузка ожидающих задач
+        :param overdue_only: Загружать только задачи, срок которых прошел больше lease_timeout назад
+                             (задачи с ближайшим сроком уже есть в куче процесса, который их создал)
+        """
+        # Задачи, захваченные упавшим процессом, возвращаются в очередь
+        deadline = time.time() - self.lease_timeout
+        await self.db.execute(
+            "UPDATE scheduled_jobs SET status = 'pending', claimed_at = NULL "
+            "WHERE status = 'running' AND claimed_at < ?",
+            (deadline,)
+        )
+        if overdue_only:
+            rows = await self.db.fetchall(
+                "SELECT id, kind, payload, run_at, attempts FROM scheduled_jobs "
+                "WHERE status = 'pending' AND run_at < ? ORDER BY run_at",
+                (deadline,)
+            )
+        else:
+            rows = await self.db.fetchall(
+                "SELECT id, kind, payload, run_at, attempts FROM scheduled_jobs "
+                "WHERE status = 'pending' ORDER BY run_at"
+            )
+        return [
+            ScheduledJob(
+                id=row['id'],
+                kind=row['kind'],
+                run_at=row['run_at'],
+                payload=json.loads(row['payload']),
+                attempts=row['attempts']
+            )
+            for row in rows
+        ]
+
+    async def _claim_job(self, job_id: int) -> bool:
+        cursor = await self.db.execute(
+            "UPDATE scheduled_jobs SET status = 'running', claimed_at = ? "
+            "WHERE id = ? AND status = 'pending'",
+            (time.time(), job_id)
+        )
+        return cursor.rowcount == 1
+
+    async def _complete_job(self, job_id: int):
+        await self.db.execute('DELETE FROM scheduled_jobs WHERE id = ?', (job_id,))
+
+    async def _retry_job(self, job_id: int, run_at: float, attempts: int):
+        await self.db.execute(
+            "UPDATE scheduled_jobs SET status = 'pending', claimed_at = NULL, run_at = ?, attempts = ? "
+            "WHERE id = ?",
+            (run_at, attempts, job_id)
+        )
+
+    async def _fail_job(self, job_id: int, attempts: int):
+        await self.db.execute(
+            "UPDATE scheduled_jobs SET status = 'failed', attempts = ? WHERE id = ?",
+            (attempts, job_id)
+        )
@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+from config.settings import (
+    SEND_GLOBAL_RATE, SEND_GLOBAL_BURST, SEND_CHAT_RATE, SEND_CHAT_BURST,
+    SEND_CONCURRENCY, SEND_MAX_RETRIES
+)
+from utils.metrics import REGISTRY
+from utils.rate_limit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+SEND_SECONDS = REGISTRY.histogram('bot_send_seconds', 'Время запроса к Bot API', ['method'])
+SEND_QUEUE_SECONDS = REGISTRY.histogram(
+    'bot_send_queue_seconds', 'Время ожидания сообщения в очереди отправки', ['priority'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+SEND_RETRY_AFTER = REGISTRY.counter('bot_send_retry_after', 'Ответы 429 от Bot API', ['method'])
+SEND_ERRORS = REGISTRY.counter('bot_send_errors', 'Ошибки запросов к Bot API', ['method'])
+
+
+class SendPriority(IntEnum):
+    """
+    Приоритет исходящего сообщения (меньше — важнее)
+    """
+    INTERACTIVE = 0  # Ответы на действия пользователя
+    ONBOARDING = 1   # Отложенные шаги онбординга
+    BULK = 2         # Рассылки
+
+
+class _OutgoingMessage:
+    __slots__ = ('method', 'priority', 'future', 'attempts', 'queued_at')
+
+    def __init__(self, method: TelegramMethod, priority: SendPriority, future: asyncio.Future):
+        self.method = method
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class _ChatQueue:
+    __slots__ = ('messages', 'bucket', 'scheduled')
+
+    def __init__(self):
+        self.messages: Deque[_OutgoingMessage] = deque()
+        self.bucket = TokenBucket(SEND_CHAT_RATE, SEND_CHAT_BURST)
+        # Чат уже стоит в очереди готовых/отложенных или его сообщение отправляется
+        self.scheduled = False
+
+
+class SendQueue:
+    """
+    Очередь исходящих сообщений перед Bot API.
+
+    Сообщения одного чата отправляются по порядку и не чаще, чем позволяет
+    ведро токенов чата; общее ведро ограничивает скорость всего бота.
+    Из готовых к отправке чатов первым обслуживается чат с самым
+    приоритетным сообщением. Ответ 429 приостанавливает чат на retry_after
+    секунд, после чего сообщение отправляется повторно.
+
+    Общее ведро действует в пределах процесса. Когда сообщения отправляют
+    несколько процессов-обработчиков, каждый получает долю общего предела
+    (параметр workers), иначе бот в целом отправлял бы в workers раз больше.
+    """
+
+    def __init__(self, bot: Bot, concurrency: int = SEND_CONCURRENCY, max_retries: int = SEND_MAX_RETRIES,
+                 workers: int = 1):
+        """
+        :param bot: Экземпляр бота
+        :param concurrency: Максимальное количество одновременных запросов
+        :param max_retries: Максимальное количество повторов после ответа 429
+        :param workers: Количество процессов, отправляющих сообщения; общий предел
+                        SEND_GLOBAL_RATE и SEND_GLOBAL_BURST делится между ними поровну
+        """
+        self.bot = bot
+        self.max_retries = max_retries
+        self.retry_after_count = 0
+
+        self._global_bucket = TokenBucket(SEND_GLOBAL_RATE / workers, max(1.0, SEND_GLOBAL_BURST / workers))
+        self._chats: Dict[int, _ChatQueue] = {}
+        self._ready: List[Tuple[int, int, int]] = []      # (приоритет, порядковый номер, chat_id)
+        self._delayed: List[Tuple[float, int, int]] = []  # (время готовности, порядковый номер, chat_id)
+        self._sequence = itertools.count()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: set = set()
+        self._purged_at = time.monotonic()
+
+    async def send(self, chat_id: int, method: TelegramMethod,
+                   priority: SendPriority = SendPriority.INTERACTIVE) -> Any:
+        """
+        Постановка метода Bot API в очередь и ожидание результата
+        :param chat_id: ID чата, в который отправляется сообщение
+        :param method: Метод Bot API (SendMessage, SendAudio и т.д.)
+        :param priority: Приоритет сообщения
+        :return: Результат метода
+        """
+        future = asyncio.get_running_loop().create_future()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatQueue()
+        chat.messages.append(_OutgoingMessage(method, priority, future))
+        if not chat.scheduled:
+            self._schedule_chat(chat_id, chat, time.monotonic())
+        return await future
+
+    async def send_message(self, chat_id: int, text: str,
+                           priority: SendPriority = SendPriority.INTERACTIVE, **kwargs) -> Any:
+        """
+        Отправка текстового сообщения через очередь
+        :param chat_id: ID чата
+        :param text: Текст сообщения
+        :param priority: Приоритет сообщения
+        :return: Отправленное сообщение
+        """
+        return await self.send(chat_id, SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    def pending(self) -> int:
+        """Количество сообщений, ожидающих отправки"""
+        return sum(len(chat.messages) for chat in self._chats.values())
+
+    async def start(self):
+        """Запуск диспетчера очереди"""
+        self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self, timeout: float = 10):
+        """
+        Остановка диспетчера после отправки уже поставленных сообщений
+        :param timeout: Максимальное время ожидания в секундах
+        """
+        deadline = time.monotonic() + timeout
+        while (self.pending() or self._deliveries) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _schedule_chat(self, chat_id: int, chat: _ChatQueue, now: float):
+        """
+        Постановка чата в очередь готовых или отложенных по его ведру токенов
+        """
+        chat.scheduled = True
+        delay = chat.bucket.delay(now)
+        if delay > 0:
+            heapq.heappush(self._delayed, (now + delay, next(self._sequence), chat_id))
+        else:
+            heapq.heappush(self._ready, (chat.messages[0].priority, next(self._sequence), chat_id))
+        self._wakeup.set()
+
+    async def _dispatch_loop(self):
+        while True:
+            now = time.monotonic()
+            if now - self._purged_at > 60:
+                self._purge_idle_chats(now)
+
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._delayed)
+                chat = self._chats[chat_id]
+                heapq.heappush(self._ready, (chat.messages[0].priority, next(self._sequence), chat_id))
+
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else 60
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            global_delay = self._global_bucket.delay(now)
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats[chat_id]
+            chat_delay = chat.bucket.delay(now)
+            if chat_delay > 0:
+                heapq.heappush(self._delayed, (now + chat_delay, next(self._sequence), chat_id))
+                continue
+
+            await self._semaphore.acquire()
+            now = time.monotonic()
+            self._global_bucket.consume(now)
+            chat.bucket.consume(now)
+            message = chat.messages.popleft()
+            task = asyncio.create_task(self._deliver(chat_id, chat, message))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, chat_id: int, chat: _ChatQueue, message: _OutgoingMessage):
+        """
+        Выполнение запроса; чат снова ставится в очередь только после ответа,
+        поэтому сообщения одного чата не обгоняют друг друга
+        """
+        method_name = type(message.method).__name__
+        started = time.monotonic()
+        if message.attempts == 0:
+            SEND_QUEUE_SECONDS.labels(message.priority.name).observe(started - message.queued_at)
+        try:
+            result = await self.bot(message.method)
+        except TelegramRetryAfter as e:
+            self.retry_after_count += 1
+            SEND_RETRY_AFTER.labels(method_name).inc()
+            message.attempts += 1
+            if message.attempts > self.max_retries:
+                if not message.future.done():
+                    message.future.set_exception(e)
+            else:
+                logger.warning("Telegram ограничил отправку в чат %s, повтор через %s с", chat_id, e.retry_after)
+                chat.bucket.pause(e.retry_after)
+                chat.messages.appendleft(message)
+        except Exception as e:
+            SEND_ERRORS.labels(method_name).inc()
+            if not message.future.done():
+                message.future.set_exception(e)
+        else:
+            if not message.future.done():
+                message.future.set_result(result)
+        finally:
+            SEND_SECONDS.labels(method_name).observe(time.monotonic() - started)
+            self._semaphore.release()
+            if chat.messages:
+                self._schedule_chat(chat_id, chat, time.monotonic())
+            else:
+                chat.scheduled = False
+
+    def _purge_idle_chats(self, now: float):
+        """
+        Удаление состояния чатов без сообщений и с полным ведром токенов
+        """
+        self._purged_at = now
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.scheduled and not chat.messages and chat.bucket.is_full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from config.settings import TRANSFER_BATCH_SIZE
+from database.models import File, Referral, User
+from services.referral_service import ReferralService
+from utils.database import AsyncDatabase, get_async_database, init_database
+
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, доступные для выгрузки, и их колонки
+TRANSFER_TABLES: Dict[str, Tuple[str, ...]] = {
+    'users': User.FIELDS,
+    'referrals': Referral.FIELDS,
+    'files': File.FIELDS,
+}
+FORMATS = ('ndjson', 'csv')
+
+
+def detect_format(path: str) -> str:
+    """
+    Определение формата по расширению файла (.csv, .ndjson, .jsonl, с .gz или без)
+    :param path: Путь к файлу
+    :return: ndjson или csv
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    raise ValueError(f"Не удалось определить формат файла {path}, укажите его явно")
+
+
+def open_text(path: str, mode: str, compressed: Optional[bool] = None) -> TextIO:
+    """
+    Открытие текстового файла, сжатого gzip
+    :param path: Путь к файлу
+    :param mode: r или w
+    :param compressed: Сжатие gzip (по умолчанию, если имя оканчивается на .gz)
+    :return: Текстовый поток
+    """
+    if compressed is None:
+        compressed = path.endswith('.gz')
+    if compressed:
+        # Уровень 6 сжимает почти так же, как 9, но заметно быстрее
+        return gzip.open(path, f'{mode}t', encoding='utf-8', newline='', compresslevel=6)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+class _NdjsonWriter:
+    def __init__(self, stream: TextIO, columns: Sequence[str]):
+        self.stream = stream
+        self.columns = columns
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        columns, encode = self.columns, self._encode
+        self.stream.write(''.join(f'{encode(dict(zip(columns, row)))}\n' for row in rows))
+
+
+class _CsvWriter:
+    def __init__(self, stream: TextIO, columns: Sequence[str]):
+        self._writer = csv.writer(stream)
+        self._writer.writerow(columns)
+
+    def write_rows(self, rows: Sequence[Sequence[Any]]):
+        self._writer.writerows(rows)
+
+
+def _read_ndjson(stream: TextIO) -> Tuple[List[str], Iterator[tuple]]:
+    lines = (line for line in stream if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return [], iter(())
+    first_record = json.loads(first)
+    columns = list(first_record)
+
+    def records():
+        yield tuple(first_record.values())
+        loads = json.loads
+        for line in lines:
+            record = loads(line)
+            if len(record) != len(columns):
+                raise ValueError(f"Запись с другим набором полей: {line[:200]}")
+            yield tuple(map(record.get, columns))
+
+    return columns, records()
+
+
+def _read_csv(stream: TextIO) -> Tuple[List[str], Iterator[tuple]]:
+    reader = csv.reader(stream)
+    columns = next(reader, [])
+    # CSV не различает NULL и пустую строку, пустые значения загружаются как NULL
+    return columns, (tuple(value if value != '' else None for value in row) for row in reader)
+
+
+WRITERS = {'ndjson': _NdjsonWriter, 'csv': _CsvWriter}
+READERS = {'ndjson': _read_ndjson, 'csv': _read_csv}
+
+
+def _take(records: Iterator[tuple], size: int) -> List[tuple]:
+    return list(itertools.islice(records, size))
+
+
+class TransferService:
+    """
+    Потоковая выгрузка и загрузка пользователей, рефералов и файлов.
+
+    Выгрузка читает таблицу страницами по первичному ключу (id > последний),
+    поэтому в памяти находится не больше одной страницы, а продолжить
+    выгрузку можно с любого ID. Загрузка читает файл потоково и записывает
+    пакеты через executemany; количество загруженных записей сохраняется
+    в transfer_checkpoints в той же транзакции, что и пакет, поэтому
+    прерванная загрузка продолжается с места остановки. Строки вставляются
+    через INSERT OR IGNORE: уже существующие ID не перезаписываются.
+
+    Реферальные коды вычисляются из ID по SECRET_KEY, поэтому при переносе
+    между окружениями ключ должен совпадать. Содержимое файлов (каталог
+    blobs) переносится отдельно, здесь загружаются только записи о файлах.
+    """
+
+    def __init__(self, db: AsyncDatabase = None, referral_service: ReferralService = None,
+                 batch_size: int = TRANSFER_BATCH_SIZE):
+        """
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        :param referral_service: Сервис рефералов для пересчета дерева после загрузки
+        :param batch_size: Строк в одной странице выгрузки и транзакции загрузки
+        """
+        self.db = db or get_async_database()
+        self.referral_service = referral_service or ReferralService(self.db)
+        self.batch_size = batch_size
+
+    async def export_table(self, table: str, path: str, fmt: Optional[str] = None, after_id: int = 0) -> int:
+        """
+        Выгрузка таблицы в файл.
+        Данные пишутся во временный файл, который переименовывается после
+        успешного завершения, поэтому незаконченная выгрузка не подменит готовую.
+        :param table: users, referrals или files
+        :param path: Путь к файлу (.gz включает сжатие)
+        :param fmt: ndjson или csv (по умолчанию по расширению)
+        :param after_id: ID, после которого начинается выгрузка
+        :return: Количество выгруженных строк
+        """
+        columns = self._columns(table)
+        writer_class = WRITERS[fmt or detect_format(path)]
+        select = f'SELECT {", ".join(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?'
+
+        temp_path = f'{path}.part'
+        count = 0
+        stream = await asyncio.to_thread(open_text, temp_path, 'w', path.endswith('.gz'))
+        try:
+            writer = writer_class(stream, columns)
+            while True:
+                rows = await self.db.fetchall(select, (after_id, self.batch_size))
+                if rows:
+                    await asyncio.to_thread(writer.write_rows, rows)
+                    count += len(rows)
+                    after_id = rows[-1]['id']
+                if len(rows) < self.batch_size:
+                    break
+        except BaseException:
+            stream.close()
+            os.remove(temp_path)
+            raise
+        await asyncio.to_thread(stream.close)
+        os.replace(temp_path, path)
+
+        logger.info("Выгружено %s строк из %s в %s", count, table, path)
+        return count
+
+    async def import_table(self, table: str, path: str, fmt: Optional[str] = None, restart: bool = False) -> int:
+        """
+        Загрузка таблицы из файла
+        :param table: users, referrals или files
+        :param path: Путь к файлу (.gz читается со сжатием)
+        :param fmt: ndjson или csv (по умолчанию по расширению)
+        :param restart: Начать заново, не учитывая сохраненную контрольную точку
+        :return: Количество обработанных записей файла
+        """
+        allowed = self._columns(table)
+        reader = READERS[fmt or detect_format(path)]
+        source = os.path.abspath(path)
+        stat = os.stat(source)
+
+        done = 0 if restart else await self._load_checkpoint(source, table, stat)
+        if done:
+            logger.info("Загрузка %s продолжается после записи %s", path, done)
+
+        stream = await asyncio.to_thread(open_text, path, 'r')
+        try:
+            columns, records = await asyncio.to_thread(reader, stream)
+            unknown = set(columns) - set(allowed)
+            if unknown:
+                raise ValueError(f"Неизвестные колонки таблицы {table}: {', '.join(sorted(unknown))}")
+            if 'id' not in columns:
+                raise ValueError(f"В файле {path} нет колонки id")
+
+            sql = (
+                f'INSERT OR IGNORE INTO {table} ({", ".join(columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))})'
+            )
+            records = itertools.islice(records, done, None)
+            while True:
+                batch = await asyncio.to_thread(_take, records, self.batch_size)
+                if not batch:
+                    break
+                done += len(batch)
+                await self.db.transaction(self._insert_batch, sql, batch, (source, table, stat, done))
+        finally:
+            stream.close()
+
+        await self.db.transaction(self._finish_import, source, table)
+        if table == 'referrals':
+            await self.referral_service.rebuild_referral_tree()
+
+        logger.info("Загружено %s записей в %s из %s", done, table, path)
+        return done
+
+    @staticmethod
+    def _columns(table: str) -> Tuple[str, ...]:
+        columns = TRANSFER_TABLES.get(table)
+        if columns is None:
+            raise ValueError(f"Таблица {table} не поддерживается, доступны: {', '.join(TRANSFER_TABLES)}")
+        return columns
+
+    async def _load_checkpoint(self, source: str, table: str, stat: os.stat_result) -> int:
+        row = await self.db.fetchone(
+            'SELECT source_size, source_mtime, records FROM transfer_checkpoints '
+            'WHERE source = ? AND table_name = ?',
+            (source, table)
+        )
+        if row is None:
+            return 0
+        if (row['source_size'], row['source_mtime']) != (stat.st_size, stat.st_mtime):
+            logger.warning("Файл %s изменился после прерванной загрузки, загрузка начнется заново", source)
+            return 0
+        return row['records']
+
+    @staticmethod
+    def _insert_batch(conn: sqlite3.Connection, sql: str, batch: List[tuple],
+                      checkpoint: Tuple[str, str, os.stat_result, int]):
+        """
+        Выполняется в транзакции: запись пакета и контрольной точки
+        """
+        source, table, stat, records = checkpoint
+        conn.executemany(sql, batch)
+        conn.execute(
+            'INSERT INTO transfer_checkpoints '
+            '(source, table_name, source_size, source_mtime, records, updated_at) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(source, table_name) DO UPDATE SET source_size = excluded.source_size, '
+            'source_mtime = excluded.source_mtime, records = excluded.records, updated_at = excluded.updated_at',
+            (source, table, stat.st_size, stat.st_mtime, records, time.time())
+        )
+
+    @staticmethod
+    def _finish_import(conn: sqlite3.Connection, source: str, table: str):
+        """
+        Выполняется в транзакции: удаление контрольной точки и пересчет производных данных
+        """
+        conn.execute('DELETE FROM transfer_checkpoints WHERE source = ? AND table_name = ?', (source, table))
+        if table == 'files':
+            conn.execute(
+                'UPDATE file_blobs SET ref_count = ('
+                'SELECT COUNT(*) FROM files f WHERE f.content_hash = file_blobs.content_hash AND f.is_active = 1)'
+            )
+
+
+async def _run(args: argparse.Namespace):
+    db = get_async_database()
+    service = TransferService(db, batch_size=args.batch_size)
+    try:
+        if args.command == 'export':
+            await service.export_table(args.table, args.path, args.format, args.after_id)
+        else:
+            await service.import_table(args.table, args.path, args.format, args.restart)
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Выгрузка и загрузка данных бота')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Выгрузка таблицы в файл')
+    export_parser.add_argument('--after-id', type=int, default=0, help='Выгружать строки с ID больше указанного')
+    import_parser = subparsers.add_parser('import', help='Загрузка таблицы из файла')
+    import_parser.add_argument('--restart', action='store_true', help='Не продолжать прерванную загрузку')
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument('table', choices=list(TRANSFER_TABLES))
+        subparser.add_argument('path', help='Файл .ndjson, .jsonl или .csv, с .gz для сжатия')
+        subparser.add_argument('--format', choices=FORMATS, help='Формат (по умолчанию по расширению)')
+        subparser.add_argument('--batch-size', type=int, default=TRANSFER_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    init_database()
+    asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
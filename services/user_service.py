@@ -1,58 +1,190 @@
+from typing import AsyncIterator, List, Optional
+
+from config.settings import (
+    CACHE_TTL, USER_CACHE_SIZE, USER_CACHE_NEGATIVE_TTL,
+    REGISTRATION_BATCH_DELAY, REGISTRATION_BATCH_SIZE
+)
+from database.models import User
+from utils.batching import WriteBatcher
+from utils.cache import MISSING, TTLCache
+from utils.database import AsyncDatabase, get_async_database
+
+
 class UserService:
     """
     Сервис для работы с пользователями
     """
-    
-    def __init__(self):
+
+    # Поля, которые можно изменять через update_user
+    UPDATABLE_FIELDS = ('username', 'first_name', 'last_name')
+
+    def __init__(self, db: AsyncDatabase = None):
         """
         Инициализация сервиса пользователей
-        ""
-        pass
-    
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        """
+        self.db = db or get_async_database()
+        self._registrations = WriteBatcher(
+            self._flush_registrations,
+            max_delay=REGISTRATION_BATCH_DELAY,
+            max_size=REGISTRATION_BATCH_SIZE
+        )
+        # Кэш пользователей по Telegram ID; None означает, что пользователя нет
+        self._cache = TTLCache(max_size=USER_CACHE_SIZE, ttl=CACHE_TTL)
+
     async def create_user(self, user_data: dict):
         """
-        Создание нового пользователя
+        Создание нового пользователя.
+        Регистрации, поступившие почти одновременно, записываются одной транзакцией.
+        Если пользователь с таким Telegram ID уже есть, возвращается существующий.
         :param user_data: Данные пользователя
         :return: Информация о созданном пользователе
-        ""
-        pass
-    
-    async def get_user_by_id(self, user_id: int):
+        """
+        user = await self._registrations.submit(user_data)
+        if user is not None:
+            self._cache.set(user.telegram_id, user)
+        return user
+
+    async def flush(self):
+        """
+        Запись накопленных регистраций (вызывается при остановке приложения)
+        """
+        await self._registrations.drain()
+
+    async def _flush_registrations(self, batch: List[dict]) -> List[Optional[User]]:
+        """
+        Запись пакета регистраций
+        :param batch: Список данных пользователей
+        :return: Пользователи в порядке пакета
+        """
+        return await self.db.transaction(self._insert_users, batch)
+
+    @staticmethod
+    def _insert_users(conn, batch: List[dict]) -> List[Optional[User]]:
+        conn.executemany(
+            'INSERT INTO users (telegram_id, username, first_name, last_name) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(telegram_id) DO NOTHING',
+            [
+                (
+                    user_data['telegram_id'],
+                    user_data.get('username'),
+                    user_data.get('first_name'),
+                    user_data.get('last_name')
+                )
+                for user_data in batch
+            ]
+        )
+
+        telegram_ids = list({user_data['telegram_id'] for user_data in batch})
+        placeholders = ', '.join('?' * len(telegram_ids))
+        rows = conn.execute(
+            f'SELECT {User.SQL_COLUMNS} FROM users WHERE telegram_id IN ({placeholders})',
+            telegram_ids
+        ).fetchall()
+
+        users = {user.telegram_id: user for user in User.from_rows(rows)}
+        return [users.get(user_data['telegram_id']) for user_data in batch]
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """
         Получение пользователя по ID
         :param user_id: ID пользователя
         :return: Информация о пользователе
-        ""
-        pass
-    
-    async def get_user_by_telegram_id(self, telegram_id: int):
+        """
+        row = await self.db.fetchone(f'SELECT {User.SQL_COLUMNS} FROM users WHERE id = ?', (user_id,))
+        return User.from_row(row) if row else None
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """
         Получение пользователя по Telegram ID
         :param telegram_id: Telegram ID пользователя
         :return: Информация о пользователе
-        ""
-        pass
-    
+        """
+        user = self._cache.get(telegram_id)
+        if user is not MISSING:
+            return user
+
+        row = await self.db.fetchone(f'SELECT {User.SQL_COLUMNS} FROM users WHERE telegram_id = ?', (telegram_id,))
+        if row:
+            user = User.from_row(row)
+            self._cache.add(telegram_id, user)
+        else:
+            user = None
+            self._cache.add(telegram_id, None, ttl=USER_CACHE_NEGATIVE_TTL)
+        return user
+
     async def update_user(self, user_id: int, update_data: dict):
         """
         Обновление информации о пользователе
         :param user_id: ID пользователя
         :param update_data: Данные для обновления
         :return: Обновленная информация о пользователе
-        ""
-        pass
-    
+        """
+        fields = [field for field in self.UPDATABLE_FIELDS if field in update_data]
+        if fields:
+            assignments = ', '.join(f'{field} = ?' for field in fields)
+            await self.db.execute(
+                f'UPDATE users SET {assignments} WHERE id = ?',
+                [update_data[field] for field in fields] + [user_id]
+            )
+        user = await self.get_user_by_id(user_id)
+        if user is not None:
+            self._cache.set(user.telegram_id, user)
+        return user
+
     async def delete_user(self, user_id: int):
         """
         Удаление пользователя
         :param user_id: ID пользователя
         :return: Результат удаления
-        ""
-        pass
-    
-    async def get_all_users(self):
+        """
+        row = await self.db.transaction(
+            lambda conn: conn.execute('DELETE FROM users WHERE id = ? RETURNING telegram_id', (user_id,)).fetchone()
+        )
+        if row is None:
+            return False
+        self._cache.invalidate(row['telegram_id'])
+        return True
+
+    def invalidate_cached(self, telegram_id: int):
+        """
+        Сброс закэшированного пользователя после изменения записи в обход
+        сервиса (например, выдачи реферального кода)
+        :param telegram_id: Telegram ID пользователя
+        """
+        self._cache.invalidate(telegram_id)
+
+    async def get_all_users(self) -> List[User]:
         """
         Получение списка всех пользователей
         :return: Список пользователей
-        ""
-        pass
\ No newline at end of file
+        """
+        rows = await self.db.fetchall(f'SELECT {User.SQL_COLUMNS} FROM users ORDER BY id')
+        return User.from_rows(rows)
+
+    async def iter_users(self, batch_size: int = 1000, after_id: int = 0) -> AsyncIterator[User]:
+        """
+        Потоковый обход пользователей по возрастанию ID.
+        Используется постраничная выборка по ключу (id > последний ID),
+        поэтому в памяти одновременно находится не больше batch_size пользователей.
+        :param batch_size: Размер страницы
+        :param after_id: ID, после которого начинается обход
+        :return: Асинхронный итератор пользователей
+        """
+        while True:
+            rows = await self.db.fetchall(
+                f'SELECT {User.SQL_COLUMNS} FROM users WHERE id > ? ORDER BY id LIMIT ?',
+                (after_id, batch_size)
+            )
+            for user in User.from_rows(rows):
+                yield user
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1]['id']
+
+    def cache_stats(self) -> dict:
+        """
+        Статистика кэша пользователей
+        :return: Количество попаданий, промахов и записей
+        """
+        return self._cache.stats()
@@ -2,27 +2,35 @@ import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
-from typing import Dict
 
 from aiogram import Bot, Dispatcher, types
-from aiogram.client.session.aiohttp import AiohttpSession
 
-from config.settings import BOT_TOKEN, DEBUG, LOG_LEVEL, LOG_FILE
-from utils.database import init_database
+from config.settings import (
+    BOT_TOKEN, DEBUG,
+    ONBOARDING_AUDIO_DELAY, ONBOARDING_MATERIALS_DELAY,
+    BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_WORKERS, ADMIN_IDS, INTRODUCTION_AUDIO_FILE,
+    METRICS_HOST, METRICS_PORT
+)
+from utils.database import init_database, get_async_database
 from services.user_service import UserService
 from services.referral_service import ReferralService
-from services.file_service import FileService
+from services.file_service import FileService, FileValidationError
+from services.scheduler_service import SchedulerService, ScheduledJob
+from services.send_queue import SendQueue, SendPriority
+from services.broadcast_service import BroadcastService
+from services.media_service import MediaService
+from services.extraction_service import ExtractionService
+from services.program_service import ProgramService
+from services.leaderboard_service import LeaderboardService
+from utils.state_storage import UserState, create_state_storage
+from handlers.router import MessageRouter, parse_command
+from handlers.throttling import ThrottlingMiddleware
+from utils.rate_limit import create_limiter
+from utils.metrics import REGISTRY, start_metrics_server
+from utils.logging_config import setup_logging
+from src.bot.webhook import create_bot_session, run_webhook, run_webhook_workers
 
 
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
@@ -31,15 +39,40 @@ class BotApplication:
     Класс приложения Telegram-бота
     """
     
-    def __init__(self):
+    def __init__(self, metrics_port: int = METRICS_PORT, background: bool = True, workers: int = 1):
+        """
+        :param metrics_port: Порт HTTP-сервера /metrics (0 — не запускать)
+        :param background: Выполнять фоновую работу, общую для всех процессов:
+                           восстановление задач планировщика, поиск необработанных
+                           файлов, продолжение рассылок и загрузку медиа. При
+                           нескольких процессах-обработчиках ее выполняет только один.
+        :param workers: Количество процессов-обработчиков, между которыми
+                        делится общий предел скорости отправки сообщений
+        """
+        self.metrics_port = metrics_port
+        self.background = background
+        self.workers = workers
+        self._metrics_runner = None
         self.bot = None
         self.dispatcher = None
-        self.user_service = UserService()
-        self.referral_service = ReferralService()
-        self.file_service = FileService()
-        
-        # Хранилище состояний пользователей (в реальном приложении лучше использовать Redis или базу данных)
-        self.user_states: Dict[int, dict] = {}
+        self.router = MessageRouter()
+        self.db = get_async_database()
+        self.user_service = UserService(self.db)
+        self.referral_service = ReferralService(self.db, user_service=self.user_service)
+        self.leaderboard_service = LeaderboardService(self.referral_service, self.db)
+        self.file_service = FileService(self.db)
+        self.extraction_service = ExtractionService(self.db)
+        self.scheduler = SchedulerService(self.db)
+        self.send_queue = None
+        self.broadcast_service = None
+        self.program_service = None
+        self.media_service = None
+        
+        # Хранилище состояний пользователей (бэкенд выбирается настройкой STATE_STORAGE_BACKEND)
+        self.state_storage = create_state_storage(db=self.db)
+        
+        # Ограничение частоты сообщений от пользователя (бэкенд выбирается настройкой THROTTLE_BACKEND)
+        self.throttling = ThrottlingMiddleware(create_limiter(), exempt=ADMIN_IDS)
     
     async def initialize(self):
         """
@@ -52,55 +85,120 @@ class BotApplication:
         logger.info("База данных инициализирована")
         
         # Инициализация бота
-        session = AiohttpSession()
-        self.bot = Bot(token=BOT_TOKEN, session=session)
+        self.bot = Bot(token=BOT_TOKEN, session=create_bot_session())
         self.dispatcher = Dispatcher()
         
+        # Все исходящие сообщения проходят через очередь с учетом ограничений Telegram
+        self.send_queue = SendQueue(self.bot, workers=self.workers)
+        await self.send_queue.start()
+        self.broadcast_service = BroadcastService(self.send_queue, self.user_service, self.db)
+        self.program_service = ProgramService(self.send_queue, self.db)
+        self.media_service = MediaService(self.send_queue, self.db)
+        
         # Регистрация обработчиков
         self._register_handlers()
         
-        logger.info("Приложение инициализировано")
-    
-    def _register_handlers(self):
-        """
-        Регистрация обработчиков команд и сообщений
-        """
-        # Обработчик команды /start
-        @self.dispatcher.message(lambda message: message.text == '/start')
-        async def start_command_handler(message: types.Message):
-            await self._handle_start_command(message)
+        await self.state_storage.start()
         
-        # Обработчик аудиосообщений
-        @self.dispatcher.message(lambda message: message.voice is not None)
-        async def audio_message_handler(message: types.Message):
-            await self._handle_audio_message(message)
+        # Запуск планировщика отложенных шагов онбординга
+        self.scheduler.register_handler('introduction_audio', self._run_introduction_audio_job)
+        self.scheduler.register_handler('suggest_materials', self._run_suggest_materials_job)
+        await self.scheduler.start(recover=self.background)
         
-        # Обработчик документов и фото
-        @self.dispatcher.message(lambda message: message.document is not None or message.photo is not None)
-        async def materials_handler(message: types.Message):
-            await self._handle_materials(message)
+        # Извлечение текста из загруженных материалов в пуле процессов
+        await self.extraction_service.start(scan=self.background)
         
-        # Обработчик сообщений, связанных с программами
-        @self.dispatcher.message(lambda message: 'программа' in message.text.lower() if message.text else False)
-        async def program_handler(message: types.Message):
-            await self._handle_program_request(message)
+        # Очередь составления индивидуальных программ
+        await self.program_service.start()
         
-        # Обработчик сообщений, связанных с рефералами
-        @self.dispatcher.message(lambda message: 'реферал' in message.text.lower() if message.text else False)
-        async def referral_handler(message: types.Message):
-            await self._handle_referral_request(message)
+        # Таблица лидеров по приглашениям строится по сохраненной статистике
+        await self.leaderboard_service.start()
         
-        # Обработчик всех остальных сообщений
-        @self.dispatcher.message()
-        async def general_message_handler(message: types.Message):
-            await self._handle_general_message(message)
+        if self.background:
+            # Продолжение рассылок, прерванных предыдущей остановкой
+            await self.broadcast_service.start()
+            
+            # Загрузка медиафайлов в служебный чат (если он задан) в фоне
+            self._preload_task = asyncio.create_task(self.media_service.preload())
+        
+        self._register_metrics()
+        if self.metrics_port:
+            self._metrics_runner = await start_metrics_server(METRICS_HOST, self.metrics_port)
+        
+        logger.info("Приложение инициализировано")
+    
+    async def shutdown(self):
+        """
+        Остановка фоновых задач и закрытие сессии бота
+        """
+        await self.scheduler.stop()
+        await self.extraction_service.stop()
+        if self.program_service:
+            await self.program_service.stop()
+        await self.leaderboard_service.stop()
+        if self.broadcast_service:
+            await self.broadcast_service.stop()
+        await self.user_service.flush()
+        await self.state_storage.close()
+        await self.throttling.limiter.close()
+        if self.send_queue:
+            await self.send_queue.stop()
+        if self.bot:
+            await self.bot.session.close()
+        if self._metrics_runner:
+            await self._metrics_runner.cleanup()
+        await self.db.close()
+    
+    def _register_metrics(self):
+        """
+        Регистрация показателей, которые считываются с сервисов при сборе метрик
+        """
+        REGISTRY.gauge('bot_send_queue_pending', 'Сообщения в очереди отправки', self.send_queue.pending)
+        REGISTRY.gauge('bot_state_storage_size', 'Состояния пользователей в памяти процесса', self.state_storage.size)
+        REGISTRY.gauge('bot_extraction_pending', 'Файлы в очереди извлечения текста', self.extraction_service.pending)
+        REGISTRY.gauge('bot_leaderboard_size', 'Пользователи в таблице лидеров', self.leaderboard_service.size)
+        REGISTRY.gauge('bot_throttle_tracked_users', 'Пользователи, отслеживаемые защитой от спама',
+                       self.throttling.limiter.size)
+        REGISTRY.callback_counter(
+            'bot_throttle_messages', 'Сообщения, пропущенные и отброшенные защитой от спама',
+            lambda: {('passed',): self.throttling.passed, ('throttled',): self.throttling.throttled},
+            ['result']
+        )
+        
+        def user_cache_requests():
+            stats = self.user_service.cache_stats()
+            return {('hit',): stats['hits'], ('miss',): stats['misses']}
+        
+        REGISTRY.callback_counter(
+            'bot_user_cache_requests', 'Обращения к кэшу пользователей', user_cache_requests, ['result']
+        )
+    
+    def _register_handlers(self):
+        """
+        Регистрация обработчиков команд и сообщений.
+        Маршрут выбирается MessageRouter за один разбор сообщения.
+        """
+        self.router.command('start', self._handle_start_command)
+        self.router.command('queue', self._handle_queue_command)  # Только для администраторов
+        self.router.command('broadcast', self._handle_broadcast_command)  # Только для администраторов
+        self.router.command('top', self._handle_top_command)
+        self.router.content('voice', self._handle_audio_message)
+        self.router.content('document', self._handle_materials)
+        self.router.content('photo', self._handle_materials)
+        self.router.keyword('программа', self._handle_program_request)
+        self.router.keyword('реферал', self._handle_referral_request)
+        self.router.default(self._handle_general_message)
+        
+        # Флуд отбрасывается до выбора обработчика
+        self.dispatcher.message.outer_middleware(self.throttling)
+        self.dispatcher.message.register(self.router.dispatch)
     
     async def _handle_start_command(self, message: types.Message):
         """
         Обработка команды /start
         """
         user_id = message.from_user.id
-        logger.info(f"Получена команда /start от пользователя {user_id}")
+        logger.debug("Получена команда /start от пользователя %s", user_id)
         
         # Проверка или создание пользователя
         user = await self.user_service.get_user_by_telegram_id(user_id)
@@ -113,67 +211,123 @@ class BotApplication:
                 'last_name': message.from_user.last_name
             }
             user = await self.user_service.create_user(user_data)
-            logger.info(f"Создан новый пользователь с ID {user_id}")
+            logger.info("Создан новый пользователь с ID %s", user_id)
+            
+            # Переход по реферальной ссылке вида /start <код>
+            referral_code = parse_command(message.text)[1]
+            if referral_code:
+                await self._register_referral(user, referral_code)
         
         # Отправка приветственного сообщения
-        await message.answer("Привет! Добро пожаловать в бота.")
+        await self._reply(message, "Привет! Добро пожаловать в бота.")
         
         # Установка состояния пользователя
-        self._set_user_state(user_id, 'greeted', time.time())
-        
-        # Автоматическая отправка аудиофайла через 4 секунды
-        await asyncio.sleep(4)
-        await self._send_introduction_audio(message)
+        await self._set_user_state(user_id, UserState.GREETED, time.time())
+        
+        # Отправка вводного аудиофайла откладывается в планировщик, обработчик сразу освобождается
+        await self.scheduler.schedule(
+            'introduction_audio',
+            ONBOARDING_AUDIO_DELAY,
+            {'chat_id': message.chat.id, 'user_id': user_id}
+        )
+    
+    async def _register_referral(self, user, referral_code: str):
+        """
+        Привязка нового пользователя к пригласившему по реферальному коду
+        """
+        referrer = await self.referral_service.get_user_by_referral_code(referral_code)
+        if referrer is None:
+            logger.info("Неизвестный реферальный код %r", referral_code)
+            return
+        if await self.referral_service.register_referral_usage(referrer.id, user.id, referral_code):
+            logger.info("Пользователь %s приглашен пользователем %s", user.telegram_id, referrer.telegram_id)
     
-    async def _send_introduction_audio(self, message: types.Message):
+    async def _run_introduction_audio_job(self, job: ScheduledJob):
+        """
+        Выполнение отложенной задачи отправки вводного аудиофайла
+        """
+        await self._send_introduction_audio(job.payload['chat_id'], job.payload['user_id'])
+    
+    async def _run_suggest_materials_job(self, job: ScheduledJob):
+        """
+        Выполнение отложенной задачи предложения загрузить материалы
+        """
+        await self._suggest_materials_upload(job.payload['chat_id'], job.payload['user_id'])
+    
+    async def _send_introduction_audio(self, chat_id: int, user_id: int):
         """
         Отправка вводного аудиофайла пользователю
         """
-        user_id = message.from_user.id
-        logger.info(f"Отправка вводного аудиофайла пользователю {user_id}")
+        logger.debug("Отправка вводного аудиофайла пользователю %s", user_id)
         
-        # В реальном приложении здесь будет отправка реального аудиофайла
-        await message.answer("🎵 Вот вводное аудио для ознакомления.")
+        caption = "🎵 Вот вводное аудио для ознакомления."
+        if self.media_service.exists(INTRODUCTION_AUDIO_FILE):
+            # Файл загружается в Telegram один раз, дальше отправляется по file_id
+            await self.media_service.send_audio(chat_id, INTRODUCTION_AUDIO_FILE, SendPriority.ONBOARDING, caption=caption)
+        else:
+            logger.warning("Вводный аудиофайл %s не найден в каталоге медиа", INTRODUCTION_AUDIO_FILE)
+            await self.send_queue.send_message(chat_id, caption, SendPriority.ONBOARDING)
         
         # Установка состояния пользователя
-        self._set_user_state(user_id, 'received_audio', time.time())
-        
-        # Автоматическое предложение загрузить материалы через 2 секунды
-        await asyncio.sleep(2)
-        await self._suggest_materials_upload(message)
+        await self._set_user_state(user_id, UserState.RECEIVED_AUDIO, time.time())
+        
+        # Предложение загрузить материалы откладывается в планировщик
+        await self.scheduler.schedule(
+            'suggest_materials',
+            ONBOARDING_MATERIALS_DELAY,
+            {'chat_id': chat_id, 'user_id': user_id}
+        )
     
-    async def _suggest_materials_upload(self, message: types.Message):
+    async def _suggest_materials_upload(self, chat_id: int, user_id: int):
         """
         Предложение пользователю загрузить материалы
         """
-        user_id = message.from_user.id
-        logger.info(f"Предложение пользователю {user_id} загрузить материалы")
+        logger.debug("Предложение пользователю %s загрузить материалы", user_id)
         
-        await message.answer("Вы можете загрузить дополнительные материалы (документы, фото), которые помогут создать персональную программу.")
+        await self.send_queue.send_message(chat_id, "Вы можете загрузить дополнительные материалы (документы, фото), которые помогут создать персональную программу.", SendPriority.ONBOARDING)
         
         # Установка состояния пользователя
-        self._set_user_state(user_id, 'awaiting_materials', time.time())
+        await self._set_user_state(user_id, UserState.AWAITING_MATERIALS, time.time())
     
     async def _handle_audio_message(self, message: types.Message):
         """
         Обработка аудиосообщений
         """
         user_id = message.from_user.id
-        logger.info(f"Получено аудиосообщение от пользователя {user_id}")
+        logger.debug("Получено аудиосообщение от пользователя %s", user_id)
         
-        await message.answer("Получено аудиосообщение.")
+        await self._reply(message, "Получено аудиосообщение.")
     
     async def _handle_materials(self, message: types.Message):
         """
         Обработка загруженных материалов
         """
         user_id = message.from_user.id
-        logger.info(f"Получены материалы от пользователя {user_id}")
+        logger.debug("Получены материалы от пользователя %s", user_id)
         
-        await message.answer("Материалы получены. Спасибо!")
+        if message.document:
+            attachment = message.document
+            filename = attachment.file_name or f'document_{attachment.file_unique_id}'
+        else:
+            # Последний элемент — фото в максимальном разрешении
+            attachment = message.photo[-1]
+            filename = f'photo_{attachment.file_unique_id}.jpg'
+        
+        user = await self.user_service.get_user_by_telegram_id(user_id)
+        try:
+            file = await self.file_service.download_attachment(
+                self.bot, attachment.file_id, filename,
+                user.id if user else None, attachment.file_size, attachment.file_unique_id
+            )
+        except FileValidationError as e:
+            await self._reply(message, str(e))
+            return
+        await self.extraction_service.submit(file)
+        
+        await self._reply(message, "Материалы получены. Спасибо!")
         
         # Установка состояния пользователя
-        self._set_user_state(user_id, 'materials_received', time.time())
+        await self._set_user_state(user_id, UserState.MATERIALS_RECEIVED, time.time())
         
         # Уведомление о создании индивидуальной программы
         await self._notify_program_creation(message)
@@ -183,12 +337,16 @@ class BotApplication:
         Уведомление о создании индивидуальной программы
         """
         user_id = message.from_user.id
-        logger.info(f"Уведомление пользователя {user_id} о создании индивидуальной программы")
+        logger.debug("Уведомление пользователя %s о создании индивидуальной программы", user_id)
+        
+        user = await self.user_service.get_user_by_telegram_id(user_id)
+        if user is not None:
+            await self.program_service.enqueue(user.id, message.chat.id)
         
-        await message.answer("Ваша индивидуальная программа будет создана в ближайшее время.")
+        await self._reply(message, "Ваша индивидуальная программа поставлена в очередь. Мы пришлем сообщение, когда она будет готова.")
         
         # Установка состояния пользователя
-        self._set_user_state(user_id, 'program_notified', time.time())
+        await self._set_user_state(user_id, UserState.PROGRAM_NOTIFIED, time.time())
         
         # Выдача уникальной реферальной ссылки
         await self._provide_referral_link(message)
@@ -198,71 +356,157 @@ class BotApplication:
         Выдача уникальной реферальной ссылки пользователю
         """
         user_id = message.from_user.id
-        logger.info(f"Выдача реферальной ссылки пользователю {user_id}")
+        logger.debug("Выдача реферальной ссылки пользователю %s", user_id)
+        
+        user = await self.user_service.get_user_by_telegram_id(user_id)
+        if user is None:
+            return
         
-        # Генерация реферального кода
-        referral_code = await self.referral_service.create_referral_code(user_id)
-        referral_link = f"https://t.me/your_bot_username?start={referral_code}"
+        # Код однозначно определяется ID пользователя, повторная выдача возвращает тот же код
+        referral_code = user.referral_code or await self.referral_service.create_referral_code(user.id)
+        bot_user = await self.bot.me()
+        referral_link = f"https://t.me/{bot_user.username}?start={referral_code}"
         
-        await message.answer(f"Ваша уникальная реферальная ссылка: {referral_link}")
+        await self._reply(message, f"Ваша уникальная реферальная ссылка: {referral_link}")
         
         # Установка состояния пользователя
-        self._set_user_state(user_id, 'referral_provided', time.time())
+        await self._set_user_state(user_id, UserState.REFERRAL_PROVIDED, time.time())
+    
+    async def _handle_broadcast_command(self, message: types.Message):
+        """
+        Обработка команды /broadcast <текст>: запуск рассылки всем пользователям
+        """
+        user_id = message.from_user.id
+        if user_id not in ADMIN_IDS:
+            await self._handle_general_message(message)
+            return
+        
+        text = parse_command(message.text)[1]
+        if not text:
+            await self._reply(message, "Использование: /broadcast <текст рассылки>")
+            return
+        
+        broadcast_id = await self.broadcast_service.create_broadcast(text)
+        self.broadcast_service.start_broadcast(broadcast_id)
+        logger.info("Администратор %s запустил рассылку %s", user_id, broadcast_id)
+        
+        await self._reply(message, f"Рассылка {broadcast_id} запущена.")
+    
+    async def _handle_queue_command(self, message: types.Message):
+        """
+        Обработка команды /queue: состояние очереди составления программ
+        """
+        if message.from_user.id not in ADMIN_IDS:
+            await self._handle_general_message(message)
+            return
+        
+        stats = await self.program_service.stats()
+        throttling = self.throttling.stats()
+        await self._reply(
+            message,
+            f"Программы в очереди: {stats['pending']}, составляются: {stats['running']}\n"
+            f"Самая старая задача ждет {stats['oldest_pending_age']:.0f} с\n"
+            f"За час готово: {stats['done']}, ожидание в среднем {stats['avg_wait']:.1f} с, "
+            f"до готовности в среднем {stats['avg_latency']:.1f} с (максимум {stats['max_latency']:.1f} с)\n"
+            f"Сообщений отброшено защитой от спама: {throttling['throttled']} из {throttling['throttled'] + throttling['passed']}"
+        )
+    
+    async def _handle_top_command(self, message: types.Message):
+        """
+        Обработка команды /top [страница]: таблица лидеров по приглашениям
+        """
+        args = parse_command(message.text)[1]
+        # isdigit() пропускает надстрочные цифры вроде '²', которые int() не разбирает
+        page = int(args) if args.isdecimal() and int(args) > 0 else 1
+        text = await self.leaderboard_service.render_page(page)
+        
+        user = await self.user_service.get_user_by_telegram_id(message.from_user.id)
+        if user is not None:
+            rank, score = self.leaderboard_service.get_rank(user.id)
+            if rank is not None:
+                text += f"\n\nВаше место: {rank} (приглашений: {score})"
+        
+        await self._reply(message, text)
     
     async def _handle_program_request(self, message: types.Message):
         """
         Обработка запросов, связанных с программами
         """
         user_id = message.from_user.id
-        logger.info(f"Получен запрос к программе от пользователя {user_id}")
+        logger.debug("Получен запрос к программе от пользователя %s", user_id)
         
-        await message.answer("Запрос к программе обработан.")
+        user = await self.user_service.get_user_by_telegram_id(user_id)
+        status = await self.program_service.get_job_status(user.id) if user else None
+        if status is None:
+            await self._reply(message, "Загрузите материалы, и мы составим для вас индивидуальную программу.")
+        elif status['status'] == 'pending':
+            await self._reply(message, f"Ваша программа в очереди, позиция {status['position']}.")
+        elif status['status'] == 'running':
+            await self._reply(message, "Ваша программа составляется.")
+        elif status['status'] == 'done':
+            program = await self.program_service.get_latest_program(user.id)
+            await self._reply(message, f"Ваша программа готова. {program.description}. "
+                                       f"Ориентировочная длительность — {program.duration} мин.")
+        else:
+            await self._reply(message, "Не удалось составить программу. Попробуйте загрузить материалы еще раз.")
     
     async def _handle_referral_request(self, message: types.Message):
         """
         Обработка запросов, связанных с рефералами
         """
         user_id = message.from_user.id
-        logger.info(f"Получен запрос к рефералу от пользователя {user_id}")
+        logger.debug("Получен запрос к рефералу от пользователя %s", user_id)
         
-        await message.answer("Запрос к рефералу обработан.")
+        user = await self.user_service.get_user_by_telegram_id(user_id)
+        if user is None:
+            await self._reply(message, "Отправьте /start, чтобы получить реферальную ссылку.")
+            return
+        
+        stats = await self.referral_service.get_referral_statistics(user.id)
+        await self._reply(
+            message,
+            f"Вы пригласили пользователей: {stats['direct_count']}. "
+            f"Всего в вашей реферальной сети: {stats['total_count']}."
+        )
     
     async def _handle_general_message(self, message: types.Message):
         """
         Обработка всех остальных сообщений
         """
         user_id = message.from_user.id
-        logger.info(f"Получено общее сообщение от пользователя {user_id}")
+        logger.debug("Получено общее сообщение от пользователя %s", user_id)
         
         # В зависимости от состояния пользователя можно отправлять соответствующие ответы
-        state = self._get_user_state(user_id)
-        if state and state.get('state') == 'awaiting_materials':
-            await message.answer("Спасибо за сообщение. Загрузите материалы (документы или фото), чтобы мы могли создать для вас индивидуальную программу.")
+        record = await self._get_user_state(user_id)
+        if record and record.state is UserState.AWAITING_MATERIALS:
+            await self._reply(message, "Спасибо за сообщение. Загрузите материалы (документы или фото), чтобы мы могли создать для вас индивидуальную программу.")
         else:
-            await message.answer("Спасибо за сообщение. Используйте /start для начала работы с ботом.")
+            await self._reply(message, "Спасибо за сообщение. Используйте /start для начала работы с ботом.")
+    
+    async def _reply(self, message: types.Message, text: str):
+        """
+        Ответ пользователю через очередь исходящих сообщений с наивысшим приоритетом
+        """
+        return await self.send_queue.send_message(message.chat.id, text, SendPriority.INTERACTIVE)
     
-    def _set_user_state(self, user_id: int, state: str, timestamp: float = None):
+    async def _set_user_state(self, user_id: int, state: UserState, timestamp: float = None):
         """
         Установка состояния пользователя
         """
-        if user_id not in self.user_states:
-            self.user_states[user_id] = {}
-        
-        self.user_states[user_id]['state'] = state
-        self.user_states[user_id]['timestamp'] = timestamp or time.time()
+        await self.state_storage.set(user_id, state, timestamp)
     
-    def _get_user_state(self, user_id: int):
+    async def _get_user_state(self, user_id: int):
         """
         Получение состояния пользователя
         """
-        return self.user_states.get(user_id, None)
+        return await self.state_storage.get(user_id)
 
 
 @asynccontextmanager
 async def lifespan(app: BotApplication):
     """
     Управление жизненным циклом приложения
-    ""
+    """
     logger.info("Инициализация приложения...")
     await app.initialize()
     logger.info("Приложение инициализировано")
@@ -273,7 +517,7 @@ async def lifespan(app: BotApplication):
 
 
 async def main():
-    ""
+    """
     Основная функция запуска бота
     """
     logger.info("Запуск бота...")
@@ -283,6 +527,16 @@ async def main():
         logger.error("Не задан BOT_TOKEN в настройках")
         return
     
+    if BOT_MODE == 'webhook' and not WEBHOOK_BASE_URL:
+        logger.error("Не задан WEBHOOK_BASE_URL для режима webhook")
+        return
+    
+    # В режиме webhook с несколькими процессами приложение создается в каждом процессе-обработчике
+    if BOT_MODE == 'webhook' and WEBHOOK_WORKERS > 1:
+        logger.info("Запуск webhook с %s процессами-обработчиками...", WEBHOOK_WORKERS)
+        await run_webhook_workers(WEBHOOK_WORKERS)
+        return
+    
     # Создание экземпляра приложения
     app = BotApplication()
     
@@ -291,21 +545,28 @@ async def main():
     
     # Запуск бота
     try:
-        logger.info("Начало polling...")
-        await app.bot.delete_webhook(drop_pending_updates=True)
-        await app.dispatcher.start_polling(app.bot, allowed_updates=app.dispatcher.resolve_used_update_types())
+        if BOT_MODE == 'webhook':
+            logger.info("Запуск webhook...")
+            await run_webhook(app)
+        else:
+            logger.info("Начало polling...")
+            await app.bot.delete_webhook(drop_pending_updates=True)
+            await app.dispatcher.start_polling(app.bot, allowed_updates=app.dispatcher.resolve_used_update_types())
     except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
+        logger.error("Ошибка при запуске бота: %s", e)
     finally:
-        if app.bot:
-            await app.bot.session.close()
+        await app.shutdown()
         logger.info("Сессия бота закрыта")
 
 
 if __name__ == "__main__":
+    # Журнал настраивается только в основном процессе: процессы-обработчики
+    # и процессы извлечения текста импортируют этот модуль и передают
+    # записи в основной процесс через очередь
+    setup_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
     except Exception as e:
-        logger.error(f"Критическая ошибка: {e}")
\ No newline at end of file
+        logger.error("Критическая ошибка: %s", e)
\ No newline at end of file
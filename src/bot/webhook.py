@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+
+from config.settings import (
+    BOT_TOKEN, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_SECRET, WEBHOOK_WORKERS, UPDATE_QUEUE_SIZE, UPDATE_CONCURRENCY, METRICS_PORT,
+    TELEGRAM_API_SERVER
+)
+from utils.logging_config import get_process_log_queue, setup_child_logging
+from utils.metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+# Бот обрабатывает только сообщения, остальные типы обновлений не запрашиваются
+WEBHOOK_ALLOWED_UPDATES = ['message']
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def create_bot_session() -> AiohttpSession:
+    """
+    Сессия Bot API: api.telegram.org или сервер, заданный TELEGRAM_API_SERVER
+    (собственный сервер Bot API или тестовый сервер нагрузочных тестов)
+    """
+    if TELEGRAM_API_SERVER:
+        return AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    return AiohttpSession()
+
+
+def _is_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def extract_user_id(data: Dict[str, Any]) -> Optional[int]:
+    """
+    Определение пользователя, к которому относится обновление
+    :param data: Обновление в виде словаря
+    :return: ID пользователя (или чата), либо update_id, если определить не удалось;
+             None, если update_id не целое число (некорректное обновление)
+    """
+    for value in data.values():
+        if isinstance(value, dict):
+            for key in ('from', 'chat'):
+                sender = value.get(key)
+                if isinstance(sender, dict) and _is_id(sender.get('id')):
+                    return sender['id']
+    update_id = data.get('update_id')
+    return update_id if _is_id(update_id) else None
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь обработки обновлений.
+
+    Обновления распределяются по шардам по ID пользователя, каждый шард
+    обрабатывается одной корутиной. Обновления одного пользователя
+    обрабатываются строго по порядку, разных пользователей — параллельно.
+    """
+
+    def __init__(self, app, concurrency: int = UPDATE_CONCURRENCY, max_size: int = UPDATE_QUEUE_SIZE):
+        """
+        :param app: Экземпляр BotApplication
+        :param concurrency: Количество шардов (параллельных обработчиков)
+        :param max_size: Общий предел необработанных обновлений
+        """
+        self.app = app
+        shard_size = max(1, max_size // concurrency)
+        self._shards: List[asyncio.Queue] = [asyncio.Queue(maxsize=shard_size) for _ in range(concurrency)]
+        self._tasks: List[asyncio.Task] = []
+
+    def qsize(self) -> int:
+        """Количество обновлений, ожидающих обработки"""
+        return sum(shard.qsize() for shard in self._shards)
+
+    def put_nowait(self, user_id: int, update: Update) -> bool:
+        """
+        Постановка обновления в очередь без ожидания
+        :return: False, если очередь пользователя переполнена
+        """
+        try:
+            self._shards[user_id % len(self._shards)].put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def put(self, user_id: int, update: Update):
+        """
+        Постановка обновления в очередь с ожиданием свободного места
+        """
+        await self._shards[user_id % len(self._shards)].put(update)
+
+    async def start(self):
+        """Запуск обработчиков шардов"""
+        self._tasks = [asyncio.create_task(self._consume(shard)) for shard in self._shards]
+
+    async def stop(self, timeout: float = 10):
+        """
+        Остановка с ожиданием обработки уже принятых обновлений
+        :param timeout: Максимальное время ожидания в секундах
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.join() for shard in self._shards)),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Не обработано %s обновлений при остановке", self.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _consume(self, shard: asyncio.Queue):
+        while True:
+            update = await shard.get()
+            try:
+                await self.app.dispatcher.feed_update(self.app.bot, update)
+            except Exception as e:
+                logger.error("Ошибка обработки обновления %s: %s", update.update_id, e)
+            finally:
+                shard.task_done()
+
+
+def _check_secret(request: web.Request) -> bool:
+    return not WEBHOOK_SECRET or request.headers.get(SECRET_HEADER) == WEBHOOK_SECRET
+
+
+async def _set_webhook(bot: Bot):
+    await bot.set_webhook(
+        url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=WEBHOOK_ALLOWED_UPDATES,
+        drop_pending_updates=True
+    )
+
+
+async def _serve(handler: Callable[[web.Request], Awaitable[web.Response]]):
+    """
+    Запуск веб-сервера и ожидание остановки
+    """
+    web_app = web.Application()
+    web_app.router.add_post(WEBHOOK_PATH, handler)
+    web_app.router.add_get('/health', lambda request: web.Response(text='ok'))
+
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info("Webhook-сервер слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(app):
+    """
+    Прием обновлений через webhook в текущем процессе.
+    Обновление ставится в очередь, и Telegram сразу получает ответ;
+    при переполнении очереди возвращается 503, и Telegram повторит доставку позже.
+    :param app: Инициализированный экземпляр BotApplication
+    """
+    update_queue = UpdateQueue(app)
+    await update_queue.start()
+    REGISTRY.gauge('bot_update_queue_size', 'Обновления, ожидающие обработки', update_queue.qsize)
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if not _check_secret(request):
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={'bot': app.bot})
+        except ValueError as e:
+            logger.warning("Некорректное тело обновления: %s", e)
+            return web.Response(status=400)
+        user_id = extract_user_id(data)
+        if user_id is None:
+            return web.Response(status=400)
+        if not update_queue.put_nowait(user_id, update):
+            return web.Response(status=503)
+        return web.Response()
+
+    await _set_webhook(app.bot)
+    try:
+        await _serve(handle_update)
+    finally:
+        await update_queue.stop()
+
+
+def _worker_process(updates: multiprocessing.Queue, index: int, workers: int,
+                    log_queue: Optional[multiprocessing.Queue]):
+    """
+    Точка входа процесса-обработчика
+    :param updates: Очередь тел обновлений от принимающего процесса
+    :param index: Номер процесса (определяет порт /metrics)
+    :param workers: Количество процессов-обработчиков
+    :param log_queue: Очередь записей журнала принимающего процесса
+    """
+    setup_child_logging(log_queue)
+    try:
+        asyncio.run(_run_worker(updates, index, workers))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(updates: multiprocessing.Queue, index: int, workers: int):
+    from src.bot.main import BotApplication
+
+    # У каждого процесса свои метрики, поэтому и свой порт.
+    # Общую фоновую работу выполняет только первый процесс.
+    # Предел скорости отправки SEND_GLOBAL_RATE делится между процессами поровну.
+    app = BotApplication(
+        metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0,
+        background=index == 0,
+        workers=workers
+    )
+    await app.initialize()
+    update_queue = UpdateQueue(app)
+    await update_queue.start()
+    REGISTRY.gauge('bot_update_queue_size', 'Обновления, ожидающие обработки', update_queue.qsize)
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            body = await loop.run_in_executor(None, updates.get)
+            if body is None:
+                break
+            try:
+                data = json.loads(body)
+                update = Update.model_validate(data, context={'bot': app.bot})
+            except ValueError as e:
+                logger.warning("Пропущено некорректное обновление: %s", e)
+                continue
+            await update_queue.put(extract_user_id(data) or update.update_id, update)
+    finally:
+        await update_queue.stop()
+        await app.shutdown()
+
+
+async def run_webhook_workers(workers: int = WEBHOOK_WORKERS):
+    """
+    Прием обновлений через webhook с обработкой в нескольких процессах.
+
+    Текущий процесс только принимает запросы на одном порту и передает тело
+    обновления процессу-обработчику, выбранному по ID пользователя. Поэтому
+    все обновления пользователя попадают в один процесс и обрабатываются
+    по порядку, а кэши и буферы состояний процессов не пересекаются.
+    Общую фоновую работу (рассылки, восстановление задач, поиск
+    необработанных файлов) выполняет только первый процесс-обработчик.
+    Каждый процесс отправляет не больше SEND_GLOBAL_RATE / workers
+    сообщений в секунду, чтобы бот в целом не превышал SEND_GLOBAL_RATE.
+    :param workers: Количество процессов-обработчиков
+    """
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue(maxsize=max(1, UPDATE_QUEUE_SIZE // workers)) for _ in range(workers)]
+    log_queue = get_process_log_queue()
+    processes = [
+        context.Process(target=_worker_process, args=(updates, index, workers, log_queue), daemon=True)
+        for index, updates in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if not _check_secret(request):
+            return web.Response(status=401)
+        body = await request.read()
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict) or not _is_id(data.get('update_id')):
+            return web.Response(status=400)
+        user_id = extract_user_id(data)
+        if user_id is None:
+            return web.Response(status=400)
+        try:
+            queues[user_id % workers].put_nowait(body)
+        except queue.Full:
+            return web.Response(status=503)
+        return web.Response()
+
+    bot = Bot(token=BOT_TOKEN, session=create_bot_session())
+    try:
+        await _set_webhook(bot)
+    finally:
+        await bot.session.close()
+
+    try:
+        await _serve(handle_update)
+    finally:
+        for updates in queues:
+            try:
+                updates.put(None, timeout=5)
+            except queue.Full:
+                pass
+        loop = asyncio.get_running_loop()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 30)
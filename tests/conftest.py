@@ -0,0 +1,11 @@
+import pytest
+
+from database.migrations import apply_migrations
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    """Путь к временной базе данных с примененными миграциями"""
+    path = str(tmp_path / 'test.db')
+    apply_migrations(path)
+    return path
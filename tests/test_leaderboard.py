@@ -0,0 +1,55 @@
+import random
+
+from utils.leaderboard import Leaderboard
+
+
+def _brute_rank(scores, user_id):
+    return 1 + sum(1 for score in scores.values() if score > scores[user_id])
+
+
+def _brute_top(scores, offset, limit, capacity):
+    # Для постраничного вывода доступны только первые capacity позиций
+    ordered = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:capacity]
+    return ordered[offset:offset + limit]
+
+
+def test_rank_and_top_match_brute_force():
+    generator = random.Random(7)
+    board = Leaderboard(capacity=50)
+    scores = {}
+    for step in range(5000):
+        user_id = generator.randrange(1, 400)
+        if generator.random() < 0.8:
+            delta = generator.randint(1, 5)
+            board.add_score(user_id, delta)
+            scores[user_id] = scores.get(user_id, 0) + delta
+        else:
+            # Счет не уменьшается: меньшие значения игнорируются
+            score = generator.randint(0, 3000)
+            board.set_score(user_id, score)
+            if score > scores.get(user_id, 0):
+                scores[user_id] = score
+
+        if step % 100 == 0:
+            assert len(board) == len(scores)
+            for checked in scores:
+                assert board.score(checked) == scores[checked]
+                assert board.rank(checked) == _brute_rank(scores, checked)
+            for offset in (0, 10, 45):
+                assert board.top(offset, 10) == _brute_top(scores, offset, 10, board.capacity)
+
+
+def test_scores_beyond_initial_tree_size():
+    board = Leaderboard()
+    board.set_score(1, 5)
+    board.set_score(2, 100000)
+    board.set_score(3, 5)
+    assert board.rank(2) == 1
+    assert board.rank(1) == board.rank(3) == 2
+    assert board.top() == [(2, 100000), (1, 5), (3, 5)]
+
+
+def test_unknown_user_has_no_rank():
+    board = Leaderboard()
+    assert board.rank(1) is None
+    assert board.score(1) == 0
@@ -0,0 +1,92 @@
+import sqlite3
+
+from database.migrations import apply_migrations, load_migrations
+
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER UNIQUE NOT NULL,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE referrals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        referrer_id INTEGER,
+        referred_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (referrer_id) REFERENCES users (id),
+        FOREIGN KEY (referred_id) REFERENCES users (id)
+    );
+    INSERT INTO users (telegram_id, username) VALUES (100, 'first'), (200, 'second');
+    INSERT INTO referrals (referrer_id, referred_id) VALUES (1, 2);
+'''
+
+
+def _schema(path: str) -> dict:
+    """Объекты схемы и колонки таблиц (порядок колонок не учитывается)"""
+    conn = sqlite3.connect(path)
+    try:
+        objects = conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        ).fetchall()
+        return {
+            (object_type, name): sorted(row[1] for row in conn.execute(f'PRAGMA table_info({name})'))
+            if object_type == 'table' else None
+            for object_type, name in objects
+        }
+    finally:
+        conn.close()
+
+
+def _version(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_empty_database(tmp_path):
+    path = str(tmp_path / 'empty.db')
+    versions = [migration.version for migration in load_migrations()]
+
+    assert apply_migrations(path) == versions
+    assert _version(path) == versions[-1]
+    conn = sqlite3.connect(path)
+    try:
+        assert [row[0] for row in conn.execute('SELECT version FROM schema_migrations ORDER BY version')] == versions
+    finally:
+        conn.close()
+
+
+def test_baseline_database_matches_new_schema(tmp_path):
+    empty_path, baseline_path = str(tmp_path / 'empty.db'), str(tmp_path / 'baseline.db')
+    apply_migrations(empty_path)
+    conn = sqlite3.connect(baseline_path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+
+    apply_migrations(baseline_path)
+
+    assert _schema(baseline_path) == _schema(empty_path)
+    conn = sqlite3.connect(baseline_path)
+    try:
+        users = conn.execute('SELECT telegram_id, username, is_active, is_blocked FROM users ORDER BY id').fetchall()
+        assert users == [(100, 'first', 1, 0), (200, 'second', 1, 0)]
+        assert conn.execute('SELECT referrer_id, referred_id FROM referrals').fetchall() == [(1, 2)]
+    finally:
+        conn.close()
+
+
+def test_rerun_is_idempotent(tmp_path):
+    path = str(tmp_path / 'test.db')
+    apply_migrations(path, target=2)
+    assert _version(path) == 2
+
+    apply_migrations(path)
+    schema = _schema(path)
+    assert apply_migrations(path) == []
+    assert _schema(path) == schema
+    assert _version(path) == len(load_migrations())
@@ -0,0 +1,98 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.models import File, Program, User
+
+
+def _users():
+    return [
+        User(id=1, telegram_id=100, username='first', created_at=datetime(2024, 5, 1, 12, 30, 15),
+             referral_code='abc123', is_active=True, updated_at=datetime(2024, 5, 2)),
+        # Метки времени без значения
+        User(id=2, telegram_id=200, created_at=None, updated_at=None, is_blocked=True),
+    ]
+
+
+@pytest.mark.parametrize('user', _users())
+def test_dict_round_trip(user):
+    data = user.to_dict()
+    assert User.from_dict(data) == user
+    assert User.from_dict(data).to_dict() == data
+
+
+def test_timestamps_are_lazy_datetimes():
+    user = _users()[0]
+    assert user.to_dict()['created_at'] == '2024-05-01T12:30:15'
+    assert user.created_at == datetime(2024, 5, 1, 12, 30, 15)
+    assert user.as_tuple()[User.FIELDS.index('created_at')] == int(datetime(2024, 5, 1, 12, 30, 15, tzinfo=timezone.utc).timestamp())
+    assert _users()[1].created_at is None
+    assert _users()[1].to_dict()['created_at'] is None
+
+
+def test_fields_keep_table_column_order():
+    assert User.FIELDS == (
+        'id', 'telegram_id', 'username', 'first_name', 'last_name', 'referral_code', 'referred_by',
+        'created_at', 'updated_at', 'is_active', 'is_blocked'
+    )
+
+
+def test_flags_are_coerced_to_bool():
+    user = User.from_dict({'id': 1, 'is_active': 0, 'is_blocked': 1})
+    assert user.is_active is False and user.is_blocked is True
+    assert User(id=1, is_active='1').is_active is True
+
+
+def test_aware_datetime_is_converted_to_utc():
+    moscow = timezone(timedelta(hours=3))
+    user = User(id=1, created_at=datetime(2024, 5, 1, 15, 0, tzinfo=moscow))
+    assert user.created_at == datetime(2024, 5, 1, 12, 0)
+
+
+def test_from_rows_round_trip():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        'CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_id INTEGER, username TEXT, first_name TEXT, '
+        'last_name TEXT, created_at TIMESTAMP, referral_code TEXT, referred_by INTEGER, '
+        'is_active BOOLEAN, is_blocked BOOLEAN, updated_at TIMESTAMP)'
+    )
+    users = _users()
+    for user in users:
+        data = user.to_dict()
+        # Метки времени в базе хранятся строками, как CURRENT_TIMESTAMP
+        for name in User.TIMESTAMPS:
+            if data[name] is not None:
+                data[name] = data[name].replace('T', ' ')
+        conn.execute(
+            f'INSERT INTO users ({", ".join(User.FIELDS)}) VALUES ({", ".join("?" * len(User.FIELDS))})',
+            [data[name] for name in User.FIELDS]
+        )
+
+    rows = conn.execute(f'SELECT {User.SQL_COLUMNS} FROM users ORDER BY id').fetchall()
+    assert User.from_rows(rows) == users
+    # BOOLEAN хранится числом, модель возвращает bool
+    assert User.from_rows(rows)[1].is_blocked is True
+    assert [User.from_row(row) for row in rows] == users
+    assert User.from_rows([]) == []
+
+    # Колонки, которых нет в запросе, получают значения по умолчанию
+    row = conn.execute('SELECT id, telegram_id FROM users WHERE id = 2').fetchone()
+    assert User.from_row(row) == User(id=2, telegram_id=200)
+    conn.close()
+
+
+def test_frozen_and_mutable_models():
+    file = File(id=1, file_name='a.txt', uploaded_at='2024-05-01 10:00:00')
+    with pytest.raises(AttributeError):
+        file.file_name = 'b.txt'
+    with pytest.raises(AttributeError):
+        file.uploaded_at = None
+    assert hash(file) == hash(File.from_dict(file.to_dict()))
+
+    program = Program(id=1, title='Программа')
+    program.created_at = '2024-05-01T10:00:00'
+    program.updated_at = None
+    assert program.created_at == datetime(2024, 5, 1, 10, 0)
+    assert Program.from_dict(program.to_dict()) == program
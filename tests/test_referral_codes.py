@@ -0,0 +1,45 @@
+import pytest
+
+from utils.referral_codes import BASE62_ALPHABET, ReferralCodec
+
+
+def test_round_trip_and_uniqueness():
+    codec = ReferralCodec('test-secret', 8)
+    codes = set()
+    for user_id in range(20000):
+        code = codec.encode(user_id)
+        assert len(code) == 8
+        assert set(code) <= set(BASE62_ALPHABET)
+        assert codec.decode(code) == user_id
+        codes.add(code)
+    assert len(codes) == 20000
+
+
+def test_whole_space_is_a_permutation():
+    # Пространство кодов длины 2 достаточно мало, чтобы проверить его целиком
+    codec = ReferralCodec('test-secret', 2)
+    codes = [codec.encode(user_id) for user_id in range(codec.capacity)]
+    assert len(set(codes)) == codec.capacity
+    assert [codec.decode(code) for code in codes] == list(range(codec.capacity))
+
+
+def test_large_ids_round_trip():
+    codec = ReferralCodec('test-secret', 8)
+    for user_id in (codec.capacity - 1, codec.capacity // 2, 2 ** 40 + 12345):
+        assert codec.decode(codec.encode(user_id)) == user_id
+
+
+def test_secret_changes_codes():
+    first, second = ReferralCodec('one', 8), ReferralCodec('two', 8)
+    assert [first.encode(i) for i in range(100)] != [second.encode(i) for i in range(100)]
+
+
+@pytest.mark.parametrize('user_id', [-1, 62 ** 8])
+def test_out_of_range_id(user_id):
+    with pytest.raises(ValueError):
+        ReferralCodec('test-secret', 8).encode(user_id)
+
+
+@pytest.mark.parametrize('code', ['', 'abc', 'abcdefghi', 'abc-efgh', 'абвгдежз'])
+def test_decode_rejects_non_codes(code):
+    assert ReferralCodec('test-secret', 8).decode(code) is None
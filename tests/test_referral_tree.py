@@ -0,0 +1,131 @@
+import asyncio
+import random
+from collections import Counter
+
+import pytest
+
+import services.referral_service as referral_module
+from services.referral_service import ReferralService
+from services.user_service import UserService
+from utils.database import AsyncDatabase
+
+MAX_DEPTH = 3
+
+
+@pytest.fixture(autouse=True)
+def max_depth(monkeypatch):
+    monkeypatch.setattr(referral_module, 'REFERRAL_MAX_DEPTH', MAX_DEPTH)
+
+
+def _expected(parents):
+    """Пути, уровни и счетчики, посчитанные напрямую по родителям"""
+    paths = set()
+    for user_id in parents:
+        ancestor, depth = parents.get(user_id), 1
+        while ancestor is not None and depth <= MAX_DEPTH:
+            paths.add((ancestor, user_id, depth))
+            ancestor, depth = parents.get(ancestor), depth + 1
+    levels = Counter((ancestor, depth) for ancestor, _, depth in paths)
+    totals = Counter(ancestor for ancestor, _, _ in paths)
+    directs = Counter(parents.values())
+    return paths, levels, {user_id: (directs[user_id], totals[user_id]) for user_id in totals}
+
+
+async def _actual(db):
+    paths = {tuple(row) for row in await db.fetchall('SELECT ancestor_id, descendant_id, depth FROM referral_paths')}
+    levels = {(row['user_id'], row['depth']): row['count']
+              for row in await db.fetchall('SELECT user_id, depth, count FROM referral_level_counts')}
+    stats = {row['user_id']: (row['direct_count'], row['total_count'])
+             for row in await db.fetchall('SELECT user_id, direct_count, total_count FROM referral_stats')}
+    return paths, levels, stats
+
+
+async def _register(service, referrer_id, referee_id):
+    return await service.register_referral_usage(referrer_id, referee_id, service.codec.encode(referrer_id))
+
+
+def test_paths_and_counters_after_insert_and_rebuild(db_path):
+    async def scenario():
+        db = AsyncDatabase(db_path)
+        service = ReferralService(db)
+        generator = random.Random(1)
+        parents = {}
+        # Приглашения в случайном порядке: приглашенный может уже иметь свое поддерево
+        for _ in range(300):
+            referrer_id, referee_id = generator.sample(range(1, 80), 2)
+            registered = await _register(service, referrer_id, referee_id)
+            ancestor, creates_cycle = referrer_id, False
+            while ancestor is not None:
+                creates_cycle = creates_cycle or ancestor == referee_id
+                ancestor = parents.get(ancestor)
+            assert registered == (referee_id not in parents and not creates_cycle)
+            if registered:
+                parents[referee_id] = referrer_id
+
+        expected = _expected(parents)
+        assert await _actual(db) == expected
+
+        await service.rebuild_referral_tree()
+        assert await _actual(db) == expected
+
+        statistics = await service.get_referral_statistics(generator.choice(list(parents.values())))
+        assert sum(statistics['levels'].values()) == statistics['total_count']
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_depth_is_limited(db_path):
+    async def scenario():
+        db = AsyncDatabase(db_path)
+        service = ReferralService(db)
+        for user_id in range(1, 7):
+            assert await _register(service, user_id, user_id + 1)
+
+        chain = await service.get_referral_chain(7)
+        assert chain == [{'user_id': 7 - depth, 'depth': depth} for depth in range(1, MAX_DEPTH + 1)]
+        statistics = await service.get_referral_statistics(1)
+        assert statistics['direct_count'] == 1
+        assert statistics['total_count'] == MAX_DEPTH
+        assert statistics['levels'] == {depth: 1 for depth in range(1, MAX_DEPTH + 1)}
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_cycles_and_repeats_are_rejected(db_path):
+    async def scenario():
+        db = AsyncDatabase(db_path)
+        service = ReferralService(db)
+        assert await _register(service, 1, 2)
+        assert await _register(service, 2, 3)
+        assert not await _register(service, 3, 1)
+        assert not await _register(service, 4, 3)
+        assert not await _register(service, 5, 5)
+        assert not await service.register_referral_usage(1, 6, service.codec.encode(2))
+        assert (await db.fetchone('SELECT COUNT(*) AS count FROM referrals'))['count'] == 2
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_referral_writes_refresh_cached_users(db_path):
+    async def scenario():
+        db = AsyncDatabase(db_path)
+        users = UserService(db)
+        service = ReferralService(db, user_service=users)
+        referrer = await users.create_user({'telegram_id': 100})
+        referee = await users.create_user({'telegram_id': 200})
+        # Пользователи попадают в кэш до изменения записей
+        assert (await users.get_user_by_telegram_id(100)).referral_code is None
+        assert (await users.get_user_by_telegram_id(200)).referred_by is None
+
+        code = await service.create_referral_code(referrer.id)
+        assert await service.register_referral_usage(referrer.id, referee.id, code)
+
+        assert (await users.get_user_by_telegram_id(100)).referral_code == code
+        assert (await users.get_user_by_telegram_id(200)).referred_by == referrer.id
+        await users.flush()
+        await db.close()
+
+    asyncio.run(scenario())
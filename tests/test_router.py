@@ -0,0 +1,57 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from handlers.router import MessageRouter
+from utils.keyword_matcher import KeywordMatcher
+
+
+async def _handler(message):
+    pass
+
+
+def _router(*words: str) -> MessageRouter:
+    router = MessageRouter()
+    for word in words:
+        router.keyword(word, _handler)
+    return router
+
+
+def _route_name(router: MessageRouter, text: str):
+    route = router.resolve_route(SimpleNamespace(text=text))
+    return route[0] if route else None
+
+
+@pytest.mark.parametrize('words, text, expected', [
+    # Слово, зарегистрированное раньше, начинается внутри другого совпадения
+    (['аудио', 'программа аудио'], 'программа аудио', 'keyword:аудио'),
+    (['bc', 'abcd'], 'abcd', 'keyword:bc'),
+    # Более раннее слово — префикс более позднего
+    (['про', 'программа'], 'программа', 'keyword:про'),
+    # Более раннее слово — суффикс более позднего
+    (['мма', 'программа'], 'программа', 'keyword:мма'),
+    # Перекрывающиеся слова
+    (['cde', 'abcd'], 'abcde', 'keyword:cde'),
+    (['abcd', 'cde'], 'abcde', 'keyword:abcd'),
+    (['привет'], 'ПРИВЕТ!', 'keyword:привет'),
+    (['привет'], 'пока', None),
+])
+def test_keyword_priority(words, text, expected):
+    assert _route_name(_router(*words), text) == expected
+
+
+def test_command_wins_over_keyword():
+    router = _router('start')
+    router.command('start', _handler)
+    assert _route_name(router, '/start') == 'command:start'
+
+
+def test_matcher_agrees_with_brute_force():
+    generator = random.Random(0)
+    for _ in range(300):
+        words = [''.join(generator.choice('ab') for _ in range(generator.randint(1, 4)))
+                 for _ in range(generator.randint(1, 8))]
+        text = ''.join(generator.choice('abc') for _ in range(generator.randint(0, 20)))
+        expected = next((index for index, word in enumerate(words) if word in text), None)
+        assert KeywordMatcher(words).first_match(text) == expected
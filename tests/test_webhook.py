@@ -0,0 +1,21 @@
+import pytest
+
+from src.bot.webhook import extract_user_id
+
+
+@pytest.mark.parametrize('data, expected', [
+    ({'update_id': 1, 'message': {'from': {'id': 42}, 'chat': {'id': 7}}}, 42),
+    ({'update_id': 1, 'message': {'chat': {'id': 7}}}, 7),
+    ({'update_id': 1, 'message': {'from': {}, 'chat': {'id': 7}}}, 7),
+    # Некорректный отправитель не должен приводить к ошибке
+    ({'update_id': 1, 'message': {'from': 5}}, 1),
+    ({'update_id': 1, 'message': {'from': {'id': '42'}}}, 1),
+    ({'update_id': 1, 'message': {'from': {'id': True}}}, 1),
+    ({'update_id': 3}, 3),
+    # Без целого update_id обновление некорректно
+    ({'update_id': '3'}, None),
+    ({'message': {'from': 5}}, None),
+    ({}, None),
+])
+def test_extract_user_id(data, expected):
+    assert extract_user_id(data) == expected
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+
+class WriteBatcher:
+    """
+    Накопитель операций записи.
+
+    Элементы, поступившие в течение max_delay секунд (но не более max_size),
+    передаются в flush_func одним списком. flush_func должна вернуть список
+    результатов той же длины, каждый результат возвращается своему вызывающему.
+    """
+
+    def __init__(self, flush_func: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_delay: float, max_size: int):
+        """
+        :param flush_func: Корутина записи пакета
+        :param max_delay: Максимальное время накопления пакета в секундах
+        :param max_size: Максимальный размер пакета
+        """
+        self.flush_func = flush_func
+        self.max_delay = max_delay
+        self.max_size = max_size
+
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Добавление элемента в текущий пакет
+        :param item: Элемент для записи
+        :return: Результат записи этого элемента
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+
+        return await future
+
+    async def drain(self):
+        """
+        Немедленная запись накопленных элементов и ожидание всех текущих записей
+        """
+        if self._pending:
+            self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.flush_func([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
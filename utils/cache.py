@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+# Маркер отсутствия значения в кэше (None может быть закэшированным значением)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру кэш с вытеснением давно неиспользуемых записей (LRU)
+    и временем жизни для каждой записи.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: Максимальное количество записей
+        :param ttl: Время жизни записи по умолчанию в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """
+        Получение значения из кэша
+        :param key: Ключ
+        :param default: Значение, возвращаемое при промахе
+        :return: Значение или default
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Запись значения в кэш
+        :param key: Ключ
+        :param value: Значение (может быть None)
+        :param ttl: Время жизни записи в секундах (по умолчанию self.ttl)
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def add(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Запись значения, только если для ключа нет действующей записи.
+        Используется при заполнении кэша после промаха, чтобы не затереть
+        значение, записанное параллельно.
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self.set(key, value, ttl)
+
+    def invalidate(self, key: Hashable):
+        """
+        Удаление записи из кэша
+        :param key: Ключ
+        """
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Очистка кэша"""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика кэша
+        :return: Словарь с количеством попаданий, промахов и записей
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'size': len(self._data),
+            'max_size': self.max_size
+        }
@@ -1,10 +1,31 @@
+import asyncio
 import sqlite3
-from typing import Optional
-from config.settings import DATABASE_PATH
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence, TypeVar
+from config.settings import (
+    DATABASE_PATH, MAX_CONNECTIONS, DATABASE_POOL_SIZE, DATABASE_BUSY_TIMEOUT,
+    DATABASE_CACHE_SIZE, DATABASE_STATEMENT_CACHE_SIZE
+)
+from database.migrations import apply_migrations
+from utils.metrics import REGISTRY
+
+
+T = TypeVar('T')
+
+# Время выполнения запросов в потоках пула (без ожидания свободного потока)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'bot_db_query_seconds', 'Время выполнения запросов к SQLite', ['operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+_FETCHONE_SECONDS = DB_QUERY_SECONDS.labels('fetchone')
+_FETCHALL_SECONDS = DB_QUERY_SECONDS.labels('fetchall')
+_TRANSACTION_SECONDS = DB_QUERY_SECONDS.labels('transaction')
 
 
 class DatabaseConnection:
-    """Класс для управления подключением к базе данных""
+    """Класс для управления подключением к базе данных"""
     
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
@@ -23,37 +44,165 @@ class DatabaseConnection:
 
 
 def init_database():
-    """Инициализация базы данных - создание таблиц"""
-    with DatabaseConnection() as conn:
-        cursor = conn.cursor()
-        
-        # Пример создания таблицы пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Пример создания таблицы рефералов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS referrals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                referrer_id INTEGER,
-                referred_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (referrer_id) REFERENCES users (id),
-                FOREIGN KEY (referred_id) REFERENCES users (id)
-            )
-        ''')
-        
-        conn.commit()
+    """Инициализация базы данных - применение недостающих миграций схемы"""
+    apply_migrations(DATABASE_PATH)
 
 
 def get_db_connection():
-    ""Функция для получения подключения к базе данных"""
-    return DatabaseConnection()
\ No newline at end of file
+    """Функция для получения подключения к базе данных"""
+    return DatabaseConnection()
+
+
+class AsyncDatabase:
+    """
+    Асинхронный доступ к базе данных SQLite.
+
+    Чтение выполняется пулом потоков фиксированного размера, у каждого потока
+    свое долгоживущее соединение. Запись выполняется в отдельном потоке
+    с единственным соединением, поэтому писатели не конкурируют за блокировку
+    базы данных. Соединения работают в режиме WAL, так что чтение не ждет записи.
+    """
+
+    def __init__(self, db_path: str = DATABASE_PATH, pool_size: int = DATABASE_POOL_SIZE):
+        """
+        :param db_path: Путь к файлу базы данных
+        :param pool_size: Количество соединений для чтения (вместе с соединением
+                          для записи не превышает MAX_CONNECTIONS)
+        """
+        self.db_path = db_path
+        self.pool_size = max(1, min(pool_size, MAX_CONNECTIONS - 1))
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._readers = ThreadPoolExecutor(
+            max_workers=self.pool_size,
+            thread_name_prefix='db-reader',
+            initializer=self._open_thread_connection,
+            initargs=(True,)
+        )
+        self._writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='db-writer',
+            initializer=self._open_thread_connection,
+            initargs=(False,)
+        )
+
+    def _open_thread_connection(self, read_only: bool):
+        """Открывает долгоживущее соединение для текущего потока пула"""
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,  # Транзакциями управляем явно
+            check_same_thread=False,
+            cached_statements=DATABASE_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {DATABASE_BUSY_TIMEOUT}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{DATABASE_CACHE_SIZE}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA mmap_size = 268435456')
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+
+        self._local.connection = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+
+    async def _run(self, executor: ThreadPoolExecutor, func: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    def _fetchone(self, sql: str, params: Sequence[Any]) -> Optional[sqlite3.Row]:
+        started = time.perf_counter()
+        row = self._local.connection.execute(sql, params).fetchone()
+        _FETCHONE_SECONDS.observe(time.perf_counter() - started)
+        return row
+
+    def _fetchall(self, sql: str, params: Sequence[Any]) -> List[sqlite3.Row]:
+        started = time.perf_counter()
+        rows = self._local.connection.execute(sql, params).fetchall()
+        _FETCHALL_SECONDS.observe(time.perf_counter() - started)
+        return rows
+
+    def _transaction(self, func: Callable[..., T], *args) -> T:
+        started = time.perf_counter()
+        conn = self._local.connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(conn, *args)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        _TRANSACTION_SECONDS.observe(time.perf_counter() - started)
+        return result
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        """
+        Выполнение запроса на чтение и получение первой строки
+        :param sql: SQL-запрос
+        :param params: Параметры запроса
+        :return: Строка результата или None
+        """
+        return await self._run(self._readers, self._fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        """
+        Выполнение запроса на чтение и получение всех строк
+        :param sql: SQL-запрос
+        :param params: Параметры запроса
+        :return: Список строк результата
+        """
+        return await self._run(self._readers, self._fetchall, sql, params)
+
+    async def transaction(self, func: Callable[..., T], *args) -> T:
+        """
+        Выполнение функции в транзакции на соединении для записи
+        :param func: Функция, принимающая соединение и дополнительные аргументы
+        :return: Результат функции
+        """
+        return await self._run(self._writer, self._transaction, func, *args)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """
+        Выполнение запроса на запись в отдельной транзакции
+        :param sql: SQL-запрос
+        :param params: Параметры запроса
+        :return: Курсор (для lastrowid и rowcount)
+        """
+        return await self.transaction(lambda conn: conn.execute(sql, params))
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        """
+        Пакетное выполнение запроса на запись в одной транзакции
+        :param sql: SQL-запрос
+        :param seq_of_params: Последовательность параметров
+        :return: Курсор (для rowcount)
+        """
+        return await self.transaction(lambda conn: conn.executemany(sql, seq_of_params))
+
+    async def close(self):
+        """Ожидание завершения запросов и закрытие всех соединений"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+_async_database: Optional[AsyncDatabase] = None
+
+
+def get_async_database() -> AsyncDatabase:
+    """Функция для получения общего асинхронного доступа к базе данных"""
+    global _async_database
+    if _async_database is None:
+        _async_database = AsyncDatabase()
+    return _async_database
\ No newline at end of file
@@ -0,0 +1,75 @@
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class KeywordMatcher:
+    """
+    Поиск ключевых слов в тексте автоматом Ахо — Корасик.
+
+    Все ключевые слова ищутся за один проход по тексту, время поиска
+    линейно по длине текста и не зависит от количества слов. Находятся
+    все вхождения, в том числе перекрывающиеся и вложенные одно в другое.
+    Для каждого состояния автомата заранее вычисляется наименьший номер
+    слова, которое заканчивается в этом состоянии (с учетом суффиксных
+    ссылок), поэтому поиск сразу возвращает слово с наименьшим номером.
+    """
+
+    def __init__(self, words: List[str]):
+        """
+        :param words: Ключевые слова; номер слова — его позиция в списке
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Наименьший номер слова, оканчивающегося в состоянии (len(words) — ни одного)
+        self._first: List[int] = [len(words)]
+        self._size = len(words)
+
+        for index, word in enumerate(words):
+            if word:
+                self._insert(word, index)
+        self._link()
+
+    def first_match(self, text: str) -> Optional[int]:
+        """
+        Поиск ключевого слова с наименьшим номером среди встречающихся в тексте
+        :param text: Текст
+        :return: Номер слова или None, если ни одно слово не встречается
+        """
+        goto, fail, first = self._goto, self._fail, self._first
+        best = self._size
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if first[state] < best:
+                best = first[state]
+                if best == 0:
+                    break
+        return best if best < self._size else None
+
+    def _insert(self, word: str, index: int):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._first.append(self._size)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._first[state] = min(self._first[state], index)
+
+    def _link(self):
+        # Суффиксные ссылки строятся обходом в ширину: ссылка ведет в состояние меньшей глубины
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._first[next_state] = min(self._first[next_state], self._first[self._fail[next_state]])
+                queue.append(next_state)
@@ -0,0 +1,131 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+
+class _ScoreCounts:
+    """
+    Дерево Фенвика по значениям счета: количество пользователей
+    со счетом выше заданного за O(log max)
+    """
+    __slots__ = ('counts', 'tree', 'total')
+
+    def __init__(self, size: int = 1024):
+        self.counts = [0] * size
+        self.tree = [0] * (size + 1)
+        self.total = 0
+
+    def add(self, score: int, delta: int):
+        if score >= len(self.counts):
+            self._grow(score + 1)
+        self.counts[score] += delta
+        self.total += delta
+        index = score + 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def count_above(self, score: int) -> int:
+        index = min(score + 1, len(self.counts))
+        not_above = 0
+        while index > 0:
+            not_above += self.tree[index]
+            index -= index & -index
+        return self.total - not_above
+
+    def _grow(self, min_size: int):
+        size = len(self.counts)
+        while size < min_size:
+            size *= 2
+        self.counts.extend([0] * (size - len(self.counts)))
+        # Построение дерева за O(size)
+        self.tree = [0] + self.counts[:]
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                self.tree[parent] += self.tree[index]
+
+
+class Leaderboard:
+    """
+    Таблица лидеров с неубывающими счетами.
+
+    Первые capacity позиций хранятся отсортированным списком ключей
+    (-счет, ID), место любого пользователя считается по дереву Фенвика
+    над счетами. Поиск места — O(log максимального счета), обновление —
+    то же плюс O(capacity) в худшем случае для вставки в список лидеров.
+    """
+
+    def __init__(self, capacity: int = 100):
+        """
+        :param capacity: Количество позиций, доступных для постраничного вывода
+        """
+        self.capacity = capacity
+        self._scores: Dict[int, int] = {}
+        self._top: List[Tuple[int, int]] = []
+        self._counts = _ScoreCounts()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def set_score(self, user_id: int, score: int):
+        """
+        Установка счета пользователя (счет не уменьшается, меньшие значения игнорируются)
+        :param user_id: ID пользователя
+        :param score: Новый счет
+        """
+        old_score = self._scores.get(user_id, 0)
+        if score <= old_score:
+            return
+
+        self._scores[user_id] = score
+        if old_score > 0:
+            self._counts.add(old_score, -1)
+        self._counts.add(score, 1)
+
+        old_key = (-old_score, user_id)
+        position = bisect_left(self._top, old_key)
+        if position < len(self._top) and self._top[position] == old_key:
+            del self._top[position]
+        elif len(self._top) >= self.capacity and (-score, user_id) > self._top[-1]:
+            return
+        insort(self._top, (-score, user_id))
+        if len(self._top) > self.capacity:
+            self._top.pop()
+
+    def add_score(self, user_id: int, delta: int):
+        """
+        Увеличение счета пользователя
+        :param user_id: ID пользователя
+        :param delta: Прирост счета
+        """
+        self.set_score(user_id, self._scores.get(user_id, 0) + delta)
+
+    def score(self, user_id: int) -> int:
+        """Счет пользователя"""
+        return self._scores.get(user_id, 0)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """
+        Место пользователя (при равном счете места совпадают)
+        :param user_id: ID пользователя
+        :return: Место, начиная с 1, или None для пользователя без счета
+        """
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._counts.count_above(score) + 1
+
+    def top(self, offset: int = 0, limit: int = 10) -> List[Tuple[int, int]]:
+        """
+        Участок таблицы лидеров
+        :param offset: Сколько позиций пропустить
+        :param limit: Количество позиций
+        :return: Пары (ID пользователя, счет)
+        """
+        return [(user_id, -negative_score) for negative_score, user_id in self._top[offset:offset + limit]]
+
+    def clear(self):
+        """Очистка таблицы"""
+        self._scores.clear()
+        self._top.clear()
+        self._counts = _ScoreCounts()
@@ -0,0 +1,261 @@
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+from config.settings import (
+    LOG_LEVEL, LOG_FILE, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE, LOG_DEBUG_SAMPLE_RATE
+)
+from utils.metrics import REGISTRY
+
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LISTENER_BATCH_SIZE = 500
+SAMPLER_MAX_KEYS = 10000
+
+# Очередь записей журнала дочерних процессов (см. get_process_log_queue)
+_process_log_queue: Optional[multiprocessing.Queue] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись журнала одной строкой JSON
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Пропуск каждой rate-й отладочной записи каждого вида (логгер и шаблон
+    сообщения), записи уровня INFO и выше проходят все.
+    Счетчики сбрасываются, когда видов становится больше max_keys
+    (например, если сообщения форматируются до вызова логгера).
+    """
+
+    def __init__(self, rate: int, max_keys: int = SAMPLER_MAX_KEYS):
+        super().__init__()
+        self.rate = rate
+        self.max_keys = max_keys
+        self._counts: Dict[Tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 1:
+            return True
+        key = (record.name, str(record.msg))
+        if key not in self._counts and len(self._counts) >= self.max_keys:
+            self._counts.clear()
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.rate == 0
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Постановка записи в очередь без форматирования и без ожидания.
+    Сообщение форматируется в потоке записи, при переполнении очереди
+    запись отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь в том же процессе: запись передается как есть, % подставляется при записи
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _ProcessQueueHandler(_NonBlockingQueueHandler):
+    """
+    Передача записей дочернего процесса в очередь между процессами.
+    Сообщение и трассировка исключения форматируются до отправки,
+    чтобы запись можно было передать в другой процесс.
+    """
+
+    prepare = QueueHandler.prepare
+
+
+class _ForwardHandler(logging.Handler):
+    """
+    Передача записей дочерних процессов в очередь потока записи текущего процесса.
+    Записи уже отобраны DebugSampler дочернего процесса и отформатированы,
+    поэтому фильтры корневого логгера к ним повторно не применяются.
+    """
+
+    def __init__(self, queue_handler: _NonBlockingQueueHandler):
+        super().__init__()
+        self.queue_handler = queue_handler
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        self.queue_handler.enqueue(record)
+        return True
+
+
+class _BatchFlushMixin:
+    """Сброс буфера потока один раз на пакет записей, а не после каждой"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _BatchRotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    pass
+
+
+class _BatchStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class _BatchQueueListener(QueueListener):
+    """
+    Поток записи журнала: забирает из очереди все накопившиеся записи,
+    передает их обработчикам и сбрасывает файлы один раз на пакет
+    """
+
+    def _monitor(self):
+        log_queue = self.queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < LISTENER_BATCH_SIZE:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            for handler in self.handlers:
+                handler.flush_batch()
+            if stop:
+                return
+
+    def enqueue_sentinel(self):
+        # Ожидание места в очереди, чтобы остановка не терялась при переполнении
+        self.queue.put(self._sentinel)
+
+
+def setup_logging(level: str = LOG_LEVEL, log_file: str = LOG_FILE, log_format: str = LOG_FORMAT,
+                  debug_sample_rate: int = LOG_DEBUG_SAMPLE_RATE) -> QueueListener:
+    """
+    Настройка журнала: обработчики корневого логгера только ставят записи
+    в очередь, а форматирование и запись в файл с ротацией и в консоль
+    выполняет отдельный поток. Поток останавливается при выходе из процесса
+    с записью всех оставшихся записей.
+    :param level: Уровень журнала
+    :param log_file: Путь к файлу журнала
+    :param log_format: text или json
+    :param debug_sample_rate: Записывать каждую N-ю отладочную запись каждого вида
+    :return: Запущенный поток записи
+    """
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    elif log_format == 'text':
+        formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        raise ValueError(f"Неизвестный формат журнала: {log_format}")
+
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handlers = [
+        _BatchRotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'),
+        _BatchStreamHandler(),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level))
+    REGISTRY.callback_counter(
+        'bot_log_records_dropped', 'Записи журнала, отброшенные при переполнении очереди',
+        lambda: queue_handler.dropped
+    )
+
+    listener = _BatchQueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Записи дочерних процессов передаются в этот процесс и пишутся тем же потоком.
+    # Поток приема останавливается раньше потока записи (atexit в обратном порядке).
+    global _process_log_queue
+    _process_log_queue = multiprocessing.get_context('spawn').Queue(maxsize=LOG_QUEUE_SIZE)
+    process_listener = QueueListener(_process_log_queue, _ForwardHandler(queue_handler))
+    process_listener.start()
+    atexit.register(process_listener.stop)
+    return listener
+
+
+def get_process_log_queue() -> Optional[multiprocessing.Queue]:
+    """
+    Очередь, через которую дочерние процессы передают записи журнала
+    в процесс, настроивший журнал
+    :return: Очередь или None, если журнал в этом процессе не настроен
+    """
+    return _process_log_queue
+
+
+def setup_child_logging(log_queue: Optional[multiprocessing.Queue], level: str = LOG_LEVEL,
+                        debug_sample_rate: int = LOG_DEBUG_SAMPLE_RATE):
+    """
+    Настройка журнала дочернего процесса: записи передаются через очередь
+    в процесс, настроивший журнал, и пишутся в его файл. Вызывается в начале
+    дочернего процесса (в том числе как initializer пула процессов).
+    :param log_queue: Очередь из get_process_log_queue родительского процесса
+                      (None — журнал не настраивается)
+    :param level: Уровень журнала
+    :param debug_sample_rate: Записывать каждую N-ю отладочную запись каждого вида
+    """
+    if log_queue is None:
+        return
+    global _process_log_queue
+    _process_log_queue = log_queue
+
+    queue_handler = _ProcessQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(debug_sample_rate))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level))
+    REGISTRY.callback_counter(
+        'bot_log_records_dropped', 'Записи журнала, отброшенные при переполнении очереди',
+        lambda: queue_handler.dropped
+    )
@@ -0,0 +1,293 @@
+import logging
+import math
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CallbackValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+class _Shards:
+    """
+    Значения метрики, разделенные по потокам.
+    Каждый поток пишет только в свой список, поэтому запись не требует
+    блокировок; при сборе списки всех потоков суммируются.
+    """
+    __slots__ = ('size', '_local', '_all')
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._all: List[List[float]] = []
+
+    def get(self) -> List[float]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = [0] * self.size
+            self._all.append(values)
+            return values
+
+    def collect(self) -> List[float]:
+        totals = [0] * self.size
+        for values in list(self._all):
+            for index, value in enumerate(values):
+                totals[index] += value
+        return totals
+
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1):
+        """Увеличение счетчика"""
+        self._shards.get()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.collect()[0]
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', '_shards')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Количество по корзинам, затем корзина +Inf, сумма и количество наблюдений
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float):
+        """Учет наблюдения"""
+        values = self._shards.get()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def collect(self) -> List[float]:
+        return self._shards.collect()
+
+
+class _Metric(ABC):
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._default = None if self.labelnames else self.labels()
+
+    def labels(self, *values: str):
+        """
+        Значение метрики для набора меток
+        :param values: Значения меток в порядке labelnames
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Значение метрики для нового набора меток"""
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Строки экспорта: имя, метки и значение"""
+
+    def _labels(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+
+class Counter(_Metric):
+    """
+    Монотонно возрастающий счетчик
+    """
+    TYPE = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        """Увеличение счетчика без меток"""
+        self._default.inc(amount)
+
+    def samples(self):
+        return [
+            (f'{self.name}_total', self._labels(values), child.value())
+            for values, child in list(self._children.items())
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Гистограмма распределения значений (например, длительностей в секундах)
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        """Учет наблюдения без меток"""
+        self._default.observe(value)
+
+    def samples(self):
+        samples = []
+        for values, child in list(self._children.items()):
+            labels = self._labels(values)
+            counts = child.collect()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f'{self.name}_sum', labels, counts[-2]))
+            samples.append((f'{self.name}_count', labels, counts[-1]))
+        return samples
+
+
+class CallbackMetric(_Metric):
+    """
+    Метрика, значение которой вычисляется при сборе (размеры очередей, кэшей)
+    """
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], CallbackValue],
+                 labelnames: Sequence[str] = (), metric_type: str = 'gauge'):
+        """
+        :param func: Функция без аргументов, возвращающая число или {значения меток: число}
+        :param metric_type: gauge или counter
+        """
+        self.func = func
+        self.TYPE = metric_type
+        super().__init__(name, documentation, labelnames)
+
+    def labels(self, *values: str):
+        return None
+
+    def _new_child(self):
+        # Значение вычисляется функцией при сборе, отдельных значений по меткам нет
+        return None
+
+    def samples(self):
+        name = f'{self.name}_total' if self.TYPE == 'counter' else self.name
+        value = self.func()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            return [(name, {}, value)]
+        return [(name, self._labels(values), item) for values, item in value.items()]
+
+
+class MetricsRegistry:
+    """
+    Набор метрик процесса и их вывод в текстовом формате Prometheus
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Регистрация метрики (метрика с тем же именем заменяется)
+        :param metric: Метрика
+        :return: Та же метрика
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Создание и регистрация счетчика"""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Создание и регистрация гистограммы"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], CallbackValue],
+              labelnames: Sequence[str] = ()) -> CallbackMetric:
+        """Регистрация показателя, вычисляемого функцией при сборе"""
+        return self.register(CallbackMetric(name, documentation, func, labelnames))
+
+    def callback_counter(self, name: str, documentation: str, func: Callable[[], CallbackValue],
+                         labelnames: Sequence[str] = ()) -> CallbackMetric:
+        """Регистрация счетчика, который ведется в другом объекте и читается при сборе"""
+        return self.register(CallbackMetric(name, documentation, func, labelnames, 'counter'))
+
+    def render(self) -> str:
+        """
+        Вывод всех метрик в текстовом формате Prometheus 0.0.4
+        :return: Текст для ответа на /metrics
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.error("Ошибка сбора метрики %s: %s", metric.name, e)
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.TYPE}')
+            for name, labels, value in samples:
+                if labels:
+                    label_text = ','.join(f'{key}="{_escape(str(item))}"' for key, item in labels.items())
+                    lines.append(f'{name}{{{label_text}}} {_format_value(value)}')
+                else:
+                    lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+# Общий набор метрик процесса
+REGISTRY = MetricsRegistry()
+
+
+async def start_metrics_server(host: str, port: int, registry: MetricsRegistry = REGISTRY) -> web.AppRunner:
+    """
+    Запуск HTTP-сервера с единственным маршрутом /metrics
+    :param host: Адрес для прослушивания
+    :param port: Порт
+    :param registry: Набор метрик
+    :return: Runner сервера (для остановки через cleanup)
+    """
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    web_app = web.Application()
+    web_app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступны на %s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,202 @@
+import logging
+import time
+from typing import Dict, Optional
+
+from config.settings import (
+    THROTTLE_BACKEND, THROTTLE_RATE, THROTTLE_BURST,
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ведро токенов: пополняется со скоростью rate токенов в секунду
+    и вмещает не более capacity токенов.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Скорость пополнения в токенах в секунду
+        :param capacity: Максимальное количество токенов (допустимый всплеск)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def delay(self, now: float = None) -> float:
+        """
+        Время ожидания до появления токена
+        :param now: Текущее время по time.monotonic()
+        :return: 0, если токен доступен сразу, иначе задержка в секундах
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float = None):
+        """
+        Списание одного токена (вызывается после проверки delay)
+        :param now: Текущее время по time.monotonic()
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float, now: float = None):
+        """
+        Обнуление ведра на заданное время (например, по retry_after от Telegram)
+        :param seconds: Длительность паузы в секундах
+        :param now: Текущее время по time.monotonic()
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now: float = None) -> bool:
+        """Ведро полностью пополнено (давно не использовалось)"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class GCRALimiter:
+    """
+    Ограничение частоты по алгоритму GCRA (generic cell rate algorithm).
+
+    Для каждого ключа хранится одно число — теоретическое время прихода
+    следующего запроса (TAT). Запрос пропускается, если TAT опережает
+    текущее время не больше, чем на допустимый всплеск. Ключи с TAT
+    в прошлом ничем не отличаются от отсутствующих и периодически удаляются.
+    """
+
+    def __init__(self, rate: float, burst: int, purge_interval: float = 60.0):
+        """
+        :param rate: Допустимая средняя частота в запросах в секунду
+        :param burst: Количество запросов, которые можно отправить подряд
+        :param purge_interval: Период удаления неактуальных ключей в секундах
+        """
+        self.emission = 1.0 / rate
+        self.tolerance = self.emission * (burst - 1)
+        self.purge_interval = purge_interval
+        self._tat: Dict[int, float] = {}
+        self._purged_at = time.monotonic()
+
+    async def allow(self, key: int) -> bool:
+        """
+        Проверка запроса и учет его при допуске
+        :param key: Ключ ограничения (ID пользователя)
+        :return: True, если запрос укладывается в лимит
+        """
+        now = time.monotonic()
+        if now - self._purged_at >= self.purge_interval:
+            self._purge(now)
+
+        tat = self._tat.get(key, now)
+        if tat < now:
+            tat = now
+        if tat - now > self.tolerance:
+            return False
+        self._tat[key] = tat + self.emission
+        return True
+
+    def size(self) -> int:
+        """Количество отслеживаемых ключей"""
+        return len(self._tat)
+
+    def _purge(self, now: float):
+        self._tat = {key: tat for key, tat in self._tat.items() if tat > now}
+        self._purged_at = now
+
+    async def close(self):
+        pass
+
+
+class RedisGCRALimiter:
+    """
+    GCRA с хранением TAT в Redis: лимит общий для всех процессов бота.
+    Проверка и обновление выполняются одним скриптом Lua по времени сервера
+    Redis, ключ живет не дольше, чем влияет на решения. Если Redis недоступен,
+    запросы пропускаются, чтобы сбой ограничителя не останавливал бота.
+    """
+
+    KEY_PREFIX = 'throttle:'
+    SCRIPT = '''
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local emission = tonumber(ARGV[1])
+        local tolerance = tonumber(ARGV[2])
+        local tat = tonumber(redis.call('GET', KEYS[1]))
+        if not tat or tat < now then
+            tat = now
+        end
+        if tat - now > tolerance then
+            return 0
+        end
+        tat = tat + emission
+        redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+        return 1
+    '''
+
+    def __init__(self, rate: float, burst: int, redis_client=None):
+        """
+        :param rate: Допустимая средняя частота в запросах в секунду
+        :param burst: Количество запросов, которые можно отправить подряд
+        :param redis_client: Клиент redis.asyncio (по умолчанию создается по настройкам)
+        """
+        self.emission = 1.0 / rate
+        self.tolerance = self.emission * (burst - 1)
+        if redis_client is None:
+            try:
+                from redis.asyncio import Redis
+            except ImportError as e:
+                raise RuntimeError("Для ограничения частоты через Redis необходим пакет redis") from e
+            redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD)
+        self.redis = redis_client
+        self._script = redis_client.register_script(self.SCRIPT)
+
+    async def allow(self, key: int) -> bool:
+        """
+        Проверка запроса и учет его при допуске
+        :param key: Ключ ограничения (ID пользователя)
+        :return: True, если запрос укладывается в лимит
+        """
+        try:
+            allowed = await self._script(keys=[f'{self.KEY_PREFIX}{key}'], args=[self.emission, self.tolerance])
+        except Exception as e:
+            logger.error("Ошибка проверки частоты запросов в Redis: %s", e)
+            return True
+        return bool(allowed)
+
+    def size(self) -> Optional[int]:
+        """Количество ключей хранится в Redis и здесь не считается"""
+        return None
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_limiter(backend: str = THROTTLE_BACKEND, rate: float = THROTTLE_RATE, burst: int = THROTTLE_BURST):
+    """
+    Создание ограничителя частоты по названию бэкенда
+    :param backend: memory (в пределах процесса) или redis (общий для процессов)
+    :param rate: Допустимая средняя частота в запросах в секунду
+    :param burst: Количество запросов, которые можно отправить подряд
+    :return: Ограничитель частоты
+    """
+    if backend == 'memory':
+        return GCRALimiter(rate, burst)
+    if backend == 'redis':
+        return RedisGCRALimiter(rate, burst)
+    raise ValueError(f"Неизвестный бэкенд ограничения частоты: {backend}")
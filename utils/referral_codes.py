@@ -0,0 +1,92 @@
+import hashlib
+from typing import List, Optional
+
+
+BASE62_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+FEISTEL_ROUNDS = 4
+
+
+class ReferralCodec:
+    """
+    Взаимно однозначное преобразование ID пользователя в реферальный код.
+
+    ID переставляется сетью Фейстеля с ключами, выведенными из секрета,
+    внутри пространства 62^length (выходы за его пределы переставляются
+    повторно), и результат записывается в base62 фиксированной длины.
+    Разные ID дают разные коды, поэтому проверка на совпадения не нужна,
+    а код декодируется обратно в ID без поиска по таблице.
+    """
+
+    def __init__(self, secret: str, length: int):
+        """
+        :param secret: Секрет, из которого выводятся ключи раундов
+        :param length: Длина кода в символах
+        """
+        self.length = length
+        self.capacity = len(BASE62_ALPHABET) ** length
+
+        bits = max(2, (self.capacity - 1).bit_length())
+        self._half_bits = (bits + 1) // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._keys: List[bytes] = [
+            hashlib.sha256(f'{secret}:referral:{round_number}'.encode()).digest()[:16]
+            for round_number in range(FEISTEL_ROUNDS)
+        ]
+        self._index = {char: value for value, char in enumerate(BASE62_ALPHABET)}
+
+    def encode(self, user_id: int) -> str:
+        """
+        Получение кода по ID
+        :param user_id: ID пользователя (от 0 до capacity - 1)
+        :return: Код длины length
+        """
+        if not 0 <= user_id < self.capacity:
+            raise ValueError(f"ID {user_id} не помещается в код длины {self.length}")
+
+        value = self._permute(user_id)
+        while value >= self.capacity:
+            value = self._permute(value)
+
+        chars = []
+        for _ in range(self.length):
+            value, remainder = divmod(value, len(BASE62_ALPHABET))
+            chars.append(BASE62_ALPHABET[remainder])
+        return ''.join(reversed(chars))
+
+    def decode(self, code: str) -> Optional[int]:
+        """
+        Получение ID по коду
+        :param code: Реферальный код
+        :return: ID пользователя или None, если строка не является кодом
+        """
+        if len(code) != self.length:
+            return None
+        value = 0
+        for char in code:
+            digit = self._index.get(char)
+            if digit is None:
+                return None
+            value = value * len(BASE62_ALPHABET) + digit
+
+        value = self._unpermute(value)
+        while value >= self.capacity:
+            value = self._unpermute(value)
+        return value
+
+    def _round(self, round_number: int, half: int) -> int:
+        digest = hashlib.blake2b(
+            half.to_bytes(8, 'big'), key=self._keys[round_number], digest_size=8
+        ).digest()
+        return int.from_bytes(digest, 'big') & self._half_mask
+
+    def _permute(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_number in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self._half_bits) | right
+
+    def _unpermute(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_number in reversed(range(FEISTEL_ROUNDS)):
+            left, right = right ^ self._round(round_number, left), left
+        return (left << self._half_bits) | right
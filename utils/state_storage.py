@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import (
+    STATE_STORAGE_BACKEND, STATE_IDLE_TTL, STATE_CACHE_SIZE,
+    STATE_FLUSH_INTERVAL, STATE_FLUSH_BATCH_SIZE,
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+)
+from utils.cache import MISSING, TTLCache
+from utils.database import AsyncDatabase, get_async_database
+
+
+logger = logging.getLogger(__name__)
+
+
+class UserState(str, Enum):
+    """
+    Состояния диалога с пользователем
+    """
+    GREETED = 'greeted'
+    RECEIVED_AUDIO = 'received_audio'
+    AWAITING_MATERIALS = 'awaiting_materials'
+    MATERIALS_RECEIVED = 'materials_received'
+    PROGRAM_NOTIFIED = 'program_notified'
+    REFERRAL_PROVIDED = 'referral_provided'
+
+
+class StateRecord:
+    """
+    Состояние одного пользователя. Хранит ссылку на член перечисления,
+    а не строку, поэтому одинаковые состояния не дублируются в памяти.
+    """
+    __slots__ = ('state', 'timestamp')
+
+    def __init__(self, state: UserState, timestamp: float):
+        self.state = state
+        self.timestamp = timestamp
+
+    def to_dict(self) -> dict:
+        """Преобразование состояния в словарь"""
+        return {'state': self.state.value, 'timestamp': self.timestamp}
+
+
+class BaseStateStorage(ABC):
+    """
+    Базовый класс хранилища состояний пользователей
+    """
+
+    def __init__(self, idle_ttl: float = STATE_IDLE_TTL, flush_interval: float = STATE_FLUSH_INTERVAL):
+        """
+        :param idle_ttl: Через сколько секунд бездействия состояние удаляется
+        :param flush_interval: Период фонового обслуживания в секундах
+        """
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[StateRecord]:
+        """
+        Получение состояния пользователя
+        :param user_id: Telegram ID пользователя
+        :return: Состояние или None
+        """
+
+    @abstractmethod
+    async def set(self, user_id: int, state: UserState, timestamp: float = None):
+        """
+        Установка состояния пользователя
+        :param user_id: Telegram ID пользователя
+        :param state: Новое состояние
+        :param timestamp: Время изменения состояния
+        """
+
+    @abstractmethod
+    async def delete(self, user_id: int):
+        """
+        Удаление состояния пользователя
+        :param user_id: Telegram ID пользователя
+        """
+
+    @abstractmethod
+    def size(self) -> int:
+        """Количество состояний, хранимых в памяти процесса"""
+
+    async def flush(self):
+        """Запись накопленных изменений"""
+
+    async def expire(self):
+        """Удаление состояний бездействующих пользователей"""
+
+    async def start(self):
+        """Запуск фонового обслуживания хранилища"""
+        self._task = asyncio.create_task(self._maintenance_loop())
+
+    async def close(self):
+        """Остановка фонового обслуживания и запись накопленных изменений"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _maintenance_loop(self):
+        # Устаревшие состояния удаляются примерно раз в минуту
+        expire_every = max(1, int(60 / self.flush_interval))
+        iteration = 0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            iteration += 1
+            try:
+                await self.flush()
+                if iteration % expire_every == 0:
+                    await self.expire()
+            except Exception as e:
+                logger.error("Ошибка обслуживания хранилища состояний: %s", e)
+
+
+class MemoryStateStorage(BaseStateStorage):
+    """
+    Хранилище состояний в памяти процесса. Записи упорядочены по времени
+    последнего изменения, поэтому устаревшие удаляются с начала словаря.
+    Количество записей ограничено cache_size: при переполнении удаляются
+    состояния пользователей, дольше всех не менявших состояние.
+    """
+
+    def __init__(self, idle_ttl: float = STATE_IDLE_TTL, flush_interval: float = STATE_FLUSH_INTERVAL,
+                 cache_size: int = STATE_CACHE_SIZE):
+        super().__init__(idle_ttl, flush_interval)
+        self.cache_size = cache_size
+        self._records: 'OrderedDict[int, StateRecord]' = OrderedDict()
+
+    async def get(self, user_id: int) -> Optional[StateRecord]:
+        return self._records.get(user_id)
+
+    async def set(self, user_id: int, state: UserState, timestamp: float = None):
+        self._records[user_id] = StateRecord(UserState(state), timestamp or time.time())
+        self._records.move_to_end(user_id)
+        while len(self._records) > self.cache_size:
+            self._records.popitem(last=False)
+
+    async def delete(self, user_id: int):
+        self._records.pop(user_id, None)
+
+    def size(self) -> int:
+        return len(self._records)
+
+    async def expire(self):
+        cutoff = time.time() - self.idle_ttl
+        while self._records:
+            user_id, record = next(iter(self._records.items()))
+            if record.timestamp >= cutoff:
+                break
+            del self._records[user_id]
+
+
+class BufferedStateStorage(BaseStateStorage):
+    """
+    Хранилище с отложенной пакетной записью во внешнее хранилище.
+    Изменения копятся в памяти и записываются раз в flush_interval секунд
+    или при накоплении batch_size изменений; недавно прочитанные состояния
+    держатся в ограниченном кэше.
+    """
+
+    def __init__(self, idle_ttl: float = STATE_IDLE_TTL, flush_interval: float = STATE_FLUSH_INTERVAL,
+                 batch_size: int = STATE_FLUSH_BATCH_SIZE, cache_size: int = STATE_CACHE_SIZE):
+        super().__init__(idle_ttl, flush_interval)
+        self.batch_size = batch_size
+        self._dirty: Dict[int, Optional[StateRecord]] = {}
+        self._cache = TTLCache(max_size=cache_size, ttl=idle_ttl)
+        self._flush_lock = asyncio.Lock()
+
+    async def get(self, user_id: int) -> Optional[StateRecord]:
+        if user_id in self._dirty:
+            return self._dirty[user_id]
+
+        record = self._cache.get(user_id)
+        if record is MISSING:
+            record = await self._load(user_id)
+            self._cache.add(user_id, record)
+        return record
+
+    async def set(self, user_id: int, state: UserState, timestamp: float = None):
+        record = StateRecord(UserState(state), timestamp or time.time())
+        self._dirty[user_id] = record
+        self._cache.set(user_id, record)
+        if len(self._dirty) >= self.batch_size:
+            await self.flush()
+
+    async def delete(self, user_id: int):
+        self._dirty[user_id] = None
+        self._cache.set(user_id, None)
+
+    def size(self) -> int:
+        return len(self._cache)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            upserts = [
+                (user_id, record.state.value, record.timestamp)
+                for user_id, record in batch.items() if record is not None
+            ]
+            deletes = [user_id for user_id, record in batch.items() if record is None]
+            try:
+                await self._write(upserts, deletes)
+            except Exception:
+                # Возвращаем неудачный пакет, не затирая более свежие изменения
+                for user_id, record in batch.items():
+                    self._dirty.setdefault(user_id, record)
+                raise
+
+    @abstractmethod
+    async def _load(self, user_id: int) -> Optional[StateRecord]:
+        """Чтение состояния из внешнего хранилища"""
+
+    @abstractmethod
+    async def _write(self, upserts: List[Tuple[int, str, float]], deletes: List[int]):
+        """Запись пакета изменений во внешнее хранилище"""
+
+
+class SQLiteStateStorage(BufferedStateStorage):
+    """
+    Хранилище состояний в таблице user_states
+    """
+
+    def __init__(self, db: AsyncDatabase = None, **kwargs):
+        """
+        :param db: Асинхронный доступ к базе данных (по умолчанию общий)
+        """
+        super().__init__(**kwargs)
+        self.db = db or get_async_database()
+
+    async def _load(self, user_id: int) -> Optional[StateRecord]:
+        row = await self.db.fetchone(
+            'SELECT state, updated_at FROM user_states WHERE user_id = ?',
+            (user_id,)
+        )
+        if row is None or row['updated_at'] < time.time() - self.idle_ttl:
+            return None
+        return StateRecord(UserState(row['state']), row['updated_at'])
+
+    async def _write(self, upserts: List[Tuple[int, str, float]], deletes: List[int]):
+        def write(conn):
+            if upserts:
+                conn.executemany(
+                    'INSERT INTO user_states (user_id, state, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at',
+                    upserts
+                )
+            if deletes:
+                conn.executemany('DELETE FROM user_states WHERE user_id = ?', [(user_id,) for user_id in deletes])
+
+        await self.db.transaction(write)
+
+    async def expire(self):
+        await self.db.execute(
+            'DELETE FROM user_states WHERE updated_at < ?',
+            (time.time() - self.idle_ttl,)
+        )
+
+
+class RedisStateStorage(BufferedStateStorage):
+    """
+    Хранилище состояний в Redis. Каждое состояние хранится строкой
+    "state|timestamp" со сроком жизни idle_ttl, поэтому бездействующие
+    пользователи удаляются самим Redis.
+    """
+
+    KEY_PREFIX = 'fsm:'
+
+    def __init__(self, redis_client=None, **kwargs):
+        """
+        :param redis_client: Клиент redis.asyncio (по умолчанию создается по настройкам)
+        """
+        super().__init__(**kwargs)
+        if redis_client is None:
+            try:
+                from redis.asyncio import Redis
+            except ImportError as e:
+                raise RuntimeError("Для хранилища состояний в Redis необходим пакет redis") from e
+            redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD)
+        self.redis = redis_client
+
+    async def _load(self, user_id: int) -> Optional[StateRecord]:
+        value = await self.redis.get(f'{self.KEY_PREFIX}{user_id}')
+        if value is None:
+            return None
+        state, timestamp = value.decode().split('|', 1)
+        return StateRecord(UserState(state), float(timestamp))
+
+    async def _write(self, upserts: List[Tuple[int, str, float]], deletes: List[int]):
+        pipe = self.redis.pipeline(transaction=False)
+        ttl = int(self.idle_ttl)
+        for user_id, state, timestamp in upserts:
+            pipe.set(f'{self.KEY_PREFIX}{user_id}', f'{state}|{timestamp}', ex=ttl)
+        if deletes:
+            pipe.delete(*(f'{self.KEY_PREFIX}{user_id}' for user_id in deletes))
+        await pipe.execute()
+
+    async def close(self):
+        await super().close()
+        await self.redis.aclose()
+
+
+def create_state_storage(backend: str = STATE_STORAGE_BACKEND, db: AsyncDatabase = None) -> BaseStateStorage:
+    """
+    Создание хранилища состояний по названию бэкенда
+    :param backend: memory, sqlite или redis
+    :param db: Асинхронный доступ к базе данных для бэкенда sqlite
+    :return: Хранилище состояний
+    """
+    if backend == 'memory':
+        return MemoryStateStorage()
+    if backend == 'sqlite':
+        return SQLiteStateStorage(db)
+    if backend == 'redis':
+        return RedisStateStorage()
+    raise ValueError(f"Неизвестный бэкенд хранилища состояний: {backend}")
@@ -0,0 +1,119 @@
+import zipfile
+from typing import Any, Callable, Dict, Tuple
+from xml.etree import ElementTree
+
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+CORE_PROPERTIES = {
+    '{http://purl.org/dc/elements/1.1/}title': 'title',
+    '{http://purl.org/dc/elements/1.1/}creator': 'author',
+    '{http://purl.org/dc/terms/}created': 'created',
+}
+
+
+class UnsupportedDocumentError(ValueError):
+    """
+    Формат документа не поддерживается
+    """
+
+
+def _extract_txt(path: str) -> Tuple[str, Dict[str, Any]]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    for encoding in ('utf-8', 'cp1251'):
+        try:
+            return data.decode(encoding), {'encoding': encoding}
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace'), {'encoding': 'utf-8'}
+
+
+def _extract_docx(path: str) -> Tuple[str, Dict[str, Any]]:
+    paragraphs = []
+    metadata: Dict[str, Any] = {}
+    with zipfile.ZipFile(path) as archive:
+        with archive.open('word/document.xml') as document:
+            for _, element in ElementTree.iterparse(document):
+                if element.tag == f'{WORD_NAMESPACE}p':
+                    text = ''.join(
+                        node.text or '' if node.tag == f'{WORD_NAMESPACE}t' else '\t'
+                        for node in element.iter()
+                        if node.tag in (f'{WORD_NAMESPACE}t', f'{WORD_NAMESPACE}tab')
+                    )
+                    paragraphs.append(text)
+                    # Разобранные абзацы больше не нужны, память освобождается сразу
+                    element.clear()
+
+        if 'docProps/core.xml' in archive.namelist():
+            core = ElementTree.fromstring(archive.read('docProps/core.xml'))
+            for node in core:
+                if node.tag in CORE_PROPERTIES and node.text:
+                    metadata[CORE_PROPERTIES[node.tag]] = node.text
+
+    metadata['paragraphs'] = len(paragraphs)
+    return '\n'.join(paragraphs), metadata
+
+
+def _extract_pdf(path: str) -> Tuple[str, Dict[str, Any]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = [page.extract_text() or '' for page in reader.pages]
+    metadata: Dict[str, Any] = {'pages': len(pages)}
+    if reader.metadata:
+        if reader.metadata.title:
+            metadata['title'] = reader.metadata.title
+        if reader.metadata.author:
+            metadata['author'] = reader.metadata.author
+    return '\n\n'.join(pages), metadata
+
+
+def _extract_image(path: str) -> Tuple[str, Dict[str, Any]]:
+    from PIL import Image
+
+    with Image.open(path) as image:
+        metadata: Dict[str, Any] = {
+            'format': image.format,
+            'width': image.width,
+            'height': image.height,
+            'mode': image.mode,
+        }
+        try:
+            import pytesseract
+        except ImportError:
+            # Распознавание текста доступно только при установленном pytesseract
+            metadata['ocr'] = False
+            return '', metadata
+        metadata['ocr'] = True
+        return pytesseract.image_to_string(image, lang='rus+eng'), metadata
+
+
+EXTRACTORS: Dict[str, Callable[[str], Tuple[str, Dict[str, Any]]]] = {
+    'txt': _extract_txt,
+    'docx': _extract_docx,
+    'pdf': _extract_pdf,
+    'jpg': _extract_image,
+    'jpeg': _extract_image,
+    'png': _extract_image,
+}
+
+
+def extract_document(path: str, file_type: str, max_length: int) -> Dict[str, Any]:
+    """
+    Извлечение текста и метаданных из файла.
+    Выполняется в дочернем процессе пула обработки; библиотеки разбора
+    pdf и изображений импортируются только при необходимости.
+    :param path: Путь к файлу
+    :param file_type: Расширение файла
+    :param max_length: Максимальная длина сохраняемого текста
+    :return: Словарь с ключами text и metadata
+    """
+    extractor = EXTRACTORS.get((file_type or '').lower())
+    if extractor is None:
+        raise UnsupportedDocumentError(f"Извлечение текста из файлов {file_type} не поддерживается")
+
+    text, metadata = extractor(path)
+    text = text.strip()
+    metadata['length'] = len(text)
+    metadata['truncated'] = len(text) > max_length
+    return {'text': text[:max_length], 'metadata': metadata}
@@ -7,7 +7,7 @@ def validate_telegram_id(telegram_id: Any) -> bool:
     """
     Валидация Telegram ID
     Telegram ID - это положительное целое число
-    ""
+    """
     if isinstance(telegram_id, str):
         return telegram_id.isdigit() and int(telegram_id) > 0
     elif isinstance(telegram_id, int):
@@ -20,7 +20,7 @@ def validate_username(username: str) -> bool:
     Валидация username Telegram
     Username должен быть длиной от 5 до 32 символов,
     содержать только латинские буквы, цифры и подчеркивание
-    ""
+    """
     if not username or not isinstance(username, str):
         return False
     
@@ -32,7 +32,7 @@ def validate_username(username: str) -> bool:
 def validate_email(email: str) -> bool:
     """
     Валидация email адреса
-    ""
+    """
     if not email or not isinstance(email, str):
         return False
     
@@ -44,7 +44,7 @@ def validate_phone(phone: str) -> bool:
     """
     Валидация телефонного номера
     Принимает номера в международном формате
-    ""
+    """
     if not phone or not isinstance(phone, str):
         return False
     
@@ -59,7 +59,7 @@ def validate_phone(phone: str) -> bool:
 def validate_url(url: str) -> bool:
     """
     Валидация URL
-    ""
+    """
     if not url or not isinstance(url, str):
         return False
     
@@ -70,7 +70,7 @@ def validate_url(url: str) -> bool:
 def validate_not_empty(value: Any) -> bool:
     """
     Проверяет, что значение не пустое
-    ""
+    """
     if value is None:
         return False
     if isinstance(value, str):
@@ -83,7 +83,7 @@ def validate_not_empty(value: Any) -> bool:
 def validate_length(value: str, min_length: int = 0, max_length: int = None) -> bool:
     """
     Валидация длины строки
-    ""
+    """
     if not isinstance(value, str):
         return False
     
@@ -96,14 +96,14 @@ def validate_length(value: str, min_length: int = 0, max_length: int = None) ->
 def validate_choice(value: Any, choices: List[Any]) -> bool:
     """
     Проверяет, что значение находится в списке допустимых значений
-    ""
+    """
     return value in choices
 
 
 def validate_date(date_string: str, date_format: str = '%Y-%m-%d') -> bool:
     """
     Валидация строки даты
-    ""
+    """
     try:
         datetime.strptime(date_string, date_format)
         return True
@@ -121,7 +121,7 @@ def validate_data(data: Dict[str, Any], rules: Dict[str, List[callable]]) -> Dic
     
     Returns:
         Словарь с ошибками валидации {поле: [список_ошибок]}
-    ""
+    """
     errors = {}
     
     for field, validators in rules.items():